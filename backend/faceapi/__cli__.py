@@ -1,7 +1,8 @@
 """Command Line Interface for Face Recognition System API.
 
 This module provides the main entry points for running the server
-through command line arguments.
+through command line arguments, and dispatches `faceapi <subcommand>`
+to the offline tools in faceapi.tools.
 """
 
 import argparse
@@ -13,6 +14,7 @@ from loguru import logger
 import textwrap
 from pathlib import Path
 
+from faceapi.tools import TOOL_COMMANDS, run_tool
 
 
 def generate_env_file(output_path: str = ".env") -> None:
@@ -63,11 +65,22 @@ def generate_env_file(output_path: str = ".env") -> None:
     print(f"Environment file generated successfully: {output_file.absolute()}")
 
 
+class _HelpFormatter(
+    argparse.ArgumentDefaultsHelpFormatter, argparse.RawDescriptionHelpFormatter
+):
+    """Show argument defaults and keep the subcommand list line breaks."""
+
+
 def create_parser() -> argparse.ArgumentParser:
     """Create and configure the argument parser."""
     parser = argparse.ArgumentParser(
         description="Face Recognition System API Server",
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        formatter_class=_HelpFormatter,
+        epilog="subcommands:\n"
+        + "\n".join(
+            f"  faceapi {name} ...  {description}"
+            for name, (_, description) in TOOL_COMMANDS.items()
+        ),
     )
 
     parser.add_argument("--host", default="0.0.0.0", help=f"Host to bind to")
@@ -103,6 +116,11 @@ def create_parser() -> argparse.ArgumentParser:
 
 def main(args: Optional[list] = None) -> None:
     """Main entry point for the CLI."""
+    args = sys.argv[1:] if args is None else args
+    if args and args[0] in TOOL_COMMANDS:
+        run_tool(args[0], args[1:])
+        return
+
     parser = create_parser()
     parsed_args = parser.parse_args(args)
 
@@ -11,11 +11,37 @@ from pydantic_settings import BaseSettings, SettingsConfigDict, YamlConfigSettin
 
 
 CONFIGURABLE_FIELDS = [
+    "VECTOR_STORE_BACKEND",
+    "VECTOR_STORE_PATH",
+    "VECTOR_STORE_SEARCH_BLOCK_SIZE",
+    "VECTOR_STORE_LOCAL_REPLICA",
+    "VECTOR_STORE_REPLICA_SYNC_INTERVAL",
+    "VECTOR_STORE_REPLICA_RECONCILE_INTERVAL",
     "MILVUS_DB_HOST",
     "MILVUS_DB_PORT",
     "MILVUS_DB_USER",
     "MILVUS_DB_PASSWORD",
     "MILVUS_DB_DB_NAME",
+    "MILVUS_CALL_TIMEOUT",
+    "MILVUS_IO_THREADS",
+    "MILVUS_LOAD_STATE_REFRESH_INTERVAL",
+    "MILVUS_POOL_SIZE",
+    "MILVUS_POOL_HEALTH_INTERVAL",
+    "MILVUS_MODEL_CHECK_INTERVAL",
+    "MILVUS_SEARCH_DEADLINE",
+    "MILVUS_SEARCH_RETRIES",
+    "MILVUS_SEARCH_RETRY_BACKOFF_MS",
+    "MILVUS_SEARCH_HEDGE",
+    "MILVUS_SEARCH_HEDGE_PERCENTILE",
+    "MILVUS_SEARCH_HEDGE_MIN_DELAY_MS",
+    "MILVUS_SEARCH_HEDGE_BUDGET",
+    "MILVUS_MAINTENANCE_INTERVAL",
+    "MILVUS_MAINTENANCE_WINDOW",
+    "MILVUS_MAINTENANCE_SMALL_SEGMENT_ROWS",
+    "MILVUS_MAINTENANCE_MAX_SMALL_SEGMENTS",
+    "MILVUS_MAINTENANCE_DELETED_RATIO",
+    "MILVUS_MAINTENANCE_PROBE_SAMPLES",
+    "MILVUS_MAINTENANCE_TIMEOUT",
     "SQL_BACKEND",
     "SQL_HOST",
     "SQL_PORT",
@@ -42,6 +68,70 @@ CONFIGURABLE_FIELDS = [
     "ADMIN_EMAIL",
     "ADMIN_FULL_NAME",
     "ALLOW_FACE_DEDUPICATION",
+    "FACE_ROI_PADDING",
+    "FACE_QUALITY_ENABLED",
+    "FACE_QUALITY_MIN_SIZE",
+    "FACE_QUALITY_MIN_ASPECT",
+    "FACE_QUALITY_MAX_ASPECT",
+    "FACE_QUALITY_MIN_BRIGHTNESS",
+    "FACE_QUALITY_MAX_BRIGHTNESS",
+    "FACE_QUALITY_MIN_CONTRAST",
+    "FACE_QUALITY_MIN_SHARPNESS",
+    "FACE_TRACK_ENABLED",
+    "FACE_TRACK_REFRESH_FRAMES",
+    "FACE_TRACK_REFRESH_SECONDS",
+    "FACE_TRACK_SEARCH_PADDING",
+    "FACE_TRACK_MIN_SCORE",
+    "FACE_SEARCH_MAX_PAGE_SIZE",
+    "FACE_SEARCH_CURSOR_TTL",
+    "FACE_SEARCH_MAX_CURSORS",
+    "UPLOAD_MAX_BYTES",
+    "UPLOAD_MAX_PIXELS",
+    "UPLOAD_MAX_SIDE",
+    "UPLOAD_ALLOWED_FORMATS",
+    "MILVUS_INDEX_TYPE",
+    "MILVUS_HNSW_M",
+    "MILVUS_HNSW_EF_CONSTRUCTION",
+    "MILVUS_HNSW_EF",
+    "MILVUS_IVF_NLIST",
+    "MILVUS_IVF_NPROBE",
+    "MILVUS_IVF_PQ_M",
+    "MILVUS_AUTO_FLAT_MAX_ROWS",
+    "MILVUS_AUTO_HNSW_MAX_ROWS",
+    "MILVUS_INDEX_CHECK_INTERVAL",
+    "MILVUS_INDEX_LOCK_PATH",
+    "MILVUS_VECTOR_DTYPE",
+    "MILVUS_BINARY_CODES",
+    "MILVUS_BINARY_CANDIDATES",
+    "EMB_PROJECTION_ENABLED",
+    "EMB_PROJECTION_PATH",
+    "EMB_PROJECTION_DIM",
+    "EMB_PROJECTION_RERANK",
+    "EMB_PROJECTION_RERANK_PATH",
+    "EMB_PROJECTION_RERANK_CANDIDATES",
+    "FACE_TEMPLATES_ENABLED",
+    "FACE_TEMPLATES_MAX_PER_USER",
+    "FACE_TEMPLATES_PATH",
+    "FACE_TEMPLATES_RERANK",
+    "FACE_TEMPLATES_RERANK_CANDIDATES",
+    "WRITE_QUEUE_ENABLED",
+    "WRITE_QUEUE_MAX_BATCH",
+    "WRITE_QUEUE_MAX_DELAY_MS",
+    "WRITE_QUEUE_READ_YOUR_WRITES_SECONDS",
+    "MILVUS_PARTITION_KEY_ENABLED",
+    "MILVUS_NUM_PARTITIONS",
+    "BULK_ENROLL_BATCH_SIZE",
+    "BULK_ENROLL_WORKERS",
+    "BULK_ENROLL_DIR",
+    "BULK_ENROLL_MAX_BYTES",
+    "MILVUS_BULK_S3_ENDPOINT",
+    "MILVUS_BULK_S3_BUCKET",
+    "MILVUS_BULK_S3_ACCESS_KEY",
+    "MILVUS_BULK_S3_SECRET_KEY",
+    "MILVUS_BULK_S3_SECURE",
+    "MILVUS_BULK_REMOTE_PATH",
+    "SNAPSHOT_DIR",
+    "REEMBED_DIR",
 ]
 
 
@@ -54,6 +144,32 @@ class Config(BaseSettings):
     設定は環境変数から読み込むことができます。
     """
 
+    # ベクトルストア設定
+    VECTOR_STORE_BACKEND: str = Field(
+        os.getenv("VECTOR_STORE_BACKEND", "milvus"),
+        description="顔特徴ベクトルストアのバックエンド (milvus, numpy)",
+    )
+    VECTOR_STORE_PATH: str = Field(
+        os.getenv("VECTOR_STORE_PATH", "./data/face_features"),
+        description="numpyバックエンドの埋め込み行列を保存するディレクトリ",
+    )
+    VECTOR_STORE_SEARCH_BLOCK_SIZE: int = Field(
+        int(os.getenv("VECTOR_STORE_SEARCH_BLOCK_SIZE", "65536")),
+        description="プロセス内検索で1回の行列積に使用する行数",
+    )
+    VECTOR_STORE_LOCAL_REPLICA: bool = Field(
+        os.getenv("VECTOR_STORE_LOCAL_REPLICA", "false").lower() == "true",
+        description="milvusバックエンドで顔特徴をプロセス内に複製し、検索をローカルで行うかどうか",
+    )
+    VECTOR_STORE_REPLICA_SYNC_INTERVAL: int = Field(
+        int(os.getenv("VECTOR_STORE_REPLICA_SYNC_INTERVAL", "30")),
+        description="ローカル複製の差分同期（update_atに基づく）の間隔（秒）",
+    )
+    VECTOR_STORE_REPLICA_RECONCILE_INTERVAL: int = Field(
+        int(os.getenv("VECTOR_STORE_REPLICA_RECONCILE_INTERVAL", "600")),
+        description="ローカル複製で他プロセスの削除を照合する間隔（秒）",
+    )
+
     # Milvus設定
     MILVUS_DB_HOST: str = Field(
         os.getenv("MILVUS_DB_HOST", "localhost"), description="Milvusデータベースホスト"
@@ -71,6 +187,86 @@ class Config(BaseSettings):
     MILVUS_DB_DB_NAME: str = Field(
         os.getenv("MILVUS_DB_DB_NAME", "default"), description="Milvusデータベース名"
     )
+    MILVUS_CALL_TIMEOUT: float = Field(
+        float(os.getenv("MILVUS_CALL_TIMEOUT", "5.0")),
+        description="Milvus呼び出し1回あたりのタイムアウト（秒）",
+    )
+    MILVUS_IO_THREADS: int = Field(
+        int(os.getenv("MILVUS_IO_THREADS", "8")),
+        description="Milvus呼び出しを実行するI/Oスレッド数",
+    )
+    MILVUS_LOAD_STATE_REFRESH_INTERVAL: int = Field(
+        int(os.getenv("MILVUS_LOAD_STATE_REFRESH_INTERVAL", "30")),
+        description="キャッシュしたコレクションのロード状態をバックグラウンドで確認する間隔（秒）",
+    )
+    MILVUS_POOL_SIZE: int = Field(
+        int(os.getenv("MILVUS_POOL_SIZE", "4")),
+        description="プールするMilvusクライアント（gRPCチャネル）の数",
+    )
+    MILVUS_POOL_HEALTH_INTERVAL: int = Field(
+        int(os.getenv("MILVUS_POOL_HEALTH_INTERVAL", "30")),
+        description="プールしたMilvusクライアントのヘルスチェック間隔（秒、0で無効）",
+    )
+    MILVUS_MODEL_CHECK_INTERVAL: int = Field(
+        int(os.getenv("MILVUS_MODEL_CHECK_INTERVAL", "30")),
+        description="face_featuresに記録されたモデル名の確認間隔（秒、0で無効）",
+    )
+    MILVUS_SEARCH_DEADLINE: float = Field(
+        float(os.getenv("MILVUS_SEARCH_DEADLINE", "3.0")),
+        description="再試行とヘッジを含めた検索1回あたりの締め切り（秒）",
+    )
+    MILVUS_SEARCH_RETRIES: int = Field(
+        int(os.getenv("MILVUS_SEARCH_RETRIES", "2")),
+        description="失敗またはタイムアウトした検索を再試行する回数",
+    )
+    MILVUS_SEARCH_RETRY_BACKOFF_MS: int = Field(
+        int(os.getenv("MILVUS_SEARCH_RETRY_BACKOFF_MS", "50")),
+        description="検索の再試行までの基本の待ち時間（ミリ秒、試行ごとに倍増し揺らぎを加える）",
+    )
+    MILVUS_SEARCH_HEDGE: bool = Field(
+        os.getenv("MILVUS_SEARCH_HEDGE", "false").lower() == "true",
+        description="応答の遅い検索を別のクライアントにも送り、先に返った結果を使うかどうか",
+    )
+    MILVUS_SEARCH_HEDGE_PERCENTILE: float = Field(
+        float(os.getenv("MILVUS_SEARCH_HEDGE_PERCENTILE", "95")),
+        description="ヘッジを送るまでの待ち時間とする直近の検索レイテンシのパーセンタイル",
+    )
+    MILVUS_SEARCH_HEDGE_MIN_DELAY_MS: int = Field(
+        int(os.getenv("MILVUS_SEARCH_HEDGE_MIN_DELAY_MS", "10")),
+        description="ヘッジを送るまでの最小の待ち時間（ミリ秒）",
+    )
+    MILVUS_SEARCH_HEDGE_BUDGET: float = Field(
+        float(os.getenv("MILVUS_SEARCH_HEDGE_BUDGET", "0.05")),
+        description="ヘッジを送る検索の割合の上限（Milvusの負荷が増えすぎないようにする）",
+    )
+    MILVUS_MAINTENANCE_INTERVAL: int = Field(
+        int(os.getenv("MILVUS_MAINTENANCE_INTERVAL", "600")),
+        description="顔特徴コレクションのセグメント統計を確認する間隔（秒、0で保守を無効）",
+    )
+    MILVUS_MAINTENANCE_WINDOW: str = Field(
+        os.getenv("MILVUS_MAINTENANCE_WINDOW", ""),
+        description="閾値に関係なく1日1回保守する閑散時間帯（例: 02:00-05:00、空で無効）",
+    )
+    MILVUS_MAINTENANCE_SMALL_SEGMENT_ROWS: int = Field(
+        int(os.getenv("MILVUS_MAINTENANCE_SMALL_SEGMENT_ROWS", "10000")),
+        description="小さなセグメントとみなす行数",
+    )
+    MILVUS_MAINTENANCE_MAX_SMALL_SEGMENTS: int = Field(
+        int(os.getenv("MILVUS_MAINTENANCE_MAX_SMALL_SEGMENTS", "16")),
+        description="コンパクションを実行する小さなセグメント数の閾値",
+    )
+    MILVUS_MAINTENANCE_DELETED_RATIO: float = Field(
+        float(os.getenv("MILVUS_MAINTENANCE_DELETED_RATIO", "0.1")),
+        description="コンパクションを実行する削除済みの行の割合の閾値",
+    )
+    MILVUS_MAINTENANCE_PROBE_SAMPLES: int = Field(
+        int(os.getenv("MILVUS_MAINTENANCE_PROBE_SAMPLES", "20")),
+        description="保守の前後でレイテンシを計測する検索の件数（0で計測しない）",
+    )
+    MILVUS_MAINTENANCE_TIMEOUT: int = Field(
+        int(os.getenv("MILVUS_MAINTENANCE_TIMEOUT", "3600")),
+        description="コンパクションとインデックス構築の完了を待つ最大時間（秒）",
+    )
 
     # Sql設定
     SQL_BACKEND: str = Field(
@@ -174,6 +370,293 @@ class Config(BaseSettings):
     ALLOW_FACE_DEDUPICATION: bool = Field(
         True, description="顔の重複検出を許可するかどうか"
     )
+
+    # 顔検出設定
+    FACE_ROI_PADDING: float = Field(
+        float(os.getenv("FACE_ROI_PADDING", "0.5")),
+        description="クライアントの顔領域ヒント周囲に付ける余白（顔サイズに対する比率）",
+    )
+
+    # 顔品質判定設定
+    FACE_QUALITY_ENABLED: bool = Field(
+        os.getenv("FACE_QUALITY_ENABLED", "true").lower() == "true",
+        description="埋め込み前に顔画像の品質判定を行うかどうか",
+    )
+    FACE_QUALITY_MIN_SIZE: int = Field(
+        int(os.getenv("FACE_QUALITY_MIN_SIZE", "60")),
+        description="顔画像の最小サイズ（短辺のピクセル数）",
+    )
+    FACE_QUALITY_MIN_ASPECT: float = Field(
+        float(os.getenv("FACE_QUALITY_MIN_ASPECT", "0.6")),
+        description="顔画像の最小縦横比（幅/高さ）",
+    )
+    FACE_QUALITY_MAX_ASPECT: float = Field(
+        float(os.getenv("FACE_QUALITY_MAX_ASPECT", "1.6")),
+        description="顔画像の最大縦横比（幅/高さ）",
+    )
+    FACE_QUALITY_MIN_BRIGHTNESS: float = Field(
+        float(os.getenv("FACE_QUALITY_MIN_BRIGHTNESS", "40")),
+        description="顔画像の最小平均輝度（0-255）",
+    )
+    FACE_QUALITY_MAX_BRIGHTNESS: float = Field(
+        float(os.getenv("FACE_QUALITY_MAX_BRIGHTNESS", "220")),
+        description="顔画像の最大平均輝度（0-255）",
+    )
+    FACE_QUALITY_MIN_CONTRAST: float = Field(
+        float(os.getenv("FACE_QUALITY_MIN_CONTRAST", "20")),
+        description="顔画像の最小コントラスト（輝度の標準偏差）",
+    )
+    FACE_QUALITY_MIN_SHARPNESS: float = Field(
+        float(os.getenv("FACE_QUALITY_MIN_SHARPNESS", "60")),
+        description="顔画像の最小鮮明度（ラプラシアンの分散）",
+    )
+
+    # 顔追跡設定
+    FACE_TRACK_ENABLED: bool = Field(
+        os.getenv("FACE_TRACK_ENABLED", "true").lower() == "true",
+        description="WebSocketストリームの連続フレームで顔を追跡し、顔検出を省略するかどうか",
+    )
+    FACE_TRACK_REFRESH_FRAMES: int = Field(
+        int(os.getenv("FACE_TRACK_REFRESH_FRAMES", "10")),
+        description="完全な顔検出を再実行するまでの追跡フレーム数",
+    )
+    FACE_TRACK_REFRESH_SECONDS: float = Field(
+        float(os.getenv("FACE_TRACK_REFRESH_SECONDS", "3.0")),
+        description="完全な顔検出を再実行するまでの秒数",
+    )
+    FACE_TRACK_SEARCH_PADDING: float = Field(
+        float(os.getenv("FACE_TRACK_SEARCH_PADDING", "0.5")),
+        description="追跡時に前回の顔の周囲を探索する余白（顔サイズに対する比率）",
+    )
+    FACE_TRACK_MIN_SCORE: float = Field(
+        float(os.getenv("FACE_TRACK_MIN_SCORE", "0.6")),
+        description="追跡を継続するテンプレートマッチングの最小スコア",
+    )
+
+    # 管理者の顔検索設定
+    FACE_SEARCH_MAX_PAGE_SIZE: int = Field(
+        int(os.getenv("FACE_SEARCH_MAX_PAGE_SIZE", "100")),
+        description="管理者の顔検索で1ページに返す最大件数",
+    )
+    FACE_SEARCH_CURSOR_TTL: float = Field(
+        float(os.getenv("FACE_SEARCH_CURSOR_TTL", "300")),
+        description="使われていない顔検索のカーソルを破棄するまでの秒数",
+    )
+    FACE_SEARCH_MAX_CURSORS: int = Field(
+        int(os.getenv("FACE_SEARCH_MAX_CURSORS", "100")),
+        description="同時に保持する顔検索のカーソルの最大数",
+    )
+
+    # アップロード受け入れ設定
+    UPLOAD_MAX_BYTES: int = Field(
+        int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024))),
+        description="アップロード画像の最大バイト数",
+    )
+    UPLOAD_MAX_PIXELS: int = Field(
+        int(os.getenv("UPLOAD_MAX_PIXELS", str(4096 * 4096))),
+        description="デコードを許可する画像の最大画素数（幅×高さ）",
+    )
+    UPLOAD_MAX_SIDE: int = Field(
+        int(os.getenv("UPLOAD_MAX_SIDE", "8192")),
+        description="デコードを許可する画像の最大辺長（ピクセル）",
+    )
+    UPLOAD_ALLOWED_FORMATS: list[str] = Field(
+        os.getenv("UPLOAD_ALLOWED_FORMATS", "jpeg,png,webp,bmp").split(","),
+        description="受け入れる画像形式のリスト（jpeg, png, webp, bmp）",
+    )
+
+    # Milvusインデックス設定
+    MILVUS_INDEX_TYPE: str = Field(
+        os.getenv("MILVUS_INDEX_TYPE", "AUTO"),
+        description="顔特徴のインデックス種類 (AUTO, FLAT, HNSW, IVF_FLAT, IVF_SQ8, IVF_PQ)。AUTOは件数に応じて選択",
+    )
+    MILVUS_HNSW_M: int = Field(
+        int(os.getenv("MILVUS_HNSW_M", "16")),
+        description="HNSWの各ノードの最大接続数",
+    )
+    MILVUS_HNSW_EF_CONSTRUCTION: int = Field(
+        int(os.getenv("MILVUS_HNSW_EF_CONSTRUCTION", "200")),
+        description="HNSW構築時の探索幅",
+    )
+    MILVUS_HNSW_EF: int = Field(
+        int(os.getenv("MILVUS_HNSW_EF", "64")),
+        description="HNSW検索時の探索幅",
+    )
+    MILVUS_IVF_NLIST: int = Field(
+        int(os.getenv("MILVUS_IVF_NLIST", "0")),
+        description="IVF系インデックスのクラスタ数（0の場合は件数から自動計算）",
+    )
+    MILVUS_IVF_NPROBE: int = Field(
+        int(os.getenv("MILVUS_IVF_NPROBE", "16")),
+        description="IVF系インデックス検索時に探索するクラスタ数",
+    )
+    MILVUS_IVF_PQ_M: int = Field(
+        int(os.getenv("MILVUS_IVF_PQ_M", "64")),
+        description="IVF_PQの部分空間の数（埋め込み次元数の約数）",
+    )
+    MILVUS_AUTO_FLAT_MAX_ROWS: int = Field(
+        int(os.getenv("MILVUS_AUTO_FLAT_MAX_ROWS", "50000")),
+        description="AUTOモードでFLATを使用する最大件数",
+    )
+    MILVUS_AUTO_HNSW_MAX_ROWS: int = Field(
+        int(os.getenv("MILVUS_AUTO_HNSW_MAX_ROWS", "2000000")),
+        description="AUTOモードでHNSWを使用する最大件数（超えるとIVF_SQ8）",
+    )
+    MILVUS_INDEX_CHECK_INTERVAL: int = Field(
+        int(os.getenv("MILVUS_INDEX_CHECK_INTERVAL", "600")),
+        description="AUTOモードでインデックスの見直しを行う間隔（秒、0で無効）",
+    )
+    MILVUS_INDEX_LOCK_PATH: str = Field(
+        os.getenv("MILVUS_INDEX_LOCK_PATH", "./data/milvus_index.lock"),
+        description="インデックスの再構築とコレクションの保守をワーカー間で排他するロックファイルのパス",
+    )
+    MILVUS_VECTOR_DTYPE: str = Field(
+        os.getenv("MILVUS_VECTOR_DTYPE", "FLOAT"),
+        description="顔特徴ベクトルの保存形式 (FLOAT, FLOAT16, BFLOAT16)。コレクション作成時のみ反映",
+    )
+    MILVUS_BINARY_CODES: bool = Field(
+        os.getenv("MILVUS_BINARY_CODES", "false").lower() == "true",
+        description="符号で2値化したBINARY_VECTORを併せて保存し、ハミング距離で候補を絞ってから再ランキングするかどうか。コレクション作成時のみ反映",
+    )
+    MILVUS_BINARY_CANDIDATES: int = Field(
+        int(os.getenv("MILVUS_BINARY_CANDIDATES", "200")),
+        description="ハミング距離の前段検索で取得し、コサイン類似度で再ランキングする候補数",
+    )
+
+    # 埋め込みの次元削減設定
+    EMB_PROJECTION_ENABLED: bool = Field(
+        os.getenv("EMB_PROJECTION_ENABLED", "false").lower() == "true",
+        description="学習済みのPCA射影で埋め込みの次元を削減してからインデックスに登録するかどうか",
+    )
+    EMB_PROJECTION_PATH: str = Field(
+        os.getenv("EMB_PROJECTION_PATH", ""),
+        description="PCA射影ファイルのパス（空の場合はモデルの隣の projection.npz）",
+    )
+    EMB_PROJECTION_DIM: int = Field(
+        int(os.getenv("EMB_PROJECTION_DIM", "128")),
+        description="射影後の埋め込みの次元数",
+    )
+    EMB_PROJECTION_RERANK: bool = Field(
+        os.getenv("EMB_PROJECTION_RERANK", "false").lower() == "true",
+        description="全次元の埋め込みをサイドストアに保存し、検索候補を全次元で再ランキングするかどうか（numpyバックエンドのみ）",
+    )
+    EMB_PROJECTION_RERANK_PATH: str = Field(
+        os.getenv("EMB_PROJECTION_RERANK_PATH", "./data/face_features_full"),
+        description="再ランキング用の全次元埋め込みを保存するディレクトリ",
+    )
+    EMB_PROJECTION_RERANK_CANDIDATES: int = Field(
+        int(os.getenv("EMB_PROJECTION_RERANK_CANDIDATES", "50")),
+        description="射影空間で取得し、全次元で再ランキングする候補数",
+    )
+
+    # 複数テンプレート設定
+    FACE_TEMPLATES_ENABLED: bool = Field(
+        os.getenv("FACE_TEMPLATES_ENABLED", "false").lower() == "true",
+        description="ユーザーごとに複数の顔テンプレートを保存し、平均したプロトタイプで検索するかどうか",
+    )
+    FACE_TEMPLATES_MAX_PER_USER: int = Field(
+        int(os.getenv("FACE_TEMPLATES_MAX_PER_USER", "5")),
+        description="ユーザーあたりのテンプレート数の上限（超えた場合は最も古いものを置き換え）。運用開始後は変更しないこと",
+    )
+    FACE_TEMPLATES_PATH: str = Field(
+        os.getenv("FACE_TEMPLATES_PATH", "./data/face_templates"),
+        description="numpyバックエンドでテンプレートを保存するディレクトリ",
+    )
+    FACE_TEMPLATES_RERANK: bool = Field(
+        os.getenv("FACE_TEMPLATES_RERANK", "false").lower() == "true",
+        description="プロトタイプで取得した候補をテンプレートとの最大類似度で再ランキングするかどうか",
+    )
+    FACE_TEMPLATES_RERANK_CANDIDATES: int = Field(
+        int(os.getenv("FACE_TEMPLATES_RERANK_CANDIDATES", "20")),
+        description="テンプレートで再ランキングする候補ユーザー数",
+    )
+
+    # 登録の書き込みキュー設定
+    WRITE_QUEUE_ENABLED: bool = Field(
+        os.getenv("WRITE_QUEUE_ENABLED", "false").lower() == "true",
+        description="同時に届いた顔の登録をまとめてベクトルストアに書き込むかどうか",
+    )
+    WRITE_QUEUE_MAX_BATCH: int = Field(
+        int(os.getenv("WRITE_QUEUE_MAX_BATCH", "256")),
+        description="1回にまとめて書き込む最大件数（達した時点で書き込み）",
+    )
+    WRITE_QUEUE_MAX_DELAY_MS: int = Field(
+        int(os.getenv("WRITE_QUEUE_MAX_DELAY_MS", "50")),
+        description="最初の登録からまとめて書き込むまでの最大待ち時間（ミリ秒）",
+    )
+    WRITE_QUEUE_READ_YOUR_WRITES_SECONDS: float = Field(
+        float(os.getenv("WRITE_QUEUE_READ_YOUR_WRITES_SECONDS", "10")),
+        description="Milvusに書き込んだ顔特徴を自プロセスの検索結果に合成する時間（秒、0で無効）。他のワーカーの書き込みには適用されない",
+    )
+
+    # 拠点（パーティションキー）設定
+    MILVUS_PARTITION_KEY_ENABLED: bool = Field(
+        os.getenv("MILVUS_PARTITION_KEY_ENABLED", "false").lower() == "true",
+        description="ユーザーの拠点(site)をパーティションキーとして保存し、拠点を指定した検索で対象を絞り込むかどうか。コレクション作成時のみ反映",
+    )
+    MILVUS_NUM_PARTITIONS: int = Field(
+        int(os.getenv("MILVUS_NUM_PARTITIONS", "16")),
+        description="パーティションキーのパーティション数",
+    )
+
+    # 一括登録設定
+    BULK_ENROLL_BATCH_SIZE: int = Field(
+        int(os.getenv("BULK_ENROLL_BATCH_SIZE", "64")),
+        description="一括登録で1回にまとめて推論・登録する画像数",
+    )
+    BULK_ENROLL_WORKERS: int = Field(
+        int(os.getenv("BULK_ENROLL_WORKERS", "4")),
+        description="一括登録で画像のデコードと顔検出を並列に行うスレッド数",
+    )
+    BULK_ENROLL_DIR: str = Field(
+        os.getenv("BULK_ENROLL_DIR", "./data/bulk_enroll"),
+        description="管理APIでアップロードされたアーカイブと一括登録のレポートを保存するディレクトリ",
+    )
+    BULK_ENROLL_MAX_BYTES: int = Field(
+        int(os.getenv("BULK_ENROLL_MAX_BYTES", str(2 * 1024 * 1024 * 1024))),
+        description="管理APIでアップロードできるアーカイブの最大バイト数",
+    )
+
+    # Milvusの一括インポート設定（Milvusが参照するMinIO/S3）
+    MILVUS_BULK_S3_ENDPOINT: str = Field(
+        os.getenv("MILVUS_BULK_S3_ENDPOINT", "localhost:9000"),
+        description="Milvusが使用するMinIO/S3のエンドポイント",
+    )
+    MILVUS_BULK_S3_BUCKET: str = Field(
+        os.getenv("MILVUS_BULK_S3_BUCKET", "a-bucket"),
+        description="Milvusが使用するMinIO/S3のバケット名",
+    )
+    MILVUS_BULK_S3_ACCESS_KEY: str = Field(
+        os.getenv("MILVUS_BULK_S3_ACCESS_KEY", "minioadmin"),
+        description="MinIO/S3のアクセスキー",
+    )
+    MILVUS_BULK_S3_SECRET_KEY: str = Field(
+        os.getenv("MILVUS_BULK_S3_SECRET_KEY", "minioadmin"),
+        description="MinIO/S3のシークレットキー",
+    )
+    MILVUS_BULK_S3_SECURE: bool = Field(
+        os.getenv("MILVUS_BULK_S3_SECURE", "false").lower() == "true",
+        description="MinIO/S3にHTTPSで接続するかどうか",
+    )
+    MILVUS_BULK_REMOTE_PATH: str = Field(
+        os.getenv("MILVUS_BULK_REMOTE_PATH", "bulk_import"),
+        description="一括インポート用のファイルを書き込むバケット内のパス",
+    )
+    SNAPSHOT_DIR: str = Field(
+        os.getenv("SNAPSHOT_DIR", "./data/snapshots"),
+        description="埋め込みのスナップショットを保存するディレクトリ（モデル名ごとに分かれます）",
+    )
+    REEMBED_DIR: str = Field(
+        os.getenv("REEMBED_DIR", "./data/reembed"),
+        description="モデル更新時の再埋め込みジョブのチェックポイントを保存するディレクトリ",
+    )
+
+    @property
+    def INDEX_EMB_DIM(self) -> int:
+        """インデックスに登録する埋め込みの次元数（射影が有効な場合は射影後の次元数）"""
+        if self.EMB_PROJECTION_ENABLED:
+            return self.EMB_PROJECTION_DIM
+        return self.MODEL_EMB_DIM
     # class Config:
     #     """環境ファイル設定を定義するPydantic設定クラス。"""
 
@@ -5,17 +5,60 @@
 SQLデータベースの両方のデータベース接続を初期化および管理します。
 """
 
-from .init_milvus import FACE_FEATURES_COLLECTION, get_milvus_client
+from .init_milvus import (
+    FACE_FEATURES_COLLECTION,
+    FACE_TEMPLATES_COLLECTION,
+    FEATURE_CODE_FIELD,
+    create_shadow_features_collection,
+    drop_face_features_index,
+    ensure_face_features_index,
+    feature_model_check_loop,
+    feature_model_mismatch,
+    feature_model_name,
+    get_feature_storage,
+    get_milvus_client,
+    get_milvus_pool,
+    get_search_params,
+    index_auto_select_loop,
+    index_lock,
+    milvus_pool_health_loop,
+    resolve_face_features_collection,
+    swap_face_features_alias,
+)
+from .init_milvus import close_db as milvus_close
 from .init_milvus import init_db as milvus_init
+from .milvus_pool import is_transient_milvus_error, milvus_status_code
+from .maintenance import compaction_maintenance_loop, run_face_features_maintenance
 from .init_sql import TORTOISE_ORM
 from .init_sql import init_db as sql_init
 from .init_account import create_init_account
 
 __ALL__ = [
     "milvus_init",
+    "milvus_close",
     "sql_init",
     "TORTOISE_ORM",
     "get_milvus_client",
+    "get_milvus_pool",
+    "milvus_pool_health_loop",
+    "milvus_status_code",
+    "is_transient_milvus_error",
     "FACE_FEATURES_COLLECTION",
+    "FACE_TEMPLATES_COLLECTION",
+    "FEATURE_CODE_FIELD",
+    "get_feature_storage",
+    "feature_model_name",
+    "feature_model_mismatch",
+    "feature_model_check_loop",
+    "get_search_params",
+    "ensure_face_features_index",
+    "drop_face_features_index",
+    "create_shadow_features_collection",
+    "resolve_face_features_collection",
+    "swap_face_features_alias",
+    "index_auto_select_loop",
+    "index_lock",
+    "compaction_maintenance_loop",
+    "run_face_features_maintenance",
     "create_init_account",
 ]
@@ -5,6 +5,12 @@ Milvus用データベース初期化モジュール。
 Milvusベクトルデータベースの初期化とセットアップを処理します。
 """
 
+import asyncio
+import math
+import os
+import time
+
+import numpy as np
 from loguru import logger
 from pymilvus import (
     Collection,
@@ -13,25 +19,86 @@ from pymilvus import (
     FieldSchema,
     MilvusClient,
     connections,
+    db,
     utility,
 )
 
 from ..core import _CONFIG_
+from .locks import FileLock
+from .milvus_pool import MilvusClientPool
 
 # コレクション名を定義
 FACE_FEATURES_COLLECTION = "face_features"
 USER_ACCOUNTS_COLLECTION = "user_accounts"
+FACE_TEMPLATES_COLLECTION = "face_templates"
+
+FEATURE_VECTOR_INDEX = "feature_vector_index"
+
+# 符号で2値化した顔特徴のフィールドとインデックス
+FEATURE_CODE_FIELD = "feature_code"
+FEATURE_CODE_INDEX = "feature_code_index"
+
+# 埋め込みを生成したモデル名を記録するコレクションのプロパティ
+FEATURE_MODEL_PROPERTY = "faceapi.model"
+
+# 顔特徴と共に保存するスカラー属性のフィールド
+SITE_FIELD = "site"
+ACTIVE_FIELD = "is_active"
+ADMIN_FIELD = "is_admin"
+ATTRIBUTE_FIELDS = [SITE_FIELD, ACTIVE_FIELD, ADMIN_FIELD]
+
+# 埋め込みの保存形式とMilvusのデータ型の対応
+VECTOR_DATA_TYPES = {
+    "FLOAT": DataType.FLOAT_VECTOR,
+    "FLOAT16": DataType.FLOAT16_VECTOR,
+    "BFLOAT16": DataType.BFLOAT16_VECTOR,
+}
+
+# サポートするインデックス種類
+SUPPORTED_INDEX_TYPES = ["FLAT", "HNSW", "IVF_FLAT", "IVF_SQ8", "IVF_PQ"]
+
+# グローバルMilvusクライアントのプール
+MILVUS_POOL = None
+
+# 顔特徴コレクションに現在構築されているインデックス種類
+CURRENT_INDEX_TYPE = None
+
+# 顔特徴コレクションの実際の保存形式（既存コレクションではスキーマから取得）
+FEATURE_STORAGE = {"dtype": "FLOAT", "binary": False, "attributes": [], "model": None}
+
+# インデックスの再構築中に書き込まれた行を取り込む回数の上限
+_CATCH_UP_PASSES = 5
+
+# 書き込み元のホストとの時刻のずれを見込んで取り込む範囲を広げる幅（ミリ秒）
+_CATCH_UP_MARGIN_MS = 60_000
+
+# 再構築でコレクションを複製する際に1回に読み書きする件数
+_COPY_BATCH_SIZE = 1000
+
+
+def _create_client(alias: str) -> MilvusClient:
+    """
+    プール用に独立したgRPCチャネルを持つMilvusクライアントを生成。
 
-# グローバルMilvusクライアントインスタンス
-MILVUS_CLIENT = None
+    同じ接続先のクライアントでもチャネルを共有しないよう、pymilvusのバージョンに
+    応じて接続名（alias）または専用接続（dedicated）を指定します。
+    """
+    return MilvusClient(
+        uri=f"http://{_CONFIG_.MILVUS_DB_HOST}:{_CONFIG_.MILVUS_DB_PORT}",
+        user=_CONFIG_.MILVUS_DB_USER,
+        password=_CONFIG_.MILVUS_DB_PASSWORD,
+        db_name=_CONFIG_.MILVUS_DB_DB_NAME,
+        alias=alias,
+        dedicated=True,
+    )
 
 
 async def init_db():
     """データベース接続を初期化し、存在しない場合はコレクションを作成"""
-    global MILVUS_CLIENT
+    global MILVUS_POOL
 
     try:
-        # 最初にデータベースなしで接続し、存在しない場合はデータベースを作成
+        # ORM（Collection、utility）用の接続。データベースを作成してから切り替える
         connections.connect(
             alias="default",
             host=_CONFIG_.MILVUS_DB_HOST,
@@ -39,46 +106,27 @@ async def init_db():
             user=_CONFIG_.MILVUS_DB_USER,
             password=_CONFIG_.MILVUS_DB_PASSWORD,
         )
-
-        # 存在しない場合はデータベースを作成
-        temp_client = MilvusClient(
-            uri=f"http://{_CONFIG_.MILVUS_DB_HOST}:{_CONFIG_.MILVUS_DB_PORT}",
-            user=_CONFIG_.MILVUS_DB_USER,
-            password=_CONFIG_.MILVUS_DB_PASSWORD,
-        )
-
-        # データベースが存在するか確認し、存在しない場合は作成
-        existing_dbs = temp_client.list_databases()
-        if _CONFIG_.MILVUS_DB_DB_NAME not in existing_dbs:
+        if _CONFIG_.MILVUS_DB_DB_NAME not in db.list_database(using="default"):
             logger.info(
                 f"データベース {_CONFIG_.MILVUS_DB_DB_NAME} が存在しないため、作成しています..."
             )
-            temp_client.create_database(_CONFIG_.MILVUS_DB_DB_NAME)
+            db.create_database(_CONFIG_.MILVUS_DB_DB_NAME, using="default")
+        db.using_database(_CONFIG_.MILVUS_DB_DB_NAME, using="default")
 
-        # 特定のデータベースに接続
-        connections.disconnect("default")
-        connections.connect(
-            alias="default",
-            host=_CONFIG_.MILVUS_DB_HOST,
-            port=_CONFIG_.MILVUS_DB_PORT,
-            user=_CONFIG_.MILVUS_DB_USER,
-            password=_CONFIG_.MILVUS_DB_PASSWORD,
-            db_name=_CONFIG_.MILVUS_DB_DB_NAME,
-        )
-
-        # 特定のデータベースに接続されたグローバルMilvusクライアントを初期化
-        MILVUS_CLIENT = MilvusClient(
-            uri=f"http://{_CONFIG_.MILVUS_DB_HOST}:{_CONFIG_.MILVUS_DB_PORT}",
-            user=_CONFIG_.MILVUS_DB_USER,
-            password=_CONFIG_.MILVUS_DB_PASSWORD,
-            db_name=_CONFIG_.MILVUS_DB_DB_NAME,
-        )
+        # 特定のデータベースに接続されたクライアントのプールを初期化
+        if MILVUS_POOL is not None:
+            MILVUS_POOL.close()
+        MILVUS_POOL = MilvusClientPool(_create_client, _CONFIG_.MILVUS_POOL_SIZE)
 
         logger.info("Milvusへの接続に成功しました")
 
         # 存在しない場合は顔特徴コレクションを作成
         await create_face_features_collection()
 
+        # 複数テンプレートが有効な場合はテンプレートのサイドコレクションを作成
+        if _CONFIG_.FACE_TEMPLATES_ENABLED:
+            await create_face_templates_collection()
+
     except Exception as e:
         logger.error(f"データベース初期化エラー: {e}")
         raise
@@ -90,27 +138,342 @@ async def create_face_features_collection():
     milvus_client = get_milvus_client()
 
     try:
-        # コレクションが存在するか確認
-        if FACE_FEATURES_COLLECTION in milvus_client.list_collections():
-            logger.info(f"コレクション {FACE_FEATURES_COLLECTION} は既に存在します")
-            return
+        # コレクションが存在するか確認（再埋め込み後はエイリアス）
+        exists = FACE_FEATURES_COLLECTION in milvus_client.list_collections() or (
+            _describe_features_alias(milvus_client) is not None
+        )
     except Exception:
-        # コレクションが存在しない場合やエラーの場合、新しく作成
-        pass
+        # 確認できない場合は新しく作成
+        exists = False
+    if exists:
+        logger.info(f"コレクション {FACE_FEATURES_COLLECTION} は既に存在します")
+        # 次元数やモデルの不一致はここで送出し、起動を中止する
+        _load_feature_storage(milvus_client)
+        await ensure_face_features_index()
+        return
+
+    vector_dtype = _CONFIG_.MILVUS_VECTOR_DTYPE.upper()
+    if vector_dtype not in VECTOR_DATA_TYPES:
+        raise ValueError(
+            f"MILVUS_VECTOR_DTYPEは{list(VECTOR_DATA_TYPES)}のいずれかである必要があります"
+        )
+
+    # 検索時にMilvus内で無効なユーザーを除外するためのユーザー状態
+    attributes = [ACTIVE_FIELD, ADMIN_FIELD]
+    if _CONFIG_.MILVUS_PARTITION_KEY_ENABLED:
+        attributes.append(SITE_FIELD)
+
+    # コレクションを作成
+    _create_features_collection(
+        milvus_client,
+        FACE_FEATURES_COLLECTION,
+        vector_dtype,
+        _CONFIG_.MILVUS_BINARY_CODES,
+        attributes,
+        feature_model_name(),
+    )
+
+    FEATURE_STORAGE.update(
+        dtype=vector_dtype,
+        binary=_CONFIG_.MILVUS_BINARY_CODES,
+        attributes=attributes,
+        model=feature_model_name(),
+    )
+
+    # 件数0の状態で設定に応じたインデックスを作成
+    _create_feature_index(milvus_client, select_index_type(0), 0)
+    if FEATURE_STORAGE["binary"]:
+        _create_code_index(milvus_client)
+
+    # コレクションをロード
+    milvus_client.load_collection(FACE_FEATURES_COLLECTION)
+
+    logger.info(f"コレクション {FACE_FEATURES_COLLECTION} を作成しました")
+
+    return FACE_FEATURES_COLLECTION
+
 
-    # スキーマを作成
+def _create_features_collection(
+    milvus_client,
+    collection_name: str,
+    vector_dtype: str,
+    binary: bool,
+    attributes,
+    model: str,
+):
+    """
+    顔特徴コレクションのスキーマでコレクションを作成（インデックスは作成しない）。
+
+    引数:
+        milvus_client: Milvusクライアント
+        collection_name: 作成するコレクション名
+        vector_dtype: 埋め込みの保存形式（FLOAT, FLOAT16, BFLOAT16）
+        binary: 2値コードのフィールドを持つかどうか
+        attributes: 保存するスカラー属性のリスト
+        model: 書き込む埋め込みを生成するモデル名（プロパティに記録）
+    """
     schema = MilvusClient.create_schema()
     schema.add_field("user_id", DataType.INT64, is_primary=True)
+    schema.add_field(
+        "feature_vector", VECTOR_DATA_TYPES[vector_dtype], dim=_CONFIG_.INDEX_EMB_DIM
+    )
+    if binary:
+        schema.add_field(
+            FEATURE_CODE_FIELD, DataType.BINARY_VECTOR, dim=_CONFIG_.INDEX_EMB_DIM
+        )
+    schema.add_field("update_at", DataType.INT64)
+    for name in (ACTIVE_FIELD, ADMIN_FIELD):
+        if name in attributes:
+            schema.add_field(name, DataType.BOOL)
+
+    collection_options = {}
+    if SITE_FIELD in attributes:
+        # 拠点ごとに検索対象のパーティションを絞り込むためのパーティションキー
+        schema.add_field(
+            SITE_FIELD, DataType.VARCHAR, max_length=64, is_partition_key=True
+        )
+        collection_options["num_partitions"] = _CONFIG_.MILVUS_NUM_PARTITIONS
+
+    milvus_client.create_collection(
+        collection_name=collection_name,
+        schema=schema,
+        properties={FEATURE_MODEL_PROPERTY: model},
+        **collection_options,
+    )
+
+
+async def create_face_templates_collection():
+    """Milvusに顔テンプレートのサイドコレクションを作成"""
+    milvus_client = get_milvus_client()
+
+    if FACE_TEMPLATES_COLLECTION in milvus_client.list_collections():
+        logger.info(f"コレクション {FACE_TEMPLATES_COLLECTION} は既に存在します")
+        milvus_client.load_collection(FACE_TEMPLATES_COLLECTION)
+        return FACE_TEMPLATES_COLLECTION
+
+    # テンプレートID = user_id * FACE_TEMPLATES_MAX_PER_USER + スロット番号
+    schema = MilvusClient.create_schema()
+    schema.add_field("template_id", DataType.INT64, is_primary=True)
+    schema.add_field("user_id", DataType.INT64)
     schema.add_field(
         "feature_vector", DataType.FLOAT_VECTOR, dim=_CONFIG_.MODEL_EMB_DIM
     )
     schema.add_field("update_at", DataType.INT64)
 
-    # コレクションを作成
+    # プロトタイプの再計算で直前の書き込みを読むため強い一貫性で作成
     milvus_client.create_collection(
-        collection_name=FACE_FEATURES_COLLECTION,
+        collection_name=FACE_TEMPLATES_COLLECTION,
         schema=schema,
+        consistency_level="Strong",
+    )
+
+    # テンプレートは主キーで取得するため、ロードに必要な最小限のインデックスのみ作成
+    index_params = MilvusClient.prepare_index_params()
+    index_params.add_index(
+        field_name="feature_vector",
+        metric_type="COSINE",
+        index_type="FLAT",
+        index_name="template_vector_index",
+    )
+    milvus_client.create_index(
+        collection_name=FACE_TEMPLATES_COLLECTION,
+        index_params=index_params,
+        sync=True,
     )
+    milvus_client.load_collection(FACE_TEMPLATES_COLLECTION)
+
+    logger.info(f"コレクション {FACE_TEMPLATES_COLLECTION} を作成しました")
+
+    return FACE_TEMPLATES_COLLECTION
+
+
+def feature_model_name() -> str:
+    """
+    このプロセスが埋め込みに使うモデル名を返す。
+
+    モデルローダーとモデルファイル名からなり、射影を使う場合は次元数を付けます。
+    """
+    name = os.path.splitext(os.path.basename(_CONFIG_.MODEL_PATH.rstrip("/\\")))[0]
+    name = f"{_CONFIG_.MODEL_LOADER}-{name}"
+    if _CONFIG_.EMB_PROJECTION_ENABLED:
+        name += f"-pca{_CONFIG_.INDEX_EMB_DIM}"
+    return name
+
+
+def _load_feature_storage(milvus_client):
+    """既存コレクションのスキーマから埋め込みの保存形式とモデル名を取得"""
+    info = milvus_client.describe_collection(collection_name=FACE_FEATURES_COLLECTION)
+    # 次元数の検査より先に読み、別のモデルへの切り替えを検知できるようにする
+    FEATURE_STORAGE["model"] = (info.get("properties") or {}).get(
+        FEATURE_MODEL_PROPERTY
+    )
+    if FEATURE_STORAGE["model"] is None:
+        # モデル名を記録する前に作成されたコレクションには現在のモデル名を記録
+        FEATURE_STORAGE["model"] = feature_model_name()
+        try:
+            milvus_client.alter_collection_properties(
+                collection_name=resolve_face_features_collection(),
+                properties={FEATURE_MODEL_PROPERTY: FEATURE_STORAGE["model"]},
+            )
+            logger.info(
+                f"コレクション {FACE_FEATURES_COLLECTION} にモデル名 "
+                f"{FEATURE_STORAGE['model']} を記録しました"
+            )
+        except Exception as e:
+            logger.warning(f"モデル名をコレクションに記録できませんでした: {e}")
+    fields = {field["name"]: field["type"] for field in info.get("fields", [])}
+    dims = {
+        field["name"]: int(field.get("params", {}).get("dim", 0))
+        for field in info.get("fields", [])
+    }
+    if dims.get("feature_vector") != _CONFIG_.INDEX_EMB_DIM:
+        raise RuntimeError(
+            f"コレクション {FACE_FEATURES_COLLECTION} の次元数 {dims.get('feature_vector')} が"
+            f"埋め込みの次元数 {_CONFIG_.INDEX_EMB_DIM} と一致しません"
+        )
+    for dtype, data_type in VECTOR_DATA_TYPES.items():
+        if fields.get("feature_vector") == data_type:
+            FEATURE_STORAGE["dtype"] = dtype
+    FEATURE_STORAGE["binary"] = FEATURE_CODE_FIELD in fields
+    FEATURE_STORAGE["attributes"] = [
+        name for name in ATTRIBUTE_FIELDS if name in fields
+    ]
+
+    # 保存形式はコレクション作成時に決まるため、設定と異なる場合は警告のみ
+    if (
+        FEATURE_STORAGE["dtype"] != _CONFIG_.MILVUS_VECTOR_DTYPE.upper()
+        or FEATURE_STORAGE["binary"] != _CONFIG_.MILVUS_BINARY_CODES
+        or (SITE_FIELD in FEATURE_STORAGE["attributes"])
+        != _CONFIG_.MILVUS_PARTITION_KEY_ENABLED
+    ):
+        logger.warning(
+            f"コレクション {FACE_FEATURES_COLLECTION} の保存形式 {FEATURE_STORAGE} が"
+            "設定と異なります。既存のスキーマを使用します"
+        )
+    if ACTIVE_FIELD not in FEATURE_STORAGE["attributes"]:
+        logger.warning(
+            f"コレクション {FACE_FEATURES_COLLECTION} に {ACTIVE_FIELD} フィールドがないため、"
+            "検索時に無効なユーザーを除外できません。コレクションを再作成してください"
+        )
+
+
+def get_feature_storage() -> dict:
+    """
+    顔特徴コレクションの保存形式を返す。
+
+    戻り値:
+        {"dtype": FLOAT/FLOAT16/BFLOAT16, "binary": 2値コードの有無,
+         "attributes": 保存されているスカラー属性のリスト,
+         "model": 埋め込みを生成したモデル名} の辞書
+    """
+    return dict(FEATURE_STORAGE)
+
+
+def feature_model_mismatch():
+    """
+    face_features の埋め込みのモデルがこのプロセスのモデルと異なる場合はその名前を返す。
+
+    再埋め込みで別のモデルのコレクションに切り替わった後も古い設定のまま
+    動いているサーバーが、互換性のない埋め込みで照合・登録しないために使用します。
+
+    戻り値:
+        コレクションのモデル名（一致する場合やMilvusを使用しない場合はNone）
+    """
+    model = FEATURE_STORAGE.get("model")
+    if model is None or model == feature_model_name():
+        return None
+    return model
+
+
+def select_index_type(row_count: int) -> str:
+    """
+    設定と件数から使用するインデックス種類を決定。
+
+    引数:
+        row_count: コレクション内のエンティティ数
+
+    戻り値:
+        インデックス種類
+    """
+    index_type = _CONFIG_.MILVUS_INDEX_TYPE.upper()
+    if index_type != "AUTO":
+        if index_type not in SUPPORTED_INDEX_TYPES:
+            raise ValueError(
+                f"MILVUS_INDEX_TYPEは{SUPPORTED_INDEX_TYPES}またはAUTOである必要があります"
+            )
+        return index_type
+
+    if row_count <= _CONFIG_.MILVUS_AUTO_FLAT_MAX_ROWS:
+        return "FLAT"
+    if row_count <= _CONFIG_.MILVUS_AUTO_HNSW_MAX_ROWS:
+        return "HNSW"
+    return "IVF_SQ8"
+
+
+def _ivf_nlist(row_count: int) -> int:
+    """IVF系インデックスのクラスタ数を決定（未設定時は4*sqrt(N)）"""
+    if _CONFIG_.MILVUS_IVF_NLIST > 0:
+        return _CONFIG_.MILVUS_IVF_NLIST
+    return int(min(65536, max(128, 4 * math.sqrt(max(row_count, 1)))))
+
+
+def build_index_params(index_type: str, row_count: int = 0) -> dict:
+    """
+    インデックス構築パラメータを生成。
+
+    引数:
+        index_type: インデックス種類
+        row_count: コレクション内のエンティティ数（IVFのクラスタ数計算に使用）
+
+    戻り値:
+        インデックス構築パラメータの辞書
+    """
+    if index_type == "HNSW":
+        return {
+            "M": _CONFIG_.MILVUS_HNSW_M,
+            "efConstruction": _CONFIG_.MILVUS_HNSW_EF_CONSTRUCTION,
+        }
+    if index_type in ("IVF_FLAT", "IVF_SQ8"):
+        return {"nlist": _ivf_nlist(row_count)}
+    if index_type == "IVF_PQ":
+        return {
+            "nlist": _ivf_nlist(row_count),
+            "m": _CONFIG_.MILVUS_IVF_PQ_M,
+            "nbits": 8,
+        }
+    return {}
+
+
+def get_search_params(index_type: str = None, radius: float = None) -> dict:
+    """
+    現在のインデックスに対応する検索パラメータを生成。
+
+    引数:
+        index_type: インデックス種類（省略時は現在構築されているもの）
+        radius: 範囲検索の閾値（省略時はMODEL_THRESHOLD）
+
+    戻り値:
+        searchに渡す検索パラメータの辞書
+    """
+    index_type = index_type or CURRENT_INDEX_TYPE or "FLAT"
+    params = {
+        "radius": _CONFIG_.MODEL_THRESHOLD if radius is None else radius,
+    }
+    if index_type == "HNSW":
+        params["ef"] = _CONFIG_.MILVUS_HNSW_EF
+    elif index_type.startswith("IVF"):
+        params["nprobe"] = _CONFIG_.MILVUS_IVF_NPROBE
+    return {"metric_type": "COSINE", "params": params}
+
+
+def _create_feature_index(
+    milvus_client,
+    index_type: str,
+    row_count: int,
+    collection_name: str = FACE_FEATURES_COLLECTION,
+):
+    """顔特徴ベクトルフィールドにインデックスを作成"""
+    global CURRENT_INDEX_TYPE
 
     # インデックスパラメータを設定
     index_params = MilvusClient.prepare_index_params()
@@ -119,29 +482,533 @@ async def create_face_features_collection():
     index_params.add_index(
         field_name="feature_vector",
         metric_type="COSINE",
-        index_type="FLAT",
-        index_name="feature_vector_index",
+        index_type=index_type,
+        index_name=FEATURE_VECTOR_INDEX,
+        params=build_index_params(index_type, row_count),
     )
 
     # インデックスを作成
     milvus_client.create_index(
-        collection_name=FACE_FEATURES_COLLECTION,
+        collection_name=collection_name,
         index_params=index_params,
         sync=True,  # 同期的にインデックス作成を待つ
     )
+    if collection_name == FACE_FEATURES_COLLECTION:
+        CURRENT_INDEX_TYPE = index_type
+    logger.info(f"インデックス {index_type} を作成しました (rows={row_count})")
 
-    # コレクションをロード
-    milvus_client.load_collection(FACE_FEATURES_COLLECTION)
 
-    logger.info(f"コレクション {FACE_FEATURES_COLLECTION} を作成しました")
+def _create_code_index(milvus_client, collection_name: str = FACE_FEATURES_COLLECTION):
+    """2値コードフィールドにハミング距離のインデックスを作成"""
+    index_params = MilvusClient.prepare_index_params()
+    index_params.add_index(
+        field_name=FEATURE_CODE_FIELD,
+        metric_type="HAMMING",
+        index_type="BIN_FLAT",
+        index_name=FEATURE_CODE_INDEX,
+    )
+    milvus_client.create_index(
+        collection_name=collection_name,
+        index_params=index_params,
+        sync=True,
+    )
+    logger.info("2値コードのインデックス BIN_FLAT を作成しました")
 
-    return FACE_FEATURES_COLLECTION
+
+def _describe_index_type(
+    milvus_client,
+    index_name: str = FEATURE_VECTOR_INDEX,
+    collection_name: str = FACE_FEATURES_COLLECTION,
+):
+    """構築済みのインデックス種類を取得（存在しない場合はNone）"""
+    try:
+        info = milvus_client.describe_index(
+            collection_name=collection_name, index_name=index_name
+        )
+    except Exception:
+        return None
+    if not info:
+        return None
+    return info.get("index_type")
 
 
-def get_milvus_client():
-    """グローバルMilvusクライアントインスタンスを返す"""
-    if MILVUS_CLIENT is None:
+async def ensure_face_features_index():
+    """
+    設定と件数に合ったインデックスが構築されているか確認し、必要なら再構築。
+
+    インデックスの構築には時間がかかるため、イベントループを止めないよう
+    別スレッドで実行します。
+
+    戻り値:
+        現在のインデックス種類
+    """
+    return await asyncio.to_thread(_ensure_face_features_index)
+
+
+def index_lock() -> FileLock:
+    """インデックスの再構築とコレクションの保守を同じホストのワーカー間で排他するロック"""
+    return FileLock(_CONFIG_.MILVUS_INDEX_LOCK_PATH)
+
+
+def _index_state(milvus_client):
+    """
+    face_features の実体のコレクション名・件数・目標と現在のインデックス種類を取得。
+
+    戻り値:
+        (コレクション名, 件数, 目標のインデックス種類, 現在のインデックス種類,
+         2値コードのインデックスが不足しているかどうか)
+    """
+    # インデックスの操作はエイリアスではなく実体のコレクションに対して行う
+    collection_name = resolve_face_features_collection()
+    stats = milvus_client.get_collection_stats(collection_name=collection_name)
+    row_count = int(stats.get("row_count", 0))
+    current = _describe_index_type(milvus_client, collection_name=collection_name)
+    missing_code_index = (
+        FEATURE_STORAGE["binary"]
+        and _describe_index_type(milvus_client, FEATURE_CODE_INDEX, collection_name)
+        is None
+    )
+    return (
+        collection_name,
+        row_count,
+        select_index_type(row_count),
+        current,
+        missing_code_index,
+    )
+
+
+def _ensure_face_features_index():
+    """ensure_face_features_indexの同期処理"""
+    global CURRENT_INDEX_TYPE
+    milvus_client = get_milvus_client()
+    _, _, target, current, missing_code_index = _index_state(milvus_client)
+    CURRENT_INDEX_TYPE = current
+    if current == target and not missing_code_index:
+        return current
+
+    # 再構築は1つのプロセスのみが行い、他のワーカーは次の見直しに任せる
+    lock = index_lock()
+    if not lock.acquire(blocking=False):
+        logger.info("他のプロセスがインデックスを再構築中のため見直しを省略します")
+        return current
+    try:
+        # ロックを待つ間に他のプロセスが再構築を終えている場合がある
+        collection_name, row_count, target, current, missing_code_index = (
+            _index_state(milvus_client)
+        )
+        CURRENT_INDEX_TYPE = current
+        if current == target and not missing_code_index:
+            return current
+
+        logger.info(
+            f"インデックスを {current} から {target} に再構築します (rows={row_count})"
+        )
+        if current is None:
+            # ベクトルのインデックスがないコレクションはロードできず、検索に
+            # 使われていないため、その場でインデックスを作成してロードする
+            _create_feature_index(milvus_client, target, row_count, collection_name)
+            if missing_code_index:
+                _create_code_index(milvus_client, collection_name)
+            milvus_client.load_collection(collection_name)
+            CURRENT_INDEX_TYPE = target
+            return target
+
+        rebuild_face_features_index(milvus_client, row_count)
+        return target
+    finally:
+        lock.release()
+
+
+def _now_ms() -> int:
+    """エポックからのミリ秒"""
+    return int(time.time() * 1000)
+
+
+def _copy_feature_rows(
+    milvus_client, source: str, target: str, since: int = None, newer_only=False
+) -> int:
+    """
+    顔特徴の行を別のコレクションに複製。
+
+    引数:
+        milvus_client: Milvusクライアント
+        source: 複製元のコレクション名
+        target: 複製先のコレクション名
+        since: 指定した場合は update_at がこの時刻（ミリ秒）以降の行のみ複製
+        newer_only: 複製先に存在し、複製先より新しい行のみ書き込むかどうか
+            （複製先で削除された行を復活させない）
+
+    戻り値:
+        書き込んだ行数
+    """
+    from ..vector_store.codec import binary_codes, decode_vector, encode_vectors
+
+    storage = get_feature_storage()
+    iterator = milvus_client.query_iterator(
+        collection_name=source,
+        batch_size=_COPY_BATCH_SIZE,
+        filter="" if since is None else f"update_at >= {int(since)}",
+        output_fields=["user_id", "feature_vector", "update_at"]
+        + storage["attributes"],
+        consistency_level="Strong",
+    )
+    copied = 0
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            if newer_only:
+                existing = {
+                    int(row["user_id"]): int(row["update_at"])
+                    for row in milvus_client.get(
+                        collection_name=target,
+                        ids=[int(row["user_id"]) for row in batch],
+                        output_fields=["user_id", "update_at"],
+                        consistency_level="Strong",
+                    )
+                }
+                batch = [
+                    row
+                    for row in batch
+                    if int(row["user_id"]) in existing
+                    and int(row["update_at"]) > existing[int(row["user_id"])]
+                ]
+                if not batch:
+                    continue
+            vectors = np.stack(
+                [
+                    decode_vector(row["feature_vector"], storage["dtype"])
+                    for row in batch
+                ]
+            )
+            entities = [
+                {
+                    "user_id": int(row["user_id"]),
+                    "feature_vector": vector,
+                    "update_at": int(row["update_at"]),
+                    **{name: row[name] for name in storage["attributes"]},
+                }
+                for row, vector in zip(
+                    batch, encode_vectors(vectors, storage["dtype"])
+                )
+            ]
+            if storage["binary"]:
+                for entity, code in zip(entities, binary_codes(vectors)):
+                    entity[FEATURE_CODE_FIELD] = code
+            milvus_client.upsert(collection_name=target, data=entities)
+            copied += len(entities)
+    finally:
+        iterator.close()
+    return copied
+
+
+def _collect_ids(milvus_client, collection_name: str, before: int = None) -> set:
+    """コレクションのユーザーID（before を指定した場合は update_at がそれより前の行）"""
+    iterator = milvus_client.query_iterator(
+        collection_name=collection_name,
+        batch_size=_COPY_BATCH_SIZE * 10,
+        filter="" if before is None else f"update_at < {int(before)}",
+        output_fields=["user_id"],
+        consistency_level="Strong",
+    )
+    ids = set()
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                return ids
+            ids.update(int(row["user_id"]) for row in batch)
+    finally:
+        iterator.close()
+
+
+def _remove_deleted_rows(
+    milvus_client, source: str, target: str, before: int = None
+) -> int:
+    """
+    複製元から削除された行を複製先からも削除。
+
+    引数:
+        before: 指定した場合は複製先の update_at がこの時刻より前の行のみ対象
+            （切り替え後に複製先へ直接登録された行を残す）
+
+    戻り値:
+        削除した行数
+    """
+    stale = sorted(
+        _collect_ids(milvus_client, target, before)
+        - _collect_ids(milvus_client, source)
+    )
+    for start in range(0, len(stale), _COPY_BATCH_SIZE):
+        milvus_client.delete(
+            collection_name=target, ids=stale[start : start + _COPY_BATCH_SIZE]
+        )
+    return len(stale)
+
+
+def rebuild_face_features_index(milvus_client, row_count: int) -> str:
+    """
+    件数に合ったインデックスで face_features を作り直し、エイリアスを切り替える。
+
+    インデックスの削除にはコレクションの解放が必要なため、検索に使われている
+    コレクションには触れず、新しいインデックスを持つシャドウコレクションに行を
+    複製してから face_features エイリアスを切り替えます。複製中の書き込みは
+    update_at で、削除はユーザーIDの差分で取り込み、切り替え後に元の
+    コレクションを削除します。呼び出し側で index_lock() を取得してください。
+
+    引数:
+        milvus_client: Milvusクライアント
+        row_count: コレクション内のエンティティ数（インデックス種類の選択に使用）
+
+    戻り値:
+        切り替え後の実体のコレクション名
+    """
+    global CURRENT_INDEX_TYPE
+    source = resolve_face_features_collection()
+    shadow = f"{FACE_FEATURES_COLLECTION}_index_{time.strftime('%Y%m%d%H%M%S')}"
+    # 埋め込みは複製するだけのため、元のコレクションのモデル名を引き継ぐ
+    _create_shadow_features_collection(
+        shadow, row_count, FEATURE_STORAGE.get("model") or feature_model_name()
+    )
+    try:
+        since = _now_ms() - _CATCH_UP_MARGIN_MS
+        copied = _copy_feature_rows(milvus_client, source, shadow)
+        logger.info(f"{source} の {copied} 件を {shadow} に複製しました")
+        # 複製中に書き込まれた行を、取り込む行がなくなるまで繰り返し取り込む
+        for _ in range(_CATCH_UP_PASSES):
+            marker = _now_ms() - _CATCH_UP_MARGIN_MS
+            copied = _copy_feature_rows(milvus_client, source, shadow, since)
+            since = marker
+            if copied == 0:
+                break
+        _remove_deleted_rows(milvus_client, source, shadow)
+        swapped_at = _now_ms()
+        previous = _swap_face_features_alias(shadow)
+    except BaseException:
+        milvus_client.drop_collection(collection_name=shadow)
+        raise
+    CURRENT_INDEX_TYPE = select_index_type(row_count)
+
+    # 最後の取り込みから切り替えまでの間に元のコレクションで更新・削除された行を反映
+    _copy_feature_rows(milvus_client, previous, shadow, since, newer_only=True)
+    _remove_deleted_rows(milvus_client, previous, shadow, before=swapped_at)
+    milvus_client.release_collection(collection_name=previous)
+    milvus_client.drop_collection(collection_name=previous)
+    logger.info(f"インデックスを再構築した {shadow} に切り替え、{previous} を削除しました")
+    return shadow
+
+
+async def drop_face_features_index():
+    """
+    顔特徴コレクションを解放し、ベクトルと2値コードのインデックスを削除。
+
+    大量のデータを一括インポートする前に呼び出し、インポート後に
+    ensure_face_features_index() で件数に合ったインデックスを一度だけ構築します。
+    """
+    await asyncio.to_thread(_drop_face_features_index)
+
+
+def _drop_face_features_index():
+    """drop_face_features_indexの同期処理"""
+    global CURRENT_INDEX_TYPE
+    milvus_client = get_milvus_client()
+    collection_name = resolve_face_features_collection()
+    milvus_client.release_collection(collection_name=collection_name)
+    for index_name in (FEATURE_VECTOR_INDEX, FEATURE_CODE_INDEX):
+        if _describe_index_type(milvus_client, index_name, collection_name) is not None:
+            milvus_client.drop_index(
+                collection_name=collection_name, index_name=index_name
+            )
+    CURRENT_INDEX_TYPE = None
+    logger.info(f"コレクション {FACE_FEATURES_COLLECTION} のインデックスを削除しました")
+
+
+def _describe_features_alias(milvus_client):
+    """face_features エイリアスの参照先コレクション名（エイリアスでない場合はNone）"""
+    try:
+        info = milvus_client.describe_alias(alias=FACE_FEATURES_COLLECTION)
+    except Exception:
+        return None
+    return info.get("collection_name") or None
+
+
+def resolve_face_features_collection() -> str:
+    """
+    face_features の実体のコレクション名を返す。
+
+    再埋め込みでコレクションを切り替えた後は face_features はエイリアスとなり、
+    参照先のコレクション名を返します。
+    """
+    return (
+        _describe_features_alias(get_milvus_client()) or FACE_FEATURES_COLLECTION
+    )
+
+
+async def create_shadow_features_collection(
+    collection_name: str, expected_rows: int = 0
+):
+    """
+    再埋め込み用に face_features と同じ保存形式のシャドウコレクションを作成。
+
+    既に存在する場合（中断した再埋め込みの再開）はロードのみ行います。
+    シャドウコレクションにはこのプロセスのモデル名を記録します。
+
+    引数:
+        collection_name: シャドウコレクション名
+        expected_rows: 書き込む予定の件数（インデックス種類の選択に使用）
+    """
+    await asyncio.to_thread(
+        _create_shadow_features_collection,
+        collection_name,
+        expected_rows,
+        feature_model_name(),
+    )
+
+
+def _create_shadow_features_collection(
+    collection_name: str, expected_rows: int, model: str
+):
+    """create_shadow_features_collectionの同期処理"""
+    milvus_client = get_milvus_client()
+    if collection_name not in milvus_client.list_collections():
+        storage = get_feature_storage()
+        _create_features_collection(
+            milvus_client,
+            collection_name,
+            storage["dtype"],
+            storage["binary"],
+            storage["attributes"],
+            model,
+        )
+        _create_feature_index(
+            milvus_client,
+            select_index_type(expected_rows),
+            expected_rows,
+            collection_name,
+        )
+        if storage["binary"]:
+            _create_code_index(milvus_client, collection_name)
+        logger.info(f"シャドウコレクション {collection_name} を作成しました")
+    milvus_client.load_collection(collection_name)
+
+
+async def swap_face_features_alias(collection_name: str) -> str:
+    """
+    face_features エイリアスを指定したコレクションに切り替える。
+
+    face_features が既にエイリアスの場合は alter_alias で不可分に切り替えます。
+    初回のみ実体の face_features コレクションを改名してからエイリアスを作成するため、
+    その間（数ミリ秒）だけ face_features を参照できません。
+
+    引数:
+        collection_name: 切り替え先のコレクション名
+
+    戻り値:
+        切り替え前の実体のコレクション名（ロールバック用に残されます）
+    """
+    return await asyncio.to_thread(_swap_face_features_alias, collection_name)
+
+
+def _swap_face_features_alias(collection_name: str) -> str:
+    """swap_face_features_aliasの同期処理"""
+    milvus_client = get_milvus_client()
+    previous = _describe_features_alias(milvus_client)
+    if previous == collection_name:
+        return previous
+    if previous is not None:
+        milvus_client.alter_alias(
+            collection_name=collection_name, alias=FACE_FEATURES_COLLECTION
+        )
+    else:
+        previous = f"{FACE_FEATURES_COLLECTION}_{time.strftime('%Y%m%d%H%M%S')}"
+        milvus_client.rename_collection(
+            old_name=FACE_FEATURES_COLLECTION, new_name=previous
+        )
+        milvus_client.create_alias(
+            collection_name=collection_name, alias=FACE_FEATURES_COLLECTION
+        )
+    _load_feature_storage(milvus_client)
+    logger.info(
+        f"{FACE_FEATURES_COLLECTION} を {previous} から {collection_name} に切り替えました"
+    )
+    return previous
+
+
+async def index_auto_select_loop():
+    """AUTOモードで件数の変化に応じて定期的にインデックスを見直すバックグラウンドタスク"""
+    interval = _CONFIG_.MILVUS_INDEX_CHECK_INTERVAL
+    if _CONFIG_.MILVUS_INDEX_TYPE.upper() != "AUTO" or interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await ensure_face_features_index()
+        except Exception as e:
+            logger.error(f"インデックスの見直しに失敗しました: {e}")
+
+
+async def feature_model_check_loop():
+    """
+    face_features のモデル名を定期的に読み直すバックグラウンドタスク。
+
+    他のプロセスが再埋め込みでエイリアスを切り替えた場合に、このプロセスの
+    照合と登録を止められるようにします（feature_model_mismatch を参照）。
+    """
+    interval = _CONFIG_.MILVUS_MODEL_CHECK_INTERVAL
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            info = await asyncio.to_thread(
+                get_milvus_client().describe_collection,
+                collection_name=FACE_FEATURES_COLLECTION,
+            )
+        except Exception as e:
+            logger.error(f"顔特徴コレクションのモデル名の確認に失敗しました: {e}")
+            continue
+        model = (info.get("properties") or {}).get(FEATURE_MODEL_PROPERTY)
+        if model is not None and model != FEATURE_STORAGE.get("model"):
+            logger.warning(
+                f"{FACE_FEATURES_COLLECTION} のモデルが {FEATURE_STORAGE.get('model')} "
+                f"から {model} に変わりました"
+            )
+            FEATURE_STORAGE["model"] = model
+
+
+async def milvus_pool_health_loop():
+    """プールしたMilvusクライアントを定期的に確認し、応答しないものを再接続するタスク"""
+    interval = _CONFIG_.MILVUS_POOL_HEALTH_INTERVAL
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(
+                get_milvus_pool().check_health, _CONFIG_.MILVUS_CALL_TIMEOUT
+            )
+        except Exception as e:
+            logger.error(f"Milvusクライアントのヘルスチェックに失敗しました: {e}")
+
+
+def close_db():
+    """プールしたMilvusクライアントの接続を閉じる"""
+    global MILVUS_POOL
+    if MILVUS_POOL is not None:
+        MILVUS_POOL.close()
+        MILVUS_POOL = None
+
+
+def get_milvus_pool() -> MilvusClientPool:
+    """グローバルMilvusクライアントのプールを返す"""
+    if MILVUS_POOL is None:
         raise RuntimeError(
             "Milvusクライアントが初期化されていません。まずinit_db()を呼び出してください。"
         )
-    return MILVUS_CLIENT
+    return MILVUS_POOL
+
+
+def get_milvus_client():
+    """プールから振り分け先のMilvusクライアントを返す"""
+    return get_milvus_pool().get()
@@ -0,0 +1,94 @@
+"""
+プロセス間の排他制御モジュール。
+
+同じホストで動く複数のワーカー（faceapi --workers）やCLIが、同じデータを
+同時に書き換えないようにするためのファイルロックを提供します。
+ロックはfcntlのアドバイザリロックのため、別のホストのプロセスとは排他されません。
+"""
+
+import fcntl
+import os
+from typing import Optional
+
+
+class FileLock:
+    """
+    fcntlによるファイルロック。
+
+    プロセスが終了するとOSがロックを解放するため、異常終了してもロックは残りません。
+    ロックファイルには保持しているプロセスが任意の状態を記録できます。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def locked(self) -> bool:
+        """このオブジェクトがロックを保持しているかどうか"""
+        return self._fd is not None
+
+    def acquire(self, blocking: bool = True, shared: bool = False) -> bool:
+        """
+        ロックを取得。
+
+        引数:
+            blocking: 他のプロセスが保持している場合に解放を待つかどうか
+            shared: 共有ロックとして取得するかどうか（読み取り同士は排他しない）
+
+        戻り値:
+            ロックを取得できたかどうか（blocking=Falseで保持されていた場合はFalse）
+        """
+        if self._fd is not None:
+            raise RuntimeError(f"ロック {self.path} は既に取得されています")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            fcntl.flock(fd, mode | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    def release(self):
+        """ロックを解放"""
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def read_state(self) -> str:
+        """ロックファイルに記録された状態を読み出す（ロックの保持中に使用）"""
+        if self._fd is None:
+            raise RuntimeError(f"ロック {self.path} を取得していません")
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        chunks = []
+        while True:
+            chunk = os.read(self._fd, 4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks).decode("utf-8")
+
+    def write_state(self, state: str):
+        """ロックファイルに状態を記録（ロックの保持中に使用）"""
+        if self._fd is None:
+            raise RuntimeError(f"ロック {self.path} を取得していません")
+        os.ftruncate(self._fd, 0)
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, state.encode("utf-8"))
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
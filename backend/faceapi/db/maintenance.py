@@ -0,0 +1,338 @@
+"""
+顔特徴コレクションの保守（コンパクションとインデックスの再構築）モジュール。
+
+登録のupsertや batch_reset_face_data_service の削除を繰り返すと、小さなセグメントと
+削除済み（tombstone）の行が溜まり、検索が少しずつ遅くなります。
+セグメント数と削除済みの行の割合を定期的に確認し、閾値を超えた場合、または
+閑散時間帯（MILVUS_MAINTENANCE_WINDOW）に入った場合にコンパクションを実行して、
+件数に合わなくなったインデックスを再構築します。
+効果を確認できるよう、保守の前後で検索のレイテンシを計測してログに出力します。
+
+インデックスの自動選択と同じロック（MILVUS_INDEX_LOCK_PATH）で同じホストの
+ワーカー間を排他し、閑散時間帯に保守した日もロックファイルに記録して共有します。
+インデックスの再構築は検索に使われているコレクションを解放せず、シャドウ
+コレクションに複製してからエイリアスを切り替えます。
+"""
+
+import asyncio
+import datetime
+import json
+import time
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+from pymilvus import utility
+
+from ..core import _CONFIG_
+from .init_milvus import (
+    FEATURE_VECTOR_INDEX,
+    _ivf_nlist,
+    get_feature_storage,
+    get_milvus_client,
+    get_search_params,
+    index_lock,
+    rebuild_face_features_index,
+    resolve_face_features_collection,
+    select_index_type,
+)
+
+# 保守の完了を待つ際の確認間隔（秒）
+_POLL_INTERVAL = 5
+
+
+def _parse_window(window: str):
+    """時間帯の文字列（"HH:MM-HH:MM" 形式）を (開始, 終了) の datetime.time に変換"""
+    start, end = (
+        datetime.datetime.strptime(part.strip(), "%H:%M").time()
+        for part in window.split("-")
+    )
+    return start, end
+
+
+def current_maintenance_window(
+    now: Optional[datetime.datetime] = None,
+) -> Optional[datetime.date]:
+    """
+    現在時刻を含む閑散時間帯の開始日を返す。
+
+    日付をまたぐ時間帯（例: 23:00-04:00）の場合、翌日の04:00までは前日の時間帯として
+    扱います。
+
+    引数:
+        now: 判定する時刻（省略時は現在のローカル時刻）
+
+    戻り値:
+        時間帯の開始日（MILVUS_MAINTENANCE_WINDOW の外または未設定の場合はNone）
+    """
+    if not _CONFIG_.MILVUS_MAINTENANCE_WINDOW:
+        return None
+    start, end = _parse_window(_CONFIG_.MILVUS_MAINTENANCE_WINDOW)
+    now = now or datetime.datetime.now()
+    current = now.time()
+    if start <= end:
+        return now.date() if start <= current < end else None
+    if current >= start:
+        return now.date()
+    if current < end:
+        return now.date() - datetime.timedelta(days=1)
+    return None
+
+
+def collect_segment_stats(collection_name: str) -> dict:
+    """
+    コレクションのセグメントと削除済みの行の統計を取得。
+
+    引数:
+        collection_name: 実体のコレクション名
+
+    戻り値:
+        {"segments": セグメント数, "small_segments": 小さなセグメント数,
+         "excess_small_segments": パーティションごとに1つを除いた小さなセグメント数,
+         "rows": 削除済みを含む行数, "live_rows": 有効な行数,
+         "deleted_ratio": 削除済みの行の割合} の辞書
+    """
+    milvus_client = get_milvus_client()
+    segments = utility.get_query_segment_info(collection_name, using="default")
+    small_per_partition = Counter(
+        segment.partitionID
+        for segment in segments
+        if segment.num_rows < _CONFIG_.MILVUS_MAINTENANCE_SMALL_SEGMENT_ROWS
+    )
+    # 統計の行数はコンパクションまで削除済みの行を含む
+    stats = milvus_client.get_collection_stats(collection_name=collection_name)
+    rows = int(stats.get("row_count", 0))
+    result = milvus_client.query(
+        collection_name=collection_name, filter="", output_fields=["count(*)"]
+    )
+    live_rows = int(result[0]["count(*)"]) if result else 0
+    deleted_rows = max(rows - live_rows, 0)
+    return {
+        "segments": len(segments),
+        "small_segments": sum(small_per_partition.values()),
+        "excess_small_segments": excess_small_segments(small_per_partition.values()),
+        "rows": rows,
+        "live_rows": live_rows,
+        "deleted_ratio": deleted_rows / rows if rows else 0.0,
+    }
+
+
+def excess_small_segments(small_per_partition) -> int:
+    """
+    コンパクションで減らせる小さなセグメント数。
+
+    セグメントはパーティションをまたいで統合されないため、パーティションキーを
+    使う場合は件数の少ないパーティションごとに小さなセグメントが1つ残ります。
+    パーティションごとに1つを除いて数え、閾値を超え続けないようにします。
+
+    引数:
+        small_per_partition: パーティションごとの小さなセグメント数
+
+    戻り値:
+        パーティションごとに1つを除いた小さなセグメント数の合計
+    """
+    return sum(max(count - 1, 0) for count in small_per_partition)
+
+
+def needs_compaction(stats: dict) -> bool:
+    """統計が小さなセグメント数または削除済みの行の割合の閾値を超えているか判定"""
+    return (
+        stats["excess_small_segments"] >= _CONFIG_.MILVUS_MAINTENANCE_MAX_SMALL_SEGMENTS
+        or stats["deleted_ratio"] >= _CONFIG_.MILVUS_MAINTENANCE_DELETED_RATIO
+    )
+
+
+def measure_search_latency(
+    collection_name: str, samples: int = None
+) -> Optional[float]:
+    """
+    保存されている顔特徴で検索し、レイテンシの中央値を計測。
+
+    引数:
+        collection_name: 実体のコレクション名
+        samples: 検索する件数（省略時はMILVUS_MAINTENANCE_PROBE_SAMPLES）
+
+    戻り値:
+        レイテンシの中央値（ミリ秒、コレクションが空の場合はNone）
+    """
+    from ..vector_store.codec import decode_vector, encode_vectors
+
+    samples = samples or _CONFIG_.MILVUS_MAINTENANCE_PROBE_SAMPLES
+    if samples <= 0:
+        return None
+    milvus_client = get_milvus_client()
+    storage = get_feature_storage()
+    rows = milvus_client.query(
+        collection_name=collection_name,
+        filter="",
+        output_fields=["feature_vector"],
+        limit=samples,
+    )
+    if not rows:
+        return None
+
+    search_params = get_search_params()
+    search_params["params"].pop("radius")
+    latencies = []
+    for row in rows:
+        vector = decode_vector(row["feature_vector"], storage["dtype"])
+        started = time.perf_counter()
+        milvus_client.search(
+            collection_name=collection_name,
+            data=encode_vectors(vector[np.newaxis], storage["dtype"]),
+            anns_field="feature_vector",
+            limit=10,
+            search_params=search_params,
+            timeout=_CONFIG_.MILVUS_CALL_TIMEOUT,
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+    return float(np.median(latencies))
+
+
+def _wait_for_compaction(milvus_client, job_id: int, deadline: float):
+    """コンパクションの完了を待つ"""
+    while milvus_client.get_compaction_state(job_id) != "Completed":
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"コンパクション {job_id} が時間内に完了しませんでした")
+        time.sleep(_POLL_INTERVAL)
+
+
+def _wait_for_index(milvus_client, collection_name: str, deadline: float):
+    """コンパクションで作られたセグメントのインデックス構築を待つ"""
+    while True:
+        info = milvus_client.describe_index(
+            collection_name=collection_name, index_name=FEATURE_VECTOR_INDEX
+        )
+        if not info or int(info.get("pending_index_rows", 0)) == 0:
+            return
+        if time.monotonic() > deadline:
+            raise TimeoutError("インデックスの構築が時間内に完了しませんでした")
+        time.sleep(_POLL_INTERVAL)
+
+
+def _index_is_stale(milvus_client, collection_name: str, row_count: int) -> bool:
+    """
+    インデックスの種類またはIVFのクラスタ数が現在の件数に合っていないか判定。
+
+    クラスタ数は構築時の件数で決まるため、削除や登録で件数が大きく変わった場合は
+    （2倍以上の差）再構築します。
+    """
+    info = milvus_client.describe_index(
+        collection_name=collection_name, index_name=FEATURE_VECTOR_INDEX
+    )
+    if not info:
+        return True
+    index_type = info.get("index_type")
+    if index_type != select_index_type(row_count):
+        return True
+    if not index_type.startswith("IVF") or _CONFIG_.MILVUS_IVF_NLIST > 0:
+        return False
+    nlist = int(info.get("nlist") or info.get("params", {}).get("nlist", 0))
+    target = _ivf_nlist(row_count)
+    return nlist <= 0 or max(nlist, target) >= 2 * min(nlist, target)
+
+
+def _last_window_run(lock) -> Optional[str]:
+    """ロックファイルに記録された、最後に保守した閑散時間帯の開始日"""
+    try:
+        return json.loads(lock.read_state() or "{}").get("window")
+    except ValueError:
+        return None
+
+
+def _run_maintenance(force: bool) -> dict:
+    """run_face_features_maintenanceの同期処理"""
+    # 保守とインデックスの再構築は1つのプロセスのみが行う
+    lock = index_lock()
+    if not lock.acquire(blocking=False):
+        logger.info("他のプロセスが保守またはインデックスの再構築中のため省略します")
+        return {"ran": False, "locked": True}
+    try:
+        return _run_locked_maintenance(lock, force)
+    finally:
+        lock.release()
+
+
+def _run_locked_maintenance(lock, force: bool) -> dict:
+    """ロックを取得した状態で保守を実行"""
+    milvus_client = get_milvus_client()
+    collection_name = resolve_face_features_collection()
+
+    stats = collect_segment_stats(collection_name)
+    # 閑散時間帯は閾値に関係なく、すべてのワーカーを通じて1回だけ実行する
+    window = current_maintenance_window()
+    in_window = window is not None and window.isoformat() != _last_window_run(lock)
+    if not (force or in_window or needs_compaction(stats)):
+        return {"ran": False, "before": stats}
+    if in_window:
+        lock.write_state(json.dumps({"window": window.isoformat()}))
+
+    logger.info(
+        f"{collection_name} の保守を開始します: segments={stats['segments']} "
+        f"small={stats['small_segments']} "
+        f"(excess={stats['excess_small_segments']}) "
+        f"deleted={stats['deleted_ratio']:.1%} rows={stats['live_rows']}"
+    )
+    latency_before = measure_search_latency(collection_name)
+    deadline = time.monotonic() + _CONFIG_.MILVUS_MAINTENANCE_TIMEOUT
+
+    job_id = milvus_client.compact(collection_name=collection_name)
+    _wait_for_compaction(milvus_client, job_id, deadline)
+    _wait_for_index(milvus_client, collection_name, deadline)
+
+    rebuilt = _index_is_stale(milvus_client, collection_name, stats["live_rows"])
+    if rebuilt:
+        # 検索に使われているコレクションは解放せず、シャドウで作り直して切り替える
+        collection_name = rebuild_face_features_index(milvus_client, stats["live_rows"])
+
+    after = collect_segment_stats(collection_name)
+    latency_after = measure_search_latency(collection_name)
+    logger.info(
+        f"{collection_name} の保守が完了しました: segments "
+        f"{stats['segments']}->{after['segments']}, deleted "
+        f"{stats['deleted_ratio']:.1%}->{after['deleted_ratio']:.1%}, "
+        f"index rebuilt={rebuilt}, search latency "
+        f"{_format_latency(latency_before)}->{_format_latency(latency_after)}"
+    )
+    return {
+        "ran": True,
+        "before": stats,
+        "after": after,
+        "index_rebuilt": rebuilt,
+        "latency_before_ms": latency_before,
+        "latency_after_ms": latency_after,
+    }
+
+
+def _format_latency(latency: Optional[float]) -> str:
+    return "n/a" if latency is None else f"{latency:.1f}ms"
+
+
+async def run_face_features_maintenance(force: bool = False) -> dict:
+    """
+    必要に応じて顔特徴コレクションのコンパクションとインデックスの再構築を実行。
+
+    コンパクションとインデックスの構築には時間がかかるため、イベントループを
+    止めないよう別スレッドで実行します。
+
+    引数:
+        force: 閾値や時間帯に関係なく実行するかどうか
+
+    戻り値:
+        {"ran": 実行したかどうか, "before": 実行前の統計, ...} の辞書
+    """
+    return await asyncio.to_thread(_run_maintenance, force)
+
+
+async def compaction_maintenance_loop():
+    """顔特徴コレクションの統計を定期的に確認し、必要に応じて保守するタスク"""
+    interval = _CONFIG_.MILVUS_MAINTENANCE_INTERVAL
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_face_features_maintenance()
+        except Exception as e:
+            logger.error(f"顔特徴コレクションの保守に失敗しました: {e}")
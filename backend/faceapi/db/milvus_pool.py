@@ -0,0 +1,158 @@
+"""
+Milvusクライアントのプールモジュール。
+
+1つのクライアント（gRPCチャネル）を全リクエストで共有すると、同時実行時に
+そのチャネルが詰まって後続の呼び出しを待たせるため、独立したチャネルを持つ
+クライアントを複数保持し、実行中の呼び出しが最も少ないクライアントに
+（同数の場合はラウンドロビンで）振り分けます。
+応答しなくなったクライアントはヘルスチェックで検出して接続し直します。
+"""
+
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import grpc
+from loguru import logger
+from pymilvus import MilvusClient
+from pymilvus.exceptions import MilvusException, MilvusUnavailableException
+
+# 再試行や別のチャネルで回復し得るgRPCのステータスコード
+TRANSIENT_STATUS_CODES = (
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.UNAVAILABLE,
+)
+
+
+def milvus_status_code(error: BaseException) -> Optional[grpc.StatusCode]:
+    """
+    Milvus呼び出しの例外からgRPCのステータスコードを取り出す。
+
+    pymilvusはDEADLINE_EXCEEDEDなどをgrpc.RpcErrorのまま送出し、接続断などで
+    内部の再試行を使い切った場合はステータスコードを code に持つ MilvusException を
+    送出するため、例外とその原因（__cause__）を順にたどって確認します。
+
+    引数:
+        error: Milvus呼び出しで送出された例外
+
+    戻り値:
+        ステータスコード（gRPCのエラーでない場合はNone）
+    """
+    while error is not None:
+        if isinstance(error, MilvusUnavailableException):
+            return grpc.StatusCode.UNAVAILABLE
+        if isinstance(error, grpc.RpcError) and callable(getattr(error, "code", None)):
+            return error.code()
+        if isinstance(error, MilvusException) and isinstance(
+            error.code, grpc.StatusCode
+        ):
+            return error.code
+        error = error.__cause__
+    return None
+
+
+def is_transient_milvus_error(error: BaseException) -> bool:
+    """タイムアウトや接続断など、再試行で回復し得るエラーかどうか"""
+    return milvus_status_code(error) in TRANSIENT_STATUS_CODES
+
+
+class MilvusClientPool:
+    """
+    独立したgRPCチャネルを持つMilvusClientのプール。
+
+    引数:
+        factory: 接続名を受け取ってクライアントを生成する関数
+        size: クライアント数
+    """
+
+    def __init__(self, factory: Callable[[str], MilvusClient], size: int):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._generation = itertools.count()
+        self._counter = itertools.count()
+        self._clients = [self._connect() for _ in range(max(size, 1))]
+        self._in_flight = [0] * len(self._clients)
+        self._healthy = [True] * len(self._clients)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def _connect(self) -> MilvusClient:
+        """新しい接続名でクライアントを生成（再接続時に壊れた接続を再利用しない）"""
+        return self._factory(f"faceapi-pool-{next(self._generation)}")
+
+    def _select(self) -> int:
+        """実行中の呼び出しが最も少ない正常なクライアントの番号（同数はラウンドロビン）"""
+        size = len(self._clients)
+        start = next(self._counter) % size
+        order = [(start + offset) % size for offset in range(size)]
+        # すべて異常な場合は再接続を待たずにいずれかを使用
+        candidates = [index for index in order if self._healthy[index]] or order
+        return min(candidates, key=lambda index: self._in_flight[index])
+
+    def get(self) -> MilvusClient:
+        """振り分け先のクライアントを返す（管理操作などの単発の呼び出し用）"""
+        with self._lock:
+            return self._clients[self._select()]
+
+    @contextmanager
+    def client(self) -> Iterator[MilvusClient]:
+        """呼び出しの間だけクライアントを借りる（実行中の呼び出しとして数える）"""
+        with self._lock:
+            index = self._select()
+            self._in_flight[index] += 1
+            client = self._clients[index]
+        try:
+            yield client
+        except Exception as e:
+            # 接続できないチャネルは次のヘルスチェックで接続し直すまで振り分けない
+            # （pymilvusは接続断をgrpc.RpcErrorやコード付きのMilvusExceptionで送出する）
+            if milvus_status_code(e) == grpc.StatusCode.UNAVAILABLE:
+                self._healthy[index] = False
+            raise
+        finally:
+            with self._lock:
+                self._in_flight[index] -= 1
+
+    def check_health(self, timeout: float):
+        """
+        各クライアントに問い合わせ、応答しないものを接続し直す。
+
+        引数:
+            timeout: 問い合わせのタイムアウト（秒）
+        """
+        for index, client in enumerate(list(self._clients)):
+            try:
+                client.get_server_version(timeout=timeout)
+                self._healthy[index] = True
+                continue
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning(f"Milvusクライアント {index} が応答しません: {e}")
+            self.reconnect(index)
+
+    def reconnect(self, index: int):
+        """クライアントを新しい接続に置き換える"""
+        try:
+            client = self._connect()
+        except Exception as e:  # pylint: disable=broad-except
+            self._healthy[index] = False
+            logger.error(f"Milvusクライアント {index} の再接続に失敗しました: {e}")
+            return
+        with self._lock:
+            previous, self._clients[index] = self._clients[index], client
+            self._healthy[index] = True
+        self._close(previous)
+        logger.info(f"Milvusクライアント {index} を再接続しました")
+
+    def close(self):
+        """すべてのクライアントの接続を閉じる"""
+        for client in self._clients:
+            self._close(client)
+
+    @staticmethod
+    def _close(client: MilvusClient):
+        try:
+            client.close()
+        except Exception:  # pylint: disable=broad-except
+            pass
@@ -9,8 +9,11 @@ from contextlib import asynccontextmanager
 
 import uvicorn
 from faceapi.core import _CONFIG_
-from faceapi.db import TORTOISE_ORM, create_init_account, milvus_init, sql_init
+from faceapi.db import TORTOISE_ORM, create_init_account, sql_init
 from faceapi.routes import admin, face, user
+from faceapi.services import sync_vector_attributes_service
+from faceapi.utils import RequestSizeLimitMiddleware
+from faceapi.vector_store import close_vector_store, init_vector_store
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from tortoise.contrib.fastapi import register_tortoise
@@ -20,10 +23,19 @@ from tortoise.contrib.fastapi import register_tortoise
 async def lifespan(_: FastAPI):
     """起動およびシャットダウンイベントのライフスパンイベントハンドラ"""
     # 起動イベント
-    await asyncio.gather(milvus_init(), sql_init())
+    vector_store, _ = await asyncio.gather(init_vector_store(), sql_init())
     await create_init_account()
+    # ユーザーの有効状態などをベクトルストアの属性に反映
+    await sync_vector_attributes_service()
+    # ベクトルストアのバックグラウンドタスク（インデックス見直し、複製の同期など）
+    background_tasks = [
+        asyncio.create_task(job) for job in vector_store.background_jobs()
+    ]
     yield
     # シャットダウンイベント（もしあれば）
+    for task in background_tasks:
+        task.cancel()
+    await close_vector_store()
 
 
 app = FastAPI(
@@ -38,6 +50,10 @@ register_tortoise(
     config=TORTOISE_ORM,
 )
 
+# アップロードのサイズをマルチパートの解析前に制限（413にもCORSヘッダーを付けるため
+# CORSミドルウェアより内側）
+app.add_middleware(RequestSizeLimitMiddleware)
+
 # CORSミドルウェアを追加r
 app.add_middleware(
     CORSMiddleware,
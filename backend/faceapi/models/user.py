@@ -28,6 +28,8 @@ class UserModel(Model):
     updated_at = fields.DatetimeField(auto_now=True)
     head_pic = fields.TextField(null=True)
     is_admin = fields.BooleanField(default=False)
+    # 拠点・テナント（顔特徴のパーティションキーとしても使用）
+    site = fields.CharField(max_length=64, null=True)
 
     class Meta:
         """テーブル設定を定義するメタクラス。"""
@@ -9,14 +9,16 @@ import logging
 from traceback import print_exc
 from typing import Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from tortoise.transactions import atomic
 
 from ..models import UserModel
 from ..schemas import (
     BatchOperationRequest,
     BatchOperationResult,
+    BulkEnrollJob,
     DataResponse,
+    FaceSearchPage,
     ListResponse,
     User,
     UserCreateAsAdmin,
@@ -28,8 +30,12 @@ from ..services import (
     batch_reset_face_data_service,
     batch_reset_password_service,
     create_user_as_admin_service,
+    get_bulk_enroll_job,
     get_user_service,
     list_users_service,
+    save_bulk_enroll_upload,
+    search_faces_service,
+    start_bulk_enroll_job,
     update_face_embedding_service,
     update_user_as_admin_service,
     validate_user_update_uniqueness,
@@ -340,6 +346,8 @@ async def batch_operation(
 async def update_face_embedding_as_admin(
     user_id: int,
     image: UploadFile = File(...),
+    face_box: Optional[str] = Form(None),
+    replace: bool = Form(False),
 ):
     """
     指定されたユーザーの顔埋め込みを管理者として更新。
@@ -349,12 +357,16 @@ async def update_face_embedding_as_admin(
     引数:
         user_id (int): 顔埋め込みを更新するユーザーのID
         image (UploadFile): ユーザーの顔を含むアップロードされた画像
+        face_box (Optional[str]): クライアント側で検出された顔の矩形 "x,y,w,h"
+        replace (bool): 既存のテンプレートを破棄して置き換えるかどうか
 
     戻り値:
         埋め込みが更新されたことを示す成功メッセージ
     """
     try:
-        result = await update_face_embedding_service(user_id, image)
+        result = await update_face_embedding_service(
+            user_id, image, face_box, replace
+        )
         return result
     except HTTPException:
         raise
@@ -362,3 +374,149 @@ async def update_face_embedding_as_admin(
         print_exc()
         logger.error("顔埋め込み更新エラー: %s", str(e))
         raise e
+
+
+@router.post(
+    "/face/search",
+    response_model=DataResponse[FaceSearchPage],
+    dependencies=[Depends(get_current_admin_user)],
+)
+async def search_faces(
+    image: Optional[UploadFile] = File(None),
+    face_box: Optional[str] = Form(None),
+    site: Optional[str] = Form(None),
+    is_active: Optional[bool] = Form(None),
+    min_score: Optional[float] = Form(None),
+    page_size: int = Form(20),
+    cursor: Optional[str] = Form(None),
+    page: int = Form(1),
+):
+    """
+    アップロードされた画像の顔に似ているユーザーを類似度の降順に返す管理者エンドポイント。
+
+    最初のページは画像を指定し、続きのページはレスポンスのcursorを指定して取得します。
+    結果がなくなった時点でcursorはnullになります。
+    カーソルはワーカーごとに保持されるため、スティッキーセッションのない複数ワーカー
+    構成では、続きのページでも画像とpageを送ると別のワーカーで検索し直せます。
+
+    引数:
+        image (Optional[UploadFile]): 顔を含むアップロードされた画像（最初のページ）
+        face_box (Optional[str]): クライアント側で検出された顔の矩形 "x,y,w,h"
+        site (Optional[str]): 指定した場合はその拠点のユーザーのみを検索
+        is_active (Optional[bool]): 指定した場合は有効状態が一致するユーザーのみを検索
+        min_score (Optional[float]): 指定した場合は類似度がこの値より大きいユーザーのみ
+        page_size (int): 1ページの件数（上限はFACE_SEARCH_MAX_PAGE_SIZE）
+        cursor (Optional[str]): 前のページのレスポンスに含まれるカーソル
+        page (int): カーソルが見つからない場合に画像で検索し直すページ番号
+
+    戻り値:
+        類似度の降順のユーザーと次のページのカーソル
+    """
+    try:
+        result = await search_faces_service(
+            image, face_box, site, is_active, min_score, page_size, cursor, page
+        )
+        return DataResponse[FaceSearchPage](
+            success=True,
+            message="Face search completed",
+            code=200,
+            data=FaceSearchPage(**result),
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print_exc()
+        logger.error("顔検索エラー: %s", str(e))
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error searching faces: {str(e)}",
+        ) from e
+
+
+@router.post(
+    "/face/bulk",
+    response_model=DataResponse[BulkEnrollJob],
+    dependencies=[Depends(get_current_admin_user)],
+)
+async def bulk_enroll_faces(
+    archive: UploadFile = File(...),
+    mapping: Optional[UploadFile] = File(None),
+    by_folder: bool = Form(False),
+    replace: bool = Form(False),
+):
+    """
+    zipアーカイブ内の画像を一括登録するジョブをバックグラウンドで開始。
+
+    画像は既定でファイル名（拡張子を除く）をユーザー名として対応付けます。
+
+    引数:
+        archive (UploadFile): 顔画像を含むzipアーカイブ
+        mapping (Optional[UploadFile]): "ファイル名,ユーザー名" のCSV（オプション）
+        by_folder (bool): 親フォルダ名をユーザー名として対応付けるかどうか
+        replace (bool): 既存のテンプレートを破棄して置き換えるかどうか
+
+    戻り値:
+        ジョブIDを含むジョブの状態
+    """
+    try:
+        job_id = await save_bulk_enroll_upload(archive, mapping, by_folder, replace)
+        status = start_bulk_enroll_job(job_id)
+        return DataResponse[BulkEnrollJob](
+            success=True,
+            message="Bulk enroll job started",
+            code=202,
+            data=BulkEnrollJob(**status),
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print_exc()
+        logger.error("一括登録エラー: %s", str(e))
+        raise e
+
+
+@router.get(
+    "/face/bulk/{job_id}",
+    response_model=DataResponse[BulkEnrollJob],
+    dependencies=[Depends(get_current_admin_user)],
+)
+async def get_bulk_enroll_status(job_id: str):
+    """
+    一括登録ジョブの進捗と、登録できなかったファイルの一覧を取得。
+
+    引数:
+        job_id (str): 一括登録ジョブのID
+
+    戻り値:
+        ジョブの状態
+    """
+    return DataResponse[BulkEnrollJob](
+        success=True,
+        message="Bulk enroll job status",
+        code=200,
+        data=BulkEnrollJob(**get_bulk_enroll_job(job_id)),
+    )
+
+
+@router.post(
+    "/face/bulk/{job_id}/resume",
+    response_model=DataResponse[BulkEnrollJob],
+    dependencies=[Depends(get_current_admin_user)],
+)
+async def resume_bulk_enroll(job_id: str):
+    """
+    中断した一括登録ジョブを再開（登録済みのファイルは省略し、エラーのファイルは再処理）。
+
+    引数:
+        job_id (str): 一括登録ジョブのID
+
+    戻り値:
+        ジョブの状態
+    """
+    status = start_bulk_enroll_job(job_id)
+    return DataResponse[BulkEnrollJob](
+        success=True,
+        message="Bulk enroll job resumed",
+        code=202,
+        data=BulkEnrollJob(**status),
+    )
@@ -5,14 +5,38 @@
 検証機能のAPIエンドポイントを定義します。
 """
 
+import asyncio
+import json
 import logging
+import re
 from traceback import print_exc
+from typing import Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    HTTPException,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
 from tortoise.transactions import atomic
 
-from ..services.face import update_face_embedding_service, verify_face_service
-from ..utils import get_current_user
+from ..core import _CONFIG_
+from ..schemas.user import SITE_PATTERN
+from ..services.face import (
+    update_face_embedding_service,
+    verify_face_image_service,
+    verify_face_service,
+)
+from ..utils import (
+    FaceTracker,
+    admit_image_bytes,
+    get_current_user,
+    parse_face_box,
+)
 
 router = APIRouter(
     prefix="/face",
@@ -24,18 +48,22 @@ logger = logging.getLogger(__name__)
 @router.post("/verify")
 async def verify_face(
     image: UploadFile = File(...),
+    face_box: Optional[str] = Form(None),
+    site: Optional[str] = Form(None),
 ):
     """
     アップロードされた画像から顔を検証し、拒否結果またはOAuth2トークンを返します。
 
     引数:
         image: 顔を含むアップロードされた画像ファイル
+        face_box: クライアント側で検出された顔の矩形 "x,y,w,h"（オプション）
+        site: クライアントの拠点。指定した場合はその拠点のユーザーのみを検索（オプション）
 
     戻り値:
         顔が認識された場合は拒否メッセージまたはOAuth2トークン
     """
     try:
-        result = await verify_face_service(image)
+        result = await verify_face_service(image, face_box, site)
         return result
     except HTTPException:
         raise
@@ -45,10 +73,142 @@ async def verify_face(
         raise e
 
 
+class _LatestFrameSlot:
+    """
+    最新のフレームだけを保持する1要素のバッファ。
+
+    処理が追いつかない場合、古いフレームは新しいフレームで上書きされ破棄されます。
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.face_box = None
+        self.dropped = 0
+        self.closed = False
+        self._event = asyncio.Event()
+
+    def put(self, frame: bytes, face_box=None):
+        """フレームを格納し、未処理のフレームがあれば破棄"""
+        if self.frame is not None:
+            self.dropped += 1
+        self.frame = frame
+        self.face_box = face_box
+        self._event.set()
+
+    def close(self):
+        """受信の終了を通知"""
+        self.closed = True
+        self._event.set()
+
+    async def get(self):
+        """次のフレームを待って取り出す。受信終了時はNoneを返す"""
+        while self.frame is None:
+            if self.closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        frame, face_box = self.frame, self.face_box
+        self.frame = None
+        return frame, face_box
+
+
+async def _receive_frames(websocket: WebSocket, slot: _LatestFrameSlot):
+    """
+    WebSocketからフレームを受信し続けてスロットに格納。
+
+    バイナリメッセージはJPEGフレーム、テキストメッセージは
+    {"face_box": "x,y,w,h"} 形式の顔領域ヒントとして扱います。
+    """
+    face_box = None
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                slot.put(message["bytes"], face_box)
+            elif message.get("text") is not None:
+                try:
+                    face_box = parse_face_box(
+                        json.loads(message["text"]).get("face_box")
+                    )
+                except (ValueError, AttributeError):
+                    face_box = None
+    except WebSocketDisconnect:
+        pass
+    finally:
+        slot.close()
+
+
+@router.websocket("/stream")
+async def stream_face(
+    websocket: WebSocket, continuous: bool = False, site: Optional[str] = None
+):
+    """
+    WebSocket経由で連続したフレームから顔を検証します。
+
+    クライアントはJPEGフレームをバイナリメッセージとして送信し、サーバーは
+    処理したフレームごとに /face/verify と同じ形式の結果をJSONで返します。
+    処理中に届いたフレームは最新の1枚だけが残され、顔が認識されると
+    トークンを含む結果を送信して接続を閉じます。
+    連続フレームの顔は接続ごとに追跡され、追跡が続く間は顔検出を省略します。
+
+    引数:
+        websocket: クライアントとのWebSocket接続
+        continuous: 認識後も接続を維持して検証を続けるかどうか（キオスク等）
+        site: キオスクの拠点。指定した場合はその拠点のユーザーのみを検索（オプション）
+    """
+    await websocket.accept()
+    if site and not re.match(SITE_PATTERN, site):
+        await websocket.close(code=1008)
+        return
+
+    slot = _LatestFrameSlot()
+    tracker = FaceTracker() if _CONFIG_.FACE_TRACK_ENABLED else None
+    receiver = asyncio.create_task(_receive_frames(websocket, slot))
+
+    try:
+        while True:
+            item = await slot.get()
+            if item is None:
+                break
+            frame, face_box = item
+
+            try:
+                # デコードはCPUを占有するため、受信を止めないようスレッドで実行
+                img = await asyncio.to_thread(admit_image_bytes, frame)
+            except HTTPException as e:
+                await websocket.send_json(
+                    {"recognized": False, "message": e.detail, "code": e.status_code}
+                )
+                continue
+
+            result = await verify_face_image_service(
+                img, face_box, tracker, site or None
+            )
+            result["dropped_frames"] = slot.dropped
+            await websocket.send_json(result)
+
+            if result.get("recognized") and not continuous:
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print_exc()
+        logger.error("顔ストリーム検証エラー: %s", str(e))
+        await websocket.close(code=1011)
+    finally:
+        receiver.cancel()
+
+
 @atomic()
 @router.put("/me", dependencies=[Depends(get_current_user)])
 async def update_face_embedding(
-    image: UploadFile = File(...), current_user: str = Depends(get_current_user)
+    image: UploadFile = File(...),
+    face_box: Optional[str] = Form(None),
+    replace: bool = Form(False),
+    current_user: str = Depends(get_current_user),
 ):
     """
     現在認証されているユーザーの顔埋め込みを更新します。
@@ -56,6 +216,8 @@ async def update_face_embedding(
 
     引数:
         image: 新しい顔を含むアップロードされた画像ファイル
+        face_box: クライアント側で検出された顔の矩形 "x,y,w,h"（オプション）
+        replace: 既存のテンプレートを破棄して置き換えるかどうか
         current_user: 現在認証されているユーザー（JWTトークンから）
 
     戻り値:
@@ -65,7 +227,9 @@ async def update_face_embedding(
         # トークンからユーザーIDを取得
         user_id = int(current_user)
 
-        result = await update_face_embedding_service(user_id, image)
+        result = await update_face_embedding_service(
+            user_id, image, face_box, replace
+        )
         return result
     except HTTPException:
         raise
@@ -4,10 +4,14 @@ This module imports and exposes commonly used schemas throughout the application
 """
 
 from .face import (
+    BulkEnrollFileResult,
+    BulkEnrollJob,
     FaceRecognitionRequest,
     FaceRecognitionResponse,
     FaceRecognitionResult,
     FaceRegisterRequest,
+    FaceSearchHit,
+    FaceSearchPage,
 )
 from .response import DataResponse, ListResponse
 from .user import (
@@ -40,4 +44,8 @@ __all__ = [
     "User",
     "FaceRegisterRequest",
     "FaceRecognitionResult",
+    "BulkEnrollFileResult",
+    "BulkEnrollJob",
+    "FaceSearchHit",
+    "FaceSearchPage",
 ]
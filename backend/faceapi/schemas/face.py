@@ -68,3 +68,91 @@ class FaceRecognitionResponse(BaseModel):
     results: List[FaceRecognitionResult]
     processed_image_url: Optional[str] = None
     processing_time: float
+
+
+class BulkEnrollFileResult(BaseModel):
+    """
+    Schema for the result of enrolling a single file in a bulk enrollment.
+
+    Attributes:
+        file: Path of the image inside the archive
+        username: Username the file was mapped to
+        user_id: ID of the matched user (if found)
+        status: "enrolled" or "error"
+        reason: Why the file could not be enrolled (for errors)
+    """
+
+    file: str
+    username: str
+    user_id: Optional[int] = None
+    status: str
+    reason: Optional[str] = None
+
+
+class BulkEnrollJob(BaseModel):
+    """
+    Schema for the progress of a bulk enrollment job.
+
+    Attributes:
+        job_id: ID of the job
+        state: "running", "completed", "failed" or "stopped" (not running, resumable)
+        total: Number of images in the archive
+        processed: Number of images processed in the current run
+        enrolled: Number of images enrolled in the current run
+        failed: Number of images that could not be enrolled in the current run
+        skipped: Number of images skipped because a previous run enrolled them
+        error: Error that stopped the job (if failed)
+        errors: Files that could not be enrolled
+    """
+
+    job_id: str
+    state: str
+    total: Optional[int] = None
+    processed: int = 0
+    enrolled: int = 0
+    failed: int = 0
+    skipped: int = 0
+    error: Optional[str] = None
+    errors: List[BulkEnrollFileResult] = []
+
+
+class FaceSearchHit(BaseModel):
+    """
+    Schema for a single user returned by the admin face search.
+
+    Attributes:
+        user_id: ID of the matched user
+        score: Cosine similarity between the query face and the user's face
+        username: Username of the matched user
+        full_name: Full name of the matched user
+        email: Email of the matched user
+        site: Site of the matched user
+        is_active: Whether the user is active
+        is_admin: Whether the user is an admin
+    """
+
+    user_id: int
+    score: float
+    username: str
+    full_name: Optional[str] = None
+    email: Optional[str] = None
+    site: Optional[str] = None
+    is_active: bool = True
+    is_admin: bool = False
+
+
+class FaceSearchPage(BaseModel):
+    """
+    Schema for one page of admin face search results.
+
+    Attributes:
+        results: Matched users ordered by descending score
+        page: 1-based page number
+        page_size: Requested number of results per page
+        cursor: Cursor for the next page (None when there are no more results)
+    """
+
+    results: List[FaceSearchHit]
+    page: int
+    page_size: int
+    cursor: Optional[str] = None
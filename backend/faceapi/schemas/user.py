@@ -6,7 +6,10 @@ This module contains Pydantic models for user creation, update, and representati
 from datetime import datetime
 from typing import List, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
+
+# Allowed characters for a site (tenant) name
+SITE_PATTERN = r"^[\w\-.]{0,64}$"
 
 
 class UserBase(BaseModel):
@@ -41,9 +44,11 @@ class UserCreateAsAdmin(UserCreate):
 
     Attributes:
         is_admin: Flag indicating if the user has admin privileges (default is False)
+        site: Site or tenant the user belongs to (optional)
     """
 
     is_admin: Optional[bool] = False
+    site: Optional[str] = Field(None, pattern=SITE_PATTERN)
 
 
 class UserUpdate(BaseModel):
@@ -74,9 +79,11 @@ class UserUpdateAsAdmin(UserUpdate):
 
     Attributes:
         is_admin: Updated admin status (optional)
+        site: Updated site or tenant (optional, empty string clears it)
     """
 
     is_admin: Optional[bool] = None
+    site: Optional[str] = Field(None, pattern=SITE_PATTERN)
 
 
 class UserInDB(UserBase):
@@ -90,6 +97,7 @@ class UserInDB(UserBase):
         updated_at: Timestamp when the user was last updated
         head_pic: Path or URL to the user's profile picture (optional)
         is_admin: Admin status of the user
+        site: Site or tenant the user belongs to (optional)
     """
 
     id: int
@@ -98,6 +106,7 @@ class UserInDB(UserBase):
     updated_at: datetime
     head_pic: Optional[str] = None
     is_admin: bool
+    site: Optional[str] = None
 
     class Config:
         from_attributes = True
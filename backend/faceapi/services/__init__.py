@@ -14,10 +14,21 @@ from .admin import (
     create_user_as_admin_service,
     deactivate_user_service,
     list_users_service,
+    sync_vector_attributes_service,
     update_user_as_admin_service,
     validate_user_update_uniqueness,
 )
-from .face import update_face_embedding_service, verify_face_service
+from .enroll import (
+    get_bulk_enroll_job,
+    save_bulk_enroll_upload,
+    start_bulk_enroll_job,
+)
+from .face import (
+    search_faces_service,
+    update_face_embedding_service,
+    verify_face_image_service,
+    verify_face_service,
+)
 from .user import (
     create_user_service,
     delete_user_account_service,
@@ -34,6 +45,8 @@ __ALL__ = [
     "validate_user_update_uniqueness",
     "update_face_embedding_service",
     "verify_face_service",
+    "verify_face_image_service",
+    "search_faces_service",
     "update_user_profile_service",
     "create_user_service",
     "delete_user_account_service",
@@ -43,4 +56,8 @@ __ALL__ = [
     "batch_activate_users_service",
     "batch_deactivate_users_service",
     "batch_reset_face_data_service",
+    "sync_vector_attributes_service",
+    "save_bulk_enroll_upload",
+    "start_bulk_enroll_job",
+    "get_bulk_enroll_job",
 ]
@@ -7,10 +7,10 @@ including user management functionalities.
 
 from typing import List, Optional
 
-from ..db import FACE_FEATURES_COLLECTION, get_milvus_client
 from ..models.user import UserModel
 from ..schemas import BatchOperationResult, User, UserCreateAsAdmin, UserUpdateAsAdmin
-from ..utils import hash_password, load_collection
+from ..utils import hash_password
+from ..vector_store import get_vector_store
 
 
 async def list_users_service(
@@ -83,6 +83,7 @@ async def list_users_service(
             # head_pic=user_obj.head_pic,
             head_pic="1" if user_obj.head_pic else "0",
             is_admin=user_obj.is_admin,
+            site=user_obj.site,
         )
         users.append(user)
 
@@ -110,6 +111,7 @@ async def create_user_as_admin_service(user_create: UserCreateAsAdmin):
         hashed_password=hashed_password,
         is_active=True,
         is_admin=user_create.is_admin,
+        site=user_create.site or None,
     )
 
     return created_user
@@ -140,10 +142,23 @@ async def update_user_as_admin_service(user_id: int, user_update: UserUpdateAsAd
         update_data["is_active"] = user_update.is_active
     if user_update.is_admin is not None:
         update_data["is_admin"] = user_update.is_admin
+    if user_update.site is not None:
+        update_data["site"] = user_update.site or None
 
     # Update the user
     await UserModel.filter(id=user_id).update(**update_data)
 
+    # Keep the attributes stored alongside the face embedding in sync
+    vector_attributes = {}
+    if user_update.site is not None:
+        vector_attributes["site"] = user_update.site
+    if user_update.is_active is not None:
+        vector_attributes["is_active"] = user_update.is_active
+    if user_update.is_admin is not None:
+        vector_attributes["is_admin"] = user_update.is_admin
+    if vector_attributes:
+        await get_vector_store().update_attributes([user_id], vector_attributes)
+
     # Get the updated user
     updated_user = await UserModel.get(id=user_id)
 
@@ -162,6 +177,9 @@ async def deactivate_user_service(user_id: int):
     """
     # Perform soft delete by deactivating the user
     result = await UserModel.filter(id=user_id).update(is_active=False)
+    if result > 0:
+        # Exclude the user from face searches without a SQL check per login
+        await get_vector_store().update_attributes([user_id], {"is_active": False})
     return result > 0
 
 
@@ -177,6 +195,8 @@ async def activate_user_service(user_id: int):
     """
     # Activate the user
     result = await UserModel.filter(id=user_id).update(is_active=True)
+    if result > 0:
+        await get_vector_store().update_attributes([user_id], {"is_active": True})
     return result > 0
 
 
@@ -268,6 +288,11 @@ async def batch_activate_users_service(user_ids: List[int]) -> BatchOperationRes
         except Exception:
             failed_users.append(user_id)
 
+    # Update the stored activation state of all changed users at once
+    updated_ids = [user_id for user_id in user_ids if user_id not in failed_users]
+    if updated_ids:
+        await get_vector_store().update_attributes(updated_ids, {"is_active": True})
+
     return BatchOperationResult(
         success_count=success_count,
         failed_count=len(failed_users),
@@ -300,6 +325,11 @@ async def batch_deactivate_users_service(user_ids: List[int]) -> BatchOperationR
         except Exception:
             failed_users.append(user_id)
 
+    # Update the stored activation state of all changed users at once
+    updated_ids = [user_id for user_id in user_ids if user_id not in failed_users]
+    if updated_ids:
+        await get_vector_store().update_attributes(updated_ids, {"is_active": False})
+
     return BatchOperationResult(
         success_count=success_count,
         failed_count=len(failed_users),
@@ -321,10 +351,8 @@ async def batch_reset_face_data_service(user_ids: List[int]) -> BatchOperationRe
     """
     success_count = 0
     failed_users = []
-    # Get the shared Milvus client
-    milvus_client = get_milvus_client()
-
-    await load_collection(FACE_FEATURES_COLLECTION)
+    # Get the shared vector store
+    vector_store = get_vector_store()
 
     for user_id in user_ids:
         try:
@@ -335,10 +363,7 @@ async def batch_reset_face_data_service(user_ids: List[int]) -> BatchOperationRe
             else:
                 failed_users.append(user_id)
 
-            milvus_client.delete(
-                collection_name=FACE_FEATURES_COLLECTION,
-                ids=[user_id],
-            )
+            await vector_store.delete([user_id])
 
         except Exception:
             failed_users.append(user_id)
@@ -350,3 +375,33 @@ async def batch_reset_face_data_service(user_ids: List[int]) -> BatchOperationRe
         failed_users=failed_users,
         operation="reset-face",
     )
+
+
+async def sync_vector_attributes_service(vector_store=None):
+    """
+    Copy user attributes that differ from the defaults into the vector store.
+
+    Embeddings stored before the attributes existed carry the default values
+    (active, non-admin, no site); this brings them in line with the SQL users.
+    Stores only rewrite rows whose values actually change.
+
+    Args:
+        vector_store: Store to update (defaults to the shared vector store)
+    """
+    from tortoise.expressions import Q
+
+    rows = await UserModel.filter(
+        Q(is_active=False) | Q(is_admin=True) | ~Q(site=None)
+    ).values_list("id", "is_active", "is_admin", "site")
+
+    # Group users with identical attributes into a single update
+    groups = {}
+    for user_id, is_active, is_admin, site in rows:
+        key = (bool(is_active), bool(is_admin), site or "")
+        groups.setdefault(key, []).append(user_id)
+
+    vector_store = vector_store or get_vector_store()
+    for (is_active, is_admin, site), user_ids in groups.items():
+        await vector_store.update_attributes(
+            user_ids, {"is_active": is_active, "is_admin": is_admin, "site": site}
+        )
@@ -0,0 +1,598 @@
+"""
+顔認識システムの顔一括登録サービスモジュール。
+
+ディレクトリまたはzipアーカイブ内の画像をユーザー名に対応付け、
+デコードと顔検出をスレッドプールで並列に行ってから、チャンク単位でまとめて推論し、
+ベクトルストアへのupsertとSQLの head_pic の一括更新を行います。
+処理結果はファイルごとにレポート（JSON Lines）へ追記されるため、
+中断しても同じレポートを指定すれば登録済みのファイルを飛ばして再開できます。
+"""
+
+import asyncio
+import csv
+import json
+import os
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, UploadFile
+from loguru import logger
+from tortoise import timezone
+
+from ..core import _CONFIG_
+from ..db.locks import FileLock
+from ..models import UserModel
+from ..utils import (
+    QUALITY_MESSAGES,
+    admit_image_bytes,
+    check_face_quality,
+    detect_face,
+    image_to_base64,
+    inference_batch,
+)
+from ..vector_store import get_vector_store
+from .face import ensure_feature_model_or_503, vector_attributes
+
+# 一括登録の対象とする画像の拡張子
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+# アップロードされたアーカイブを書き込む単位
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 状態を返す際に含めるエラーの最大件数
+_MAX_REPORTED_ERRORS = 100
+
+# 管理APIから開始した一括登録ジョブの状態と実行中のタスク（このプロセスのもの）
+# 他のワーカーで実行中かどうかはジョブのロックファイルで判定する
+BULK_ENROLL_JOBS: Dict[str, Dict[str, Any]] = {}
+_BULK_ENROLL_TASKS: Dict[str, asyncio.Task] = {}
+
+
+class EnrollSource:
+    """
+    一括登録する画像の読み込み元（ディレクトリまたはzipアーカイブ）。
+
+    ファイル名はディレクトリ（アーカイブ）からの相対パスを "/" 区切りで表します。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = None
+        if os.path.isfile(path) and zipfile.is_zipfile(path):
+            self._zip = zipfile.ZipFile(path)
+        elif not os.path.isdir(path):
+            raise ValueError(f"{path} はディレクトリでもzipアーカイブでもありません")
+
+    def names(self) -> List[str]:
+        """画像ファイル名のリスト（名前順）"""
+        if self._zip is not None:
+            names = [
+                info.filename for info in self._zip.infolist() if not info.is_dir()
+            ]
+        else:
+            root = Path(self.path)
+            names = [
+                path.relative_to(root).as_posix()
+                for path in root.rglob("*")
+                if path.is_file()
+            ]
+        return sorted(name for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+
+    def read(self, name: str) -> bytes:
+        """
+        画像ファイルのバイト列を読み込む。
+
+        圧縮率の高いメンバーを展開してメモリを使い切らないよう、UPLOAD_MAX_BYTES を
+        超える画像は読み込む前に拒否し、読み込み自体も上限までに制限します。
+
+        例外:
+            ValueError: 画像がUPLOAD_MAX_BYTESを超える場合
+        """
+        limit = _CONFIG_.UPLOAD_MAX_BYTES
+        if self._zip is not None:
+            info = self._zip.getinfo(name)
+            if info.file_size > limit:
+                raise ValueError("Image file is too large")
+            opened = self._zip.open(info)
+        else:
+            path = Path(self.path) / name
+            if path.stat().st_size > limit:
+                raise ValueError("Image file is too large")
+            opened = open(path, "rb")
+        with opened as f:
+            data = f.read(limit + 1)
+        if len(data) > limit:
+            raise ValueError("Image file is too large")
+        return data
+
+    def close(self):
+        """アーカイブを閉じる"""
+        if self._zip is not None:
+            self._zip.close()
+
+
+def load_mapping(path: str) -> Dict[str, str]:
+    """
+    ファイル名とユーザー名の対応表（CSV）を読み込む。
+
+    引数:
+        path: 1列目がファイル名、2列目がユーザー名のCSVファイル（ヘッダー行は省略可）
+
+    戻り値:
+        ファイル名をキー、ユーザー名を値とする辞書
+    """
+    mapping = {}
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or (row[0], row[1]) == ("file", "username"):
+                continue
+            mapping[row[0].strip()] = row[1].strip()
+    return mapping
+
+
+def entry_username(
+    name: str, mapping: Optional[Dict[str, str]] = None, by_folder: bool = False
+) -> str:
+    """
+    画像ファイル名に対応するユーザー名を返す。
+
+    引数:
+        name: 画像ファイル名（相対パス）
+        mapping: ファイル名とユーザー名の対応表（オプション）
+        by_folder: 対応表にないファイルを親ディレクトリ名で対応付けるかどうか
+                   （ユーザーごとのフォルダに複数の画像を置く場合）
+
+    戻り値:
+        ユーザー名（既定ではファイル名から拡張子を除いたもの）
+    """
+    if mapping and name in mapping:
+        return mapping[name]
+    path = PurePosixPath(name)
+    if by_folder and len(path.parts) > 1:
+        return path.parts[-2]
+    return path.stem
+
+
+def load_report(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    一括登録のレポートを読み込む。
+
+    引数:
+        path: JSON Lines形式のレポートファイル
+
+    戻り値:
+        ファイル名をキーとする最新の処理結果の辞書（ファイルがない場合は空）
+    """
+    rows = {}
+    if not os.path.exists(path):
+        return rows
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                # 中断時に書きかけの行は無視
+                continue
+            rows[row["file"]] = row
+    return rows
+
+
+def _report_row(
+    name: str,
+    username: str,
+    user_id: Optional[int] = None,
+    reason: Optional[str] = None,
+) -> Dict[str, Any]:
+    """レポートの1行を作成"""
+    return {
+        "file": name,
+        "username": username,
+        "user_id": user_id,
+        "status": "error" if reason else "enrolled",
+        "reason": reason,
+    }
+
+
+def _prepare_face(source: EnrollSource, name: str):
+    """
+    画像を読み込んでデコードし、登録する顔を切り出す（スレッドプールで実行）。
+
+    戻り値:
+        (顔画像, head_pic用のbase64文字列)
+
+    例外:
+        ValueError: 登録できない画像の場合（メッセージは理由）
+        OSError, KeyError, zipfile.BadZipFile: 画像を読み込めない場合
+    """
+    data = source.read(name)
+    try:
+        img = admit_image_bytes(data)
+    except HTTPException as e:
+        raise ValueError(e.detail) from e
+
+    faces = detect_face(img)
+    if not faces:
+        raise ValueError("No face detected in the image")
+    if len(faces) > 1 and _CONFIG_.ALLOW_FACE_DEDUPICATION:
+        raise ValueError("Multiple faces detected")
+
+    quality_reason = check_face_quality(faces[0])
+    if quality_reason is not None:
+        raise ValueError(f"{quality_reason}: {QUALITY_MESSAGES[quality_reason]}")
+    return faces[0], image_to_base64(img)
+
+
+async def _enroll_chunk(
+    source: EnrollSource,
+    names: List[str],
+    executor: ThreadPoolExecutor,
+    mapping: Optional[Dict[str, str]],
+    by_folder: bool,
+    replace: bool,
+    replaced: set,
+) -> List[Dict[str, Any]]:
+    """
+    画像のチャンクを登録し、ファイルごとの処理結果を返す。
+
+    引数:
+        source: 画像の読み込み元
+        names: チャンクの画像ファイル名
+        executor: デコード・顔検出・推論を行うスレッドプール
+        mapping: ファイル名とユーザー名の対応表
+        by_folder: 親ディレクトリ名でユーザーを対応付けるかどうか
+        replace: ユーザーの既存のテンプレートを置き換えるかどうか
+        replaced: この実行でテンプレートを置き換え済みのユーザーID（更新されます）
+    """
+    loop = asyncio.get_running_loop()
+    usernames = {name: entry_username(name, mapping, by_folder) for name in names}
+
+    # ユーザーをまとめて取得
+    users = {
+        user.username: user
+        for user in await UserModel.filter(username__in=set(usernames.values()))
+    }
+
+    rows = {}
+    tasks = {}
+    for name in names:
+        user = users.get(usernames[name])
+        if user is None:
+            rows[name] = _report_row(name, usernames[name], reason="User not found")
+            continue
+        tasks[name] = loop.run_in_executor(executor, _prepare_face, source, name)
+
+    # 読み込み、デコード、顔検出を並列に実行
+    prepared = {}
+    for name, task in tasks.items():
+        user = users[usernames[name]]
+        try:
+            prepared[name] = await task
+        except Exception as e:  # pylint: disable=broad-except
+            rows[name] = _report_row(name, user.username, user.id, str(e))
+
+    if prepared:
+        enrolled = list(prepared)
+        features = await loop.run_in_executor(
+            executor, inference_batch, [prepared[name][0] for name in enrolled]
+        )
+        vector_store = get_vector_store()
+
+        # 他のユーザーとして登録済みの顔を除外
+        if not _CONFIG_.ALLOW_FACE_DEDUPICATION:
+            search_results = await vector_store.search(
+                features, limit=1, radius=_CONFIG_.MODEL_THRESHOLD
+            )
+            keep = []
+            for index, (name, hits) in enumerate(zip(enrolled, search_results)):
+                user = users[usernames[name]]
+                if hits and hits[0]["user_id"] != user.id:
+                    rows[name] = _report_row(
+                        name,
+                        user.username,
+                        user.id,
+                        "Face already exists in the database",
+                    )
+                else:
+                    keep.append(index)
+            enrolled = [enrolled[index] for index in keep]
+            features = features[keep]
+
+        # テンプレートを使わない場合は1回の upsert に同じユーザーIDを含めないよう、
+        # ユーザーごとに最後の画像のみを登録する（それ以前の画像は登録済みとして記録）
+        superseded = []
+        if not _CONFIG_.FACE_TEMPLATES_ENABLED:
+            last = {usernames[name]: index for index, name in enumerate(enrolled)}
+            keep = sorted(last.values())
+            superseded = [
+                name for index, name in enumerate(enrolled) if index not in keep
+            ]
+            enrolled = [enrolled[index] for index in keep]
+            features = features[keep]
+
+        if enrolled:
+            enrolled_users = [users[usernames[name]] for name in enrolled]
+
+            # この実行で初めて現れたユーザーは既存テンプレートを置き換え、
+            # それ以外はテンプレートとして追加
+            cleared = set()
+            if replace and _CONFIG_.FACE_TEMPLATES_ENABLED:
+                cleared = {user.id for user in enrolled_users} - replaced
+            now = int(time.time() * 1000)
+            for write, selected in (
+                (vector_store.replace, True),
+                (vector_store.upsert, False),
+            ):
+                indexes = [
+                    index
+                    for index, user in enumerate(enrolled_users)
+                    if (user.id in cleared) == selected
+                ]
+                if indexes:
+                    await write(
+                        [enrolled_users[index].id for index in indexes],
+                        features[indexes],
+                        update_at=[now] * len(indexes),
+                        attributes=[
+                            vector_attributes(enrolled_users[index])
+                            for index in indexes
+                        ],
+                    )
+            replaced.update(cleared)
+
+            # ユーザーごとに最後の画像を head_pic として一括更新
+            # bulk_update は auto_now を適用しないため、再埋め込みの追いつき
+            # （updated_at で絞り込み）が拾えるよう updated_at も明示的に更新する
+            updated = {}
+            updated_at = timezone.now()
+            for name, user in zip(enrolled, enrolled_users):
+                user.head_pic = prepared[name][1]
+                user.updated_at = updated_at
+                updated[user.id] = user
+            await UserModel.bulk_update(
+                list(updated.values()), fields=["head_pic", "updated_at"]
+            )
+
+            for name, user in zip(enrolled, enrolled_users):
+                rows[name] = _report_row(name, user.username, user.id)
+            for name in superseded:
+                user = users[usernames[name]]
+                rows[name] = _report_row(name, user.username, user.id)
+
+    return [rows[name] for name in names]
+
+
+async def bulk_enroll(
+    source: EnrollSource,
+    report_path: str,
+    mapping: Optional[Dict[str, str]] = None,
+    by_folder: bool = False,
+    replace: bool = False,
+    batch_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    status: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    画像を一括登録する。
+
+    レポートに登録済み（enrolled）として記録されているファイルは飛ばし、
+    エラーになったファイルは再度処理します。
+
+    引数:
+        source: 画像の読み込み元
+        report_path: 処理結果を追記するレポートファイル
+        mapping: ファイル名とユーザー名の対応表（オプション）
+        by_folder: 親ディレクトリ名でユーザーを対応付けるかどうか
+        replace: ユーザーの既存のテンプレートを置き換えるかどうか
+        batch_size: 1回にまとめて推論・登録する画像数（省略時はBULK_ENROLL_BATCH_SIZE）
+        workers: デコードと顔検出のスレッド数（省略時はBULK_ENROLL_WORKERS）
+        status: 進捗を書き込む辞書（オプション）
+
+    戻り値:
+        件数（total, processed, enrolled, failed, skipped）を含む進捗の辞書
+    """
+    batch_size = batch_size or _CONFIG_.BULK_ENROLL_BATCH_SIZE
+    workers = workers or _CONFIG_.BULK_ENROLL_WORKERS
+    status = status if status is not None else {}
+
+    done = {
+        name
+        for name, row in load_report(report_path).items()
+        if row["status"] == "enrolled"
+    }
+    names = [name for name in source.names() if name not in done]
+    status.update(
+        total=len(names) + len(done),
+        processed=0,
+        enrolled=0,
+        failed=0,
+        skipped=len(done),
+    )
+    logger.info(
+        f"{source.path} の一括登録を開始します "
+        f"(対象={len(names)}, 登録済みのため省略={len(done)})"
+    )
+
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    replaced = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor, open(
+        report_path, "a", encoding="utf-8"
+    ) as report:
+        for start in range(0, len(names), batch_size):
+            # 途中で再埋め込みによりモデルが切り替わった場合はそこで中断
+            ensure_feature_model_or_503()
+            rows = await _enroll_chunk(
+                source,
+                names[start : start + batch_size],
+                executor,
+                mapping,
+                by_folder,
+                replace,
+                replaced,
+            )
+            # チャンクの登録が完了してからレポートに記録
+            for row in rows:
+                report.write(json.dumps(row, ensure_ascii=False) + "\n")
+                status["enrolled" if row["status"] == "enrolled" else "failed"] += 1
+            report.flush()
+            status["processed"] += len(rows)
+            logger.info(
+                f"一括登録: {status['processed']}/{len(names)} "
+                f"(登録={status['enrolled']}, エラー={status['failed']})"
+            )
+    return status
+
+
+def _job_path(job_id: str, suffix: str) -> str:
+    """一括登録ジョブのファイルのパス"""
+    return os.path.join(_CONFIG_.BULK_ENROLL_DIR, f"{job_id}{suffix}")
+
+
+async def save_bulk_enroll_upload(
+    archive: UploadFile,
+    mapping: Optional[UploadFile] = None,
+    by_folder: bool = False,
+    replace: bool = False,
+) -> str:
+    """
+    アップロードされたzipアーカイブと対応表を保存し、ジョブIDを返す。
+
+    引数:
+        archive: 画像を含むzipアーカイブ
+        mapping: ファイル名とユーザー名の対応表（CSV、オプション）
+        by_folder: 親ディレクトリ名でユーザーを対応付けるかどうか
+        replace: ユーザーの既存のテンプレートを置き換えるかどうか
+
+    例外:
+        HTTPException: 上限を超えた場合（413）、zipアーカイブでない場合（400）
+    """
+    job_id = uuid.uuid4().hex
+    os.makedirs(_CONFIG_.BULK_ENROLL_DIR, exist_ok=True)
+    archive_path = _job_path(job_id, ".zip")
+
+    size = 0
+    try:
+        with open(archive_path, "wb") as f:
+            while True:
+                chunk = await archive.read(_UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > _CONFIG_.BULK_ENROLL_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="Archive is too large")
+                f.write(chunk)
+        if not zipfile.is_zipfile(archive_path):
+            raise HTTPException(status_code=400, detail="Invalid zip archive")
+    except HTTPException:
+        os.remove(archive_path)
+        raise
+
+    if mapping is not None:
+        with open(_job_path(job_id, ".csv"), "wb") as f:
+            f.write(await mapping.read())
+    with open(_job_path(job_id, ".json"), "w", encoding="utf-8") as f:
+        json.dump({"by_folder": by_folder, "replace": replace}, f)
+    return job_id
+
+
+def start_bulk_enroll_job(job_id: str) -> Dict[str, Any]:
+    """
+    保存済みのアーカイブの一括登録をバックグラウンドで開始（または再開）する。
+
+    実行中はジョブのロックファイルを保持するため、同じホストの他のワーカーで
+    実行中のジョブも重複して開始しません。
+
+    例外:
+        HTTPException: ジョブが存在しない場合（404）、実行中の場合（409）
+    """
+    archive_path = _job_path(job_id, ".zip")
+    if not os.path.exists(archive_path):
+        raise HTTPException(status_code=404, detail="Bulk enroll job not found")
+    task = _BULK_ENROLL_TASKS.get(job_id)
+    lock = FileLock(_job_path(job_id, ".lock"))
+    if (task is not None and not task.done()) or not lock.acquire(blocking=False):
+        raise HTTPException(
+            status_code=409, detail="Bulk enroll job is already running"
+        )
+
+    try:
+        with open(_job_path(job_id, ".json"), encoding="utf-8") as f:
+            options = json.load(f)
+        mapping_path = _job_path(job_id, ".csv")
+        mapping = load_mapping(mapping_path) if os.path.exists(mapping_path) else None
+    except BaseException:
+        lock.release()
+        raise
+
+    status = {"job_id": job_id, "state": "running", "error": None}
+    BULK_ENROLL_JOBS[job_id] = status
+    _BULK_ENROLL_TASKS[job_id] = asyncio.create_task(
+        _run_bulk_enroll_job(job_id, archive_path, mapping, options, status, lock)
+    )
+    return status
+
+
+async def _run_bulk_enroll_job(
+    job_id: str,
+    archive_path: str,
+    mapping: Optional[Dict[str, str]],
+    options: Dict[str, Any],
+    status: Dict[str, Any],
+    lock: FileLock,
+):
+    """一括登録ジョブを実行し、終了時に状態を更新してジョブのロックを解放"""
+    source = None
+    try:
+        source = EnrollSource(archive_path)
+        await bulk_enroll(
+            source,
+            _job_path(job_id, ".jsonl"),
+            mapping,
+            by_folder=options.get("by_folder", False),
+            replace=options.get("replace", False),
+            status=status,
+        )
+        status["state"] = "completed"
+    except Exception as e:  # pylint: disable=broad-except
+        logger.exception(f"一括登録ジョブ {job_id} が失敗しました")
+        status.update(state="failed", error=str(e))
+    finally:
+        if source is not None:
+            source.close()
+        lock.release()
+
+
+def get_bulk_enroll_job(job_id: str) -> Dict[str, Any]:
+    """
+    一括登録ジョブの状態とエラーになったファイルを返す。
+
+    他のワーカーで実行中の場合やサーバーの再起動などでメモリ上に状態がない場合は
+    レポートから集計し、ジョブのロックが保持されていれば state を "running"、
+    そうでなければ "stopped" とします（再開は start_bulk_enroll_job）。
+
+    例外:
+        HTTPException: ジョブが存在しない場合（404）
+    """
+    report = load_report(_job_path(job_id, ".jsonl"))
+    status = BULK_ENROLL_JOBS.get(job_id)
+    if status is None:
+        if not os.path.exists(_job_path(job_id, ".zip")):
+            raise HTTPException(status_code=404, detail="Bulk enroll job not found")
+        # ロックを取得できない場合は他のワーカーで実行中
+        lock = FileLock(_job_path(job_id, ".lock"))
+        running = not lock.acquire(blocking=False)
+        lock.release()
+        enrolled = sum(1 for row in report.values() if row["status"] == "enrolled")
+        status = {
+            "job_id": job_id,
+            "state": "running" if running else "stopped",
+            "processed": len(report),
+            "enrolled": enrolled,
+            "failed": len(report) - enrolled,
+        }
+
+    errors = [row for row in report.values() if row["status"] == "error"]
+    return {**status, "errors": errors[:_MAX_REPORTED_ERRORS]}
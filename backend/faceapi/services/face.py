@@ -5,140 +5,280 @@
 顔認識操作のビジネスロジックを含みます。
 """
 
+import asyncio
+import re
 import time
-from typing import Any, Dict
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
 
-import cv2
 import numpy as np
 from fastapi import HTTPException, UploadFile
 
 from ..core import _CONFIG_
-from ..db import FACE_FEATURES_COLLECTION, get_milvus_client
+from ..db import feature_model_mismatch
 from ..face_rec import _MODEL_ as model
 from ..models import UserModel
-from ..utils import create_access_token, detect_face, image_to_base64, load_collection
-
+from ..schemas.user import SITE_PATTERN
+from ..utils import (
+    create_access_token,
+    QUALITY_MESSAGES,
+    FaceTracker,
+    check_face_quality,
+    detect_face,
+    detect_face_boxes,
+    image_to_base64,
+    parse_face_box,
+    read_upload_image,
+)
 from ..utils import inference
+from ..vector_store import get_vector_store
+from ..vector_store.base import SearchCursor
+
+# 管理者の顔検索の続きのページを取り出すカーソル（プロセスごと）
+# カーソルID -> (カーソル, 次のページ番号, 最終利用時刻)
+# 別のワーカーに届いたカーソルは見つからないため、画像とページ番号で検索し直す
+_SEARCH_CURSORS: "OrderedDict[str, Tuple[SearchCursor, int, float]]" = OrderedDict()
+
+def _parse_face_box_or_400(face_box: Optional[str]):
+    """顔領域ヒントを解析し、不正な場合は400エラーを送出"""
+    try:
+        return parse_face_box(face_box)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+def _validate_site_or_400(site: Optional[str]) -> Optional[str]:
+    """拠点ヒントを検証し、不正な場合は400エラーを送出"""
+    if site and not re.match(SITE_PATTERN, site):
+        raise HTTPException(status_code=400, detail="Invalid site")
+    return site or None
+
+
+def ensure_feature_model_or_503():
+    """
+    face_features の埋め込みがこのプロセスのモデルで生成されたものか確認し、
+    異なる場合は503エラーを送出。
+
+    再埋め込みで別のモデルのコレクションに切り替わった後、古いモデルで
+    照合・登録を続けないようにします（新しいモデルでの再起動が必要）。
+    """
+    model = feature_model_mismatch()
+    if model is not None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Face features were embedded by another model ({model})",
+        )
+
+
+def vector_attributes(user: UserModel) -> Dict[str, Any]:
+    """顔特徴と共に保存するユーザーの属性"""
+    return {
+        "site": user.site or "",
+        "is_active": bool(user.is_active),
+        "is_admin": bool(user.is_admin),
+    }
+
 
-async def verify_face_service(image: UploadFile) -> Dict[str, Any]:
+async def verify_face_service(
+    image: UploadFile,
+    face_box: Optional[str] = None,
+    site: Optional[str] = None,
+) -> Dict[str, Any]:
     """
     アップロードされた画像から顔を検証するサービス関数。
 
     引数:
         image: 顔を含むアップロードされた画像ファイル
+        face_box: クライアント側で検出された顔の矩形 "x,y,w,h"（オプション）
+        site: クライアントの拠点。指定した場合はその拠点のユーザーのみを検索（オプション）
 
     戻り値:
         認識結果と成功時のトークンを含む辞書
     """
-    # 画像ファイルを読み込み
-    contents = await image.read()
+    face_box = _parse_face_box_or_400(face_box)
+    site = _validate_site_or_400(site)
 
-    # numpy配列に変換
-    nparr = np.frombuffer(contents, np.uint8)
-    # pylint: disable=no-member
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    # pylint: enable=no-member
+    # サイズと画像ヘッダーを検査してから画像をデコード
+    img = await read_upload_image(image)
 
-    if img is None:
-        raise HTTPException(status_code=400, detail="Invalid image file")
+    return await verify_face_image_service(img, face_box, site=site)
 
-    # 画像内の顔を検出
-    detected_faces = detect_face(img)
 
-    if not detected_faces:
-        return {
-            "recognized": False,
-            "message": "No face detected in the image",
-            "data": {
-                "token": None,
-                "token_type": "Bearer",
-            },
-            "code": 400,
-        }
+def _verify_result(
+    recognized: bool, message: str, code: int, token: Optional[str] = None, **extra
+):
+    """検証結果の辞書を生成"""
+    return {
+        "recognized": recognized,
+        "message": message,
+        **extra,
+        "data": {
+            "token": token,
+            "token_type": "Bearer",
+        },
+        "code": code,
+    }
+
+
+def _extract_verify_features(
+    img: np.ndarray, face_box: Optional[tuple], tracker: Optional[FaceTracker]
+):
+    """
+    顔の検出（または追跡）、品質検査、特徴抽出を行う（スレッドで実行）。
+
+    戻り値:
+        (品質検査を通過した顔の矩形のリスト, 対応する特徴の行列, 除外した理由,
+         顔検出を実行したかどうか)
+        顔が検出されない場合は矩形のリストがNone、すべての顔が品質検査で
+        除外された場合は空のリストになります
+    """
+    boxes = None
+    if tracker is not None and not tracker.needs_refresh():
+        tracked_box = tracker.track(img)
+        if tracked_box is not None:
+            boxes = [tracked_box]
+
+    # 画像内の顔を検出
+    detected = boxes is None
+    if detected:
+        boxes = detect_face_boxes(img, face_box)
+
+    if not boxes:
+        if tracker is not None:
+            tracker.reset()
+        return None, None, None, detected
+
+    # 埋め込み前に品質の低い顔を除外
+    candidates = []
+    quality_reason = None
+    for x, y, w, h in boxes:
+        face_img = img[y : y + h, x : x + w]
+        face_reason = check_face_quality(face_img)
+        if face_reason is None:
+            candidates.append(((x, y, w, h), face_img))
+        elif quality_reason is None:
+            quality_reason = face_reason
+
+    if not candidates:
+        return [], None, quality_reason, detected
 
     # 顔から特徴を抽出
-    features = [
-        inference(face_img)[0]
-        for face_img in detected_faces
-    ]
+    features = np.stack([inference(face_img)[0] for _, face_img in candidates])
+    return [box for box, _ in candidates], features, quality_reason, detected
 
-    # 共有Milvusクライアントを取得
-    milvus_client = get_milvus_client()
 
-    await load_collection(FACE_FEATURES_COLLECTION)
+async def verify_face_image_service(
+    img: np.ndarray,
+    face_box: Optional[tuple] = None,
+    tracker: Optional[FaceTracker] = None,
+    site: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    デコード済みの画像から顔を検証するサービス関数。
 
-    # コレクション内で類似の顔を検索
-    search_results = milvus_client.search(
-        collection_name=FACE_FEATURES_COLLECTION,
-        data=features,
-        limit=1,  # 最も近い一致のみ必要
-        output_fields=["user_id"],
-        search_params={
-            "metric_type": "COSINE",
-            "params": {"radius": _CONFIG_.MODEL_THRESHOLD},
-        },
+    HTTPアップロードとWebSocketストリームの両方から利用されます。
+    trackerが指定された場合、前フレームの顔を追跡できている間は顔検出を省略します。
+    識別結果は再利用せず、トークンを返す前に必ず埋め込みと検索を行います。
+    顔検出と推論はイベントループを止めないようスレッドで実行します。
+
+    引数:
+        img: デコード済みの画像（BGRのnumpy配列）
+        face_box: 解析済みの顔領域ヒント (x, y, w, h)（オプション）
+        tracker: WebSocket接続の顔トラッカー（オプション）
+        site: 検証済みの拠点ヒント（オプション）
+
+    戻り値:
+        認識結果と成功時のトークンを含む辞書
+    """
+    ensure_feature_model_or_503()
+    boxes, features, quality_reason, detected = await asyncio.to_thread(
+        _extract_verify_features, img, face_box, tracker
+    )
+
+    if boxes is None:
+        return _verify_result(False, "No face detected in the image", 400)
+
+    if not boxes:
+        return _verify_result(
+            False,
+            QUALITY_MESSAGES[quality_reason],
+            400,
+            reason=quality_reason,
+        )
+
+    # コレクション内で類似の顔を検索（最も近い一致のみ必要）
+    # 無効なユーザーはベクトルストア内で除外し、拠点が指定された場合は
+    # その拠点のパーティションのみを検索
+    filters = {"is_active": True}
+    if site:
+        filters["site"] = site
+    search_results = await get_vector_store().search(
+        features,
+        limit=1,
+        radius=_CONFIG_.MODEL_THRESHOLD,
+        filters=filters,
     )
     if not any(search_results):
         # 一致する顔が見つからない
-        return {
-            "recognized": False,
-            "message": "Face not recognized in the database",
-            "data": {
-                "token": None,
-                "token_type": "Bearer",
-            },
-            "code": 401,
-        }
+        result = _verify_result(False, "Face not recognized in the database", 401)
+        # 追跡中のフレームでは track() が矩形を更新済みのため、顔検出を
+        # 実行した場合のみ追跡を開始し直す
+        if tracker is not None and detected:
+            tracker.update(img, boxes[0])
+        return result
 
     # 最良の一致を取得
-    # best_match = search_results[0][0]
-    best_match = list(filter(lambda l: len(l) > 0, search_results))[0][0]
+    best_index = next(i for i, hits in enumerate(search_results) if len(hits) > 0)
+    best_match = search_results[best_index][0]
 
     # 顔が認識され、ユーザー情報を取得しトークンを作成
-    user_id = best_match["entity"]["user_id"]
+    user_id = best_match["user_id"]
 
     # アクセストークンを作成
     access_token = create_access_token(
         data={"sub": str(user_id)},
     )
 
-    return {
-        "recognized": True,
-        "message": f"Face recognized as user(id={user_id})",
-        "user_id": user_id,
-        "confidence": 1 - best_match["distance"],  # 距離を類似度に変換
-        "data": {
-            "token": access_token,
-            "token_type": "Bearer",
-        },
-        "code": 200,
-    }
+    result = _verify_result(
+        True,
+        f"Face recognized as user(id={user_id})",
+        200,
+        user_id=user_id,
+        confidence=1 - best_match["distance"],  # 距離を類似度に変換
+        token=access_token,
+    )
+    if tracker is not None and detected:
+        tracker.update(img, boxes[best_index])
+    return result
 
 
 async def update_face_embedding_service(
-    user_id: int, image: UploadFile
+    user_id: int,
+    image: UploadFile,
+    face_box: Optional[str] = None,
+    replace: bool = False,
 ) -> Dict[str, Any]:
     """
     ユーザーの顔埋め込みを更新するサービス関数。
 
+    複数テンプレートが有効な場合、新しい顔はテンプレートとして追加され、
+    検索用のプロトタイプが再計算されます。
+
     引数:
         user_id: 顔埋め込みを更新するユーザーのID
         image: 新しい顔を含むアップロードされた画像ファイル
+        face_box: クライアント側で検出された顔の矩形 "x,y,w,h"（オプション）
+        replace: 既存のテンプレートを破棄してこの顔のみを登録するかどうか
 
     戻り値:
         成功メッセージと埋め込みIDを含む辞書
     """
-    # 画像ファイルを読み込み
-    contents = await image.read()
+    face_box = _parse_face_box_or_400(face_box)
+    ensure_feature_model_or_503()
 
-    # numpy配列に変換
-    nparr = np.frombuffer(contents, np.uint8)
-    # pylint: disable=no-member
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    # pylint: enable=no-member
-
-    if img is None:
-        raise HTTPException(status_code=400, detail="Invalid image file")
+    # サイズと画像ヘッダーを検査してから画像をデコード
+    img = await read_upload_image(image)
 
     # ユーザーオブジェクトを取得
     user = await UserModel.get_or_none(id=user_id)
@@ -146,7 +286,7 @@ async def update_face_embedding_service(
         raise HTTPException(status_code=404, detail="User not found")
 
     # 画像内の顔を検出
-    detected_faces = detect_face(img)
+    detected_faces = detect_face(img, face_box)
 
     if not detected_faces:
         raise HTTPException(status_code=400, detail="No face detected in the image")
@@ -160,66 +300,40 @@ async def update_face_embedding_service(
     # 最初に検出された顔を処理
     face_img = detected_faces[0]
 
+    # 品質の低い顔は登録しない
+    quality_reason = check_face_quality(face_img)
+    if quality_reason is not None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{quality_reason}: {QUALITY_MESSAGES[quality_reason]}",
+        )
+
     # 顔から特徴を抽出
     features = inference(face_img)
 
-    # 共有Milvusクライアントを取得
-    milvus_client = get_milvus_client()
-
-    await load_collection(FACE_FEATURES_COLLECTION)
+    vector_store = get_vector_store()
 
     # コレクション内で類似の顔を検索
-    print(features)
-    search_results = milvus_client.search(
-        collection_name=FACE_FEATURES_COLLECTION,
-        data=features,
-        limit=1,  # 最も近い一致のみ必要
-        output_fields=["user_id"],
-        search_params={
-            "metric_type": "COSINE",
-            "params": {"radius": _CONFIG_.MODEL_THRESHOLD},
-        },
+    search_results = await vector_store.search(
+        features, limit=1, radius=_CONFIG_.MODEL_THRESHOLD
     )
     if any(search_results) and not _CONFIG_.ALLOW_FACE_DEDUPICATION:
-        if search_results[0][0]["entity"]["user_id"] != user_id:
+        if search_results[0][0]["user_id"] != user_id:
             raise HTTPException(
                 status_code=400,
                 detail="Face already exists in the database. Please use a different face or contact the administrator.",
             )
 
-    # 新しい顔特徴をコレクションに挿入
-    entities = [
-        {
-            "user_id": user_id,
-            "feature_vector": features[0].tolist(),
-            "update_at": int(time.time() * 1000),  # エポックからのミリ秒に変換
-        }
-    ]
-
-    insert_result = milvus_client.upsert(
-        collection_name=FACE_FEATURES_COLLECTION, data=entities
+    # 新しい顔特徴をコレクションに挿入（置き換える場合は書き込み後に既存の
+    # テンプレートを削除するため、置き換えの途中でも照合できる）
+    write = vector_store.replace if replace else vector_store.upsert
+    inserted_ids = await write(
+        [user_id],
+        features[:1],
+        update_at=[int(time.time() * 1000)],  # エポックからのミリ秒に変換
+        attributes=[vector_attributes(user)],
     )
-
-    # Milvusクライアントからの応答の可能性のあるバリエーションを処理
-    inserted_id = None
-    if isinstance(insert_result, dict):
-        # 応答内の異なる可能なキーを確認
-        if "insertedIds" in insert_result:
-            inserted_id = (
-                insert_result["insertedIds"][0]
-                if insert_result["insertedIds"]
-                else None
-            )
-        elif "inserted_ids" in insert_result:
-            inserted_id = (
-                insert_result["inserted_ids"][0]
-                if insert_result["inserted_ids"]
-                else None
-            )
-    elif hasattr(insert_result, "inserted_ids"):
-        inserted_id = (
-            insert_result.inserted_ids[0] if insert_result.inserted_ids else None
-        )
+    inserted_id = inserted_ids[0] if inserted_ids else None
 
     # SQLでバイト単位で画像を更新
     user.head_pic = image_to_base64(img)
@@ -230,3 +344,158 @@ async def update_face_embedding_service(
         "message": f"Face embedding updated successfully for user ID {user_id}",
         "new_embedding_id": inserted_id,
     }
+
+
+async def _evict_search_cursors():
+    """使われていないカーソルと、上限を超えた古いカーソルを閉じて破棄"""
+    now = time.monotonic()
+    while _SEARCH_CURSORS:
+        cursor_id, (cursor, _, last_used) = next(iter(_SEARCH_CURSORS.items()))
+        if (
+            now - last_used < _CONFIG_.FACE_SEARCH_CURSOR_TTL
+            and len(_SEARCH_CURSORS) <= _CONFIG_.FACE_SEARCH_MAX_CURSORS
+        ):
+            break
+        del _SEARCH_CURSORS[cursor_id]
+        await cursor.close()
+
+
+async def _skip_hits(cursor: SearchCursor, count: int, page_size: int):
+    """カーソルから前のページの count 件をページ単位で読み飛ばす"""
+    while count > 0 and not cursor.exhausted:
+        skipped = await cursor.next(min(count, page_size))
+        if not skipped:
+            return
+        count -= len(skipped)
+
+
+async def _open_search_cursor(
+    image: UploadFile,
+    face_box: Optional[str],
+    site: Optional[str],
+    is_active: Optional[bool],
+    min_score: Optional[float],
+) -> SearchCursor:
+    """アップロードされた画像の最も大きな顔で検索カーソルを作成"""
+    face_box = _parse_face_box_or_400(face_box)
+    site = _validate_site_or_400(site)
+    ensure_feature_model_or_503()
+    img = await read_upload_image(image)
+
+    boxes = detect_face_boxes(img, face_box)
+    if not boxes:
+        raise HTTPException(status_code=400, detail="No face detected in the image")
+    x, y, w, h = max(boxes, key=lambda box: box[2] * box[3])
+    feature = inference(img[y : y + h, x : x + w])[0]
+
+    filters = {}
+    if site:
+        filters["site"] = site
+    if is_active is not None:
+        filters["is_active"] = is_active
+    return get_vector_store().search_cursor(feature, min_score, filters or None)
+
+
+async def search_faces_service(
+    image: Optional[UploadFile] = None,
+    face_box: Optional[str] = None,
+    site: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    min_score: Optional[float] = None,
+    page_size: int = 20,
+    cursor_id: Optional[str] = None,
+    page: int = 1,
+) -> Dict[str, Any]:
+    """
+    アップロードされた画像の顔に似ているユーザーを類似度の降順に返すサービス関数。
+
+    最初の呼び出しで検索カーソルを作成し、返されたカーソルIDを指定すると
+    続きのページを返します。Milvusでは limit を増やす代わりに検索イテレータで
+    ページを取り出し、ページ内のユーザー情報は1回のSQLクエリでまとめて取得します。
+
+    カーソルは作成したプロセスのメモリにのみ保持されるため、複数のワーカーでは
+    別のワーカーに届いたカーソルや期限切れのカーソルは見つかりません。その場合に
+    画像とページ番号も指定されていれば、検索し直して前のページの件数を読み飛ばします
+    （カーソルを使わないページ指定の検索も同様）。
+
+    引数:
+        image: 顔を含むアップロードされた画像ファイル（最初のページのみ）
+        face_box: クライアント側で検出された顔の矩形 "x,y,w,h"（オプション）
+        site: 指定した場合はその拠点のユーザーのみを検索（オプション）
+        is_active: 指定した場合は有効状態が一致するユーザーのみを検索（オプション）
+        min_score: 指定した場合は類似度がこの値より大きいユーザーのみを返す（オプション）
+        page_size: 1ページの件数
+        cursor_id: 前のページで返されたカーソルID（オプション）
+        page: 画像で検索し直す場合のページ番号（カーソルが見つからない場合に使用）
+
+    戻り値:
+        検索結果、ページ番号、次のページのカーソルIDを含む辞書
+
+    例外:
+        HTTPException: 画像とカーソルのどちらもない場合、顔が検出されない場合（400）、
+            カーソルが期限切れの場合（404）
+    """
+    page_size = min(max(page_size, 1), _CONFIG_.FACE_SEARCH_MAX_PAGE_SIZE)
+    page = max(page, 1)
+    await _evict_search_cursors()
+
+    # 同じカーソルの同時利用を防ぐため、取り出している間はレジストリから外す
+    entry = _SEARCH_CURSORS.pop(cursor_id, None) if cursor_id else None
+    if entry is not None:
+        cursor, page, _ = entry
+    elif image is not None:
+        cursor = await _open_search_cursor(image, face_box, site, is_active, min_score)
+        cursor_id = uuid.uuid4().hex
+        try:
+            await _skip_hits(cursor, (page - 1) * page_size, page_size)
+        except Exception:
+            await cursor.close()
+            raise
+    elif cursor_id:
+        raise HTTPException(status_code=404, detail="Search cursor expired")
+    else:
+        raise HTTPException(
+            status_code=400, detail="Either image or cursor is required"
+        )
+
+    try:
+        hits = await cursor.next(page_size)
+    except Exception:
+        await cursor.close()
+        raise
+
+    # ページ内のユーザー情報をまとめて取得（削除済みのユーザーは除外）
+    users = {
+        user.id: user
+        for user in await UserModel.filter(id__in=[hit["user_id"] for hit in hits])
+    }
+    results = []
+    for hit in hits:
+        user = users.get(int(hit["user_id"]))
+        if user is None:
+            continue
+        results.append(
+            {
+                "user_id": user.id,
+                "score": float(hit["distance"]),
+                "username": user.username,
+                "full_name": user.full_name,
+                "email": user.email,
+                "site": user.site,
+                "is_active": user.is_active,
+                "is_admin": user.is_admin,
+            }
+        )
+
+    if len(hits) < page_size or cursor.exhausted:
+        await cursor.close()
+        next_cursor = None
+    else:
+        _SEARCH_CURSORS[cursor_id] = (cursor, page + 1, time.monotonic())
+        next_cursor = cursor_id
+    return {
+        "results": results,
+        "page": page,
+        "page_size": page_size,
+        "cursor": next_cursor,
+    }
@@ -10,6 +10,7 @@ from fastapi import HTTPException
 from ..models.user import UserModel
 from ..schemas import User, UserCreate, UserUpdate
 from ..utils import hash_password, verify_password
+from ..vector_store import get_vector_store
 
 
 async def authenticate_user(username: str, password: str):
@@ -177,6 +178,9 @@ async def delete_user_account_service(user_id: int):
 
     # 完全削除ではなくユーザーを非アクティブ化
     result = await UserModel.filter(id=user_id).update(is_active=False)
+    if result > 0:
+        # 顔認証の検索対象から除外
+        await get_vector_store().update_attributes([user_id], {"is_active": False})
 
     return result > 0
 
@@ -0,0 +1,60 @@
+"""
+顔認識システムの運用ツールモジュール。
+
+このモジュールは `faceapi <サブコマンド>` として実行される
+オフラインのツール（評価・移行・保守など）を提供します。
+"""
+
+import importlib
+from typing import List
+
+# サブコマンド名と (モジュール, 説明) の対応
+TOOL_COMMANDS = {
+    "recall-report": (
+        "faceapi.tools.recall_report",
+        "埋め込みの保存形式ごとの再現率とメモリ使用量を評価",
+    ),
+    "fit-projection": (
+        "faceapi.tools.fit_projection",
+        "登録済みの埋め込みからPCA射影を学習してモデルの隣に保存",
+    ),
+    "enroll-bulk": (
+        "faceapi.tools.enroll_bulk",
+        "ディレクトリまたはzipアーカイブの顔画像を一括登録（中断から再開可能）",
+    ),
+    "bulk-import": (
+        "faceapi.tools.bulk_import",
+        "埋め込みをParquet/NumPyファイルに書き出し、Milvusの一括インポートで投入",
+    ),
+    "snapshot": (
+        "faceapi.tools.snapshot",
+        "埋め込みをモデル名ごとのスナップショット（.npy）に書き出し、または復元",
+    ),
+    "reembed": (
+        "faceapi.tools.reembed",
+        "保存済みの顔画像を新しいモデルで再埋め込みし、エイリアスを切り替え（再開可能）",
+    ),
+    "tune-index": (
+        "faceapi.tools.tune_index",
+        "インデックス種類と検索パラメータごとの再現率・QPS・p99を計測して推奨値を出力",
+    ),
+}
+
+
+def run_tool(name: str, argv: List[str]):
+    """
+    サブコマンドに対応するツールを実行。
+
+    引数:
+        name: サブコマンド名
+        argv: ツールに渡すコマンドライン引数
+    """
+    module_name, _ = TOOL_COMMANDS[name]
+    module = importlib.import_module(module_name)
+    return module.main(argv)
+
+
+__ALL__ = [
+    "TOOL_COMMANDS",
+    "run_tool",
+]
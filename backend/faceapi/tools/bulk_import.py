@@ -0,0 +1,330 @@
+"""
+顔特徴の一括インポートツールモジュール。
+
+数百万件規模の埋め込みを行ごとの upsert ではなくMilvusの一括インポート（bulk insert）で
+face_features コレクションに投入します。埋め込みと user_id・update_at・属性を
+pymilvus のバルクライターで Parquet または NumPy 形式のファイルに書き出し、
+Milvusが参照するMinIO/S3にアップロードしてからインポートを実行します。
+一括インポートは主キーの重複を検査しないため、空のコレクションにのみインポートします。
+--drop-index を指定するとインポート中はインデックスを削除しておき、完了後に
+件数に合ったインデックスを一度だけ構築します。
+書き出す行の update_at は書き出し時刻とし、ローカル複製が取り込めるようにします。
+
+入力はNumPyベクトルストアのディレクトリ（VECTOR_STORE_PATH など）、または
+user_id と embeddings の配列を含む .npz ファイルです。
+
+使用例:
+    faceapi bulk-import ./data/face_features
+    faceapi bulk-import ./data/face_features --drop-index
+    faceapi bulk-import ./embeddings.npz --format numpy
+    faceapi bulk-import ./embeddings.npz --local-output ./bulk_files
+    faceapi bulk-import --files bulk_import/<uuid>/1.parquet
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from ..core import _CONFIG_
+from ..vector_store.base import ATTRIBUTE_DEFAULTS
+from ..vector_store.numpy_store import load_numpy_store
+
+# 書き込み件数のログを出力する間隔
+_LOG_EVERY_ROWS = 100000
+
+# インポートの進捗を確認する間隔（秒）
+_POLL_INTERVAL = 5.0
+
+
+def load_source(path: str):
+    """
+    インポートする埋め込みを読み込む。
+
+    引数:
+        path: NumPyベクトルストアのディレクトリ、または .npz ファイル
+
+    戻り値:
+        (ユーザーIDの配列, (N, dim) の行列, 属性名と列の辞書)
+    """
+    if os.path.isdir(path):
+        return load_numpy_store(path)
+
+    data = np.load(path)
+    return data["user_id"], data["embeddings"], {}
+
+
+def _index_projection(matrix: np.ndarray):
+    """全次元の埋め込みをインデックスの次元に落とす射影（不要な場合はNone）"""
+    from ..vector_store.projection import get_projection
+
+    if matrix.shape[1] == _CONFIG_.INDEX_EMB_DIM:
+        return None
+    projection = get_projection()
+    if projection is None or matrix.shape[1] != _CONFIG_.MODEL_EMB_DIM:
+        raise ValueError(
+            f"埋め込みの次元数 {matrix.shape[1]} がインデックスの次元数 "
+            f"{_CONFIG_.INDEX_EMB_DIM} と一致しません"
+        )
+    return projection
+
+
+def write_files(writer, ids, matrix, attributes, block_size: int = 65536):
+    """
+    埋め込みをバルクライターで書き出す。
+
+    update_at は元の値ではなく書き出し時刻とします。元の更新時刻のままでは
+    ローカル複製の差分同期（update_at が前回同期以降の行）に取り込まれません。
+
+    引数:
+        writer: pymilvus の LocalBulkWriter または RemoteBulkWriter
+        ids: ユーザーIDの配列
+        matrix: (N, dim) の埋め込み行列
+        attributes: 属性名と列の辞書（ない属性は既定値）
+        block_size: 1回に正規化・射影する行数
+
+    戻り値:
+        書き出したファイルのパスのリスト（インポート1回分ごとのリスト）
+    """
+    from ..db import FEATURE_CODE_FIELD, get_feature_storage
+    from ..vector_store.base import normalize_rows
+    from ..vector_store.codec import binary_codes
+
+    storage = get_feature_storage()
+    projection = _index_projection(matrix)
+    written_at = int(time.time() * 1000)  # エポックからのミリ秒
+    for start in range(0, len(ids), block_size):
+        block = np.asarray(matrix[start : start + block_size])
+        if projection is not None:
+            block = projection.transform(block)
+        vectors = normalize_rows(block)
+        codes = binary_codes(vectors) if storage["binary"] else None
+        for offset, vector in enumerate(vectors):
+            row_index = start + offset
+            row = {
+                "user_id": int(ids[row_index]),
+                # FLOAT16 / BFLOAT16 への変換はバルクライターが行う
+                "feature_vector": vector,
+                "update_at": written_at,
+            }
+            for name in storage["attributes"]:
+                column = attributes.get(name)
+                row[name] = (
+                    column[row_index].item()
+                    if column is not None
+                    else ATTRIBUTE_DEFAULTS[name]
+                )
+            if codes is not None:
+                row[FEATURE_CODE_FIELD] = codes[offset]
+            writer.append_row(row)
+            if (row_index + 1) % _LOG_EVERY_ROWS == 0:
+                logger.info(f"{row_index + 1}/{len(ids)} 件を書き出しました")
+    writer.commit()
+    logger.info(f"{len(ids)} 件を書き出しました: {writer.batch_files}")
+    return writer.batch_files
+
+
+def wait_for_imports(task_ids: List[int]) -> Dict[int, object]:
+    """
+    一括インポートの完了を待ち、進捗をログに出力。
+
+    戻り値:
+        タスクIDと最終状態（BulkInsertState）の辞書
+
+    例外:
+        RuntimeError: いずれかのタスクが失敗した場合
+    """
+    from pymilvus import BulkInsertState, utility
+
+    finished = {}
+    while len(finished) < len(task_ids):
+        time.sleep(_POLL_INTERVAL)
+        for task_id in task_ids:
+            if task_id in finished:
+                continue
+            state = utility.get_bulk_insert_state(task_id=task_id)
+            if state.state in (
+                BulkInsertState.ImportFailed,
+                BulkInsertState.ImportFailedAndCleaned,
+            ):
+                raise RuntimeError(
+                    f"一括インポート {task_id} が失敗しました: {state.failed_reason}"
+                )
+            if state.state == BulkInsertState.ImportCompleted:
+                finished[task_id] = state
+            logger.info(
+                f"一括インポート {task_id}: {state.state_name} "
+                f"({state.progress}%, rows={state.row_count})"
+            )
+    return finished
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="faceapi bulk-import",
+        description="Write embeddings as Parquet/NumPy files in the bulk writer layout "
+        "and load them into face_features with Milvus bulk insert",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "source",
+        type=str,
+        nargs="?",
+        default="",
+        help="Numpy vector store directory or .npz with user_id/embeddings",
+    )
+    parser.add_argument(
+        "--format", choices=["parquet", "numpy"], default="parquet", help="File format"
+    )
+    parser.add_argument(
+        "--local-output",
+        type=str,
+        default="",
+        help="Only write the files to this local directory (no upload or import)",
+    )
+    parser.add_argument(
+        "--files",
+        type=str,
+        nargs="+",
+        default=[],
+        help="Import files already uploaded to the Milvus bucket instead of a source "
+        "(one import per argument, comma-separate the files of a numpy batch)",
+    )
+    parser.add_argument(
+        "--drop-index",
+        action="store_true",
+        help="Drop the index during the import and build it once at the end "
+        "(face_features is released and cannot be searched until then)",
+    )
+    return parser
+
+
+def upload_files(ids, matrix, attributes, file_type) -> List[List[str]]:
+    """
+    埋め込みをMilvusが参照するMinIO/S3にバルクライターで書き出す。
+
+    戻り値:
+        バケット内のファイルのパスのリスト（インポート1回分ごとのリスト）
+    """
+    from pymilvus import Collection
+    from pymilvus.bulk_writer import RemoteBulkWriter
+
+    from ..db import FACE_FEATURES_COLLECTION
+
+    connect_param = RemoteBulkWriter.S3ConnectParam(
+        endpoint=_CONFIG_.MILVUS_BULK_S3_ENDPOINT,
+        access_key=_CONFIG_.MILVUS_BULK_S3_ACCESS_KEY,
+        secret_key=_CONFIG_.MILVUS_BULK_S3_SECRET_KEY,
+        bucket_name=_CONFIG_.MILVUS_BULK_S3_BUCKET,
+        secure=_CONFIG_.MILVUS_BULK_S3_SECURE,
+    )
+    with RemoteBulkWriter(
+        schema=Collection(FACE_FEATURES_COLLECTION).schema,
+        remote_path=_CONFIG_.MILVUS_BULK_REMOTE_PATH,
+        connect_param=connect_param,
+        file_type=file_type,
+    ) as writer:
+        return write_files(writer, ids, matrix, attributes)
+
+
+def _live_rows() -> int:
+    """face_features の有効な行数（削除済みの行を含まない）"""
+    from ..db import FACE_FEATURES_COLLECTION, get_milvus_client
+
+    result = get_milvus_client().query(
+        collection_name=FACE_FEATURES_COLLECTION,
+        filter="",
+        output_fields=["count(*)"],
+        consistency_level="Strong",
+    )
+    return int(result[0]["count(*)"]) if result else 0
+
+
+async def import_files(batches: List[List[str]], drop_index: bool = False):
+    """
+    アップロード済みのファイルを一括インポートし、完了後にインデックスを構築。
+
+    引数:
+        batches: バケット内のファイルのパスのリスト（インポート1回分ごとのリスト）
+        drop_index: インポート中はインデックスを削除し、完了後に一度だけ構築するか
+            （その間 face_features は解放され検索できません）
+
+    例外:
+        ValueError: face_features が空でない場合
+    """
+    from pymilvus import utility
+
+    from ..db import (
+        FACE_FEATURES_COLLECTION,
+        drop_face_features_index,
+        ensure_face_features_index,
+    )
+
+    # 一括インポートは既存の行を置き換えず、同じ user_id の行が重複する
+    rows = await asyncio.to_thread(_live_rows)
+    if rows:
+        raise ValueError(
+            f"{FACE_FEATURES_COLLECTION} に {rows} 件の顔特徴があります。一括インポートは"
+            "空のコレクションにのみ行えます（既存の行の更新は upsert を使用してください）"
+        )
+
+    if drop_index:
+        await drop_face_features_index()
+
+    task_ids = [
+        utility.do_bulk_insert(collection_name=FACE_FEATURES_COLLECTION, files=files)
+        for files in batches
+    ]
+    logger.info(f"{len(task_ids)} 件の一括インポートを開始しました: {task_ids}")
+    states = await asyncio.to_thread(wait_for_imports, task_ids)
+    logger.info(
+        f"一括インポートが完了しました (rows={sum(s.row_count for s in states.values())})"
+    )
+
+    index_type = await ensure_face_features_index()
+    logger.info(f"インデックス {index_type} を構築しました")
+
+
+async def _run(parsed_args):
+    """Milvusに接続して書き出し・インポート・インデックス構築を実行"""
+    from pymilvus import Collection
+    from pymilvus.bulk_writer import BulkFileType, LocalBulkWriter
+
+    from ..db import FACE_FEATURES_COLLECTION, milvus_init
+
+    await milvus_init()
+    file_type = (
+        BulkFileType.PARQUET if parsed_args.format == "parquet" else BulkFileType.NUMPY
+    )
+
+    if parsed_args.files:
+        batches = [files.split(",") for files in parsed_args.files]
+    else:
+        ids, matrix, attributes = load_source(parsed_args.source)
+        if parsed_args.local_output:
+            with LocalBulkWriter(
+                schema=Collection(FACE_FEATURES_COLLECTION).schema,
+                local_path=parsed_args.local_output,
+                file_type=file_type,
+            ) as writer:
+                write_files(writer, ids, matrix, attributes)
+            return
+        batches = upload_files(ids, matrix, attributes, file_type)
+
+    await import_files(batches, parsed_args.drop_index)
+
+
+def main(args: Optional[list] = None):
+    """bulk-importサブコマンドのエントリーポイント"""
+    parsed_args = create_parser().parse_args(args)
+    if not parsed_args.source and not parsed_args.files:
+        logger.error("インポートする source または --files を指定してください")
+        return
+    try:
+        asyncio.run(_run(parsed_args))
+    except ValueError as e:
+        logger.error(str(e))
@@ -0,0 +1,123 @@
+"""
+顔画像の一括登録ツールモジュール。
+
+ディレクトリまたはzipアーカイブ内の画像をユーザー名に対応付けて一括登録します。
+処理結果はファイルごとにレポート（JSON Lines）へ追記され、同じレポートを指定して
+再実行すると登録済みのファイルを飛ばして再開します。
+
+使用例:
+    faceapi enroll-bulk ./photos
+    faceapi enroll-bulk ./employees.zip --mapping ./employees.csv --batch-size 128
+    faceapi enroll-bulk ./photos --by-folder --report ./photos.enroll.jsonl
+"""
+
+import argparse
+import asyncio
+from typing import Optional
+
+from loguru import logger
+
+from ..core import _CONFIG_
+
+# 標準出力に表示するエラーの最大件数
+_MAX_PRINTED_ERRORS = 20
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="faceapi enroll-bulk",
+        description="Enroll faces from a directory or zip archive of images named "
+        "after usernames",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("source", type=str, help="Directory or zip archive of images")
+    parser.add_argument(
+        "--mapping",
+        type=str,
+        default="",
+        help="CSV of 'file,username' rows (defaults to the file name without "
+        "extension)",
+    )
+    parser.add_argument(
+        "--by-folder",
+        action="store_true",
+        help="Map unlisted files to their parent folder name (one folder per user)",
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        default="",
+        help="Per-file JSON Lines report used to resume (defaults to "
+        "<source>.enroll.jsonl)",
+    )
+    parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="Discard the existing templates of each enrolled user",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=_CONFIG_.BULK_ENROLL_BATCH_SIZE,
+        help="Images embedded and upserted per batch",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=_CONFIG_.BULK_ENROLL_WORKERS,
+        help="Threads used to decode images and detect faces",
+    )
+    return parser
+
+
+async def _run(parsed_args) -> dict:
+    """データベースとベクトルストアを初期化して一括登録を実行"""
+    from tortoise import Tortoise
+
+    from ..db import TORTOISE_ORM
+    from ..services.enroll import EnrollSource, bulk_enroll, load_mapping
+    from ..vector_store import close_vector_store, init_vector_store
+
+    source = EnrollSource(parsed_args.source)
+    mapping = load_mapping(parsed_args.mapping) if parsed_args.mapping else None
+    report_path = (
+        parsed_args.report or parsed_args.source.rstrip("/\\") + ".enroll.jsonl"
+    )
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    await init_vector_store()
+    try:
+        status = await bulk_enroll(
+            source,
+            report_path,
+            mapping,
+            by_folder=parsed_args.by_folder,
+            replace=parsed_args.replace,
+            batch_size=parsed_args.batch_size,
+            workers=parsed_args.workers,
+        )
+    finally:
+        source.close()
+        await close_vector_store()
+        await Tortoise.close_connections()
+    return {**status, "report": report_path}
+
+
+def main(args: Optional[list] = None):
+    """enroll-bulkサブコマンドのエントリーポイント"""
+    from ..services.enroll import load_report
+
+    parsed_args = create_parser().parse_args(args)
+    status = asyncio.run(_run(parsed_args))
+
+    report = load_report(status["report"])
+    errors = [row for row in report.values() if row["status"] == "error"]
+    for row in errors[:_MAX_PRINTED_ERRORS]:
+        print(f"{row['file']}\t{row['username']}\t{row['reason']}")
+    if len(errors) > _MAX_PRINTED_ERRORS:
+        print(f"... {len(errors) - _MAX_PRINTED_ERRORS} more")
+
+    logger.info(
+        f"一括登録が完了しました: 登録={status['enrolled']}, エラー={status['failed']}, "
+        f"登録済みのため省略={status['skipped']} (レポート: {status['report']})"
+    )
@@ -0,0 +1,110 @@
+"""
+埋め込みのPCA射影の学習ツールモジュール。
+
+登録済みの全次元の埋め込みから主成分（と白色化用の分散）を学習し、
+モデルの隣に保存します。保存した射影は EMB_PROJECTION_ENABLED で
+推論後の埋め込みに適用され、EMB_PROJECTION_DIM 次元でインデックスに登録されます。
+
+使用例:
+    faceapi fit-projection --whiten
+    faceapi fit-projection --npy ./data/face_features_full --output projection.npz
+"""
+
+import argparse
+import os
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from ..core import _CONFIG_
+from ..vector_store.numpy_store import load_numpy_store
+from ..vector_store.projection import EmbeddingProjection, get_projection_path
+
+# 累積寄与率を表示する次元数
+_REPORT_DIMS = [32, 64, 96, 128, 192, 256, 384]
+
+
+def load_npy_embeddings(path: str) -> np.ndarray:
+    """
+    .npy ファイル、またはNumPyベクトルストアのディレクトリから埋め込みを読み込む。
+
+    引数:
+        path: (N, dim) の .npy ファイル、またはNumPyベクトルストアのディレクトリ
+
+    戻り値:
+        (N, dim) の行列（削除された行がない場合はmemmap）
+    """
+    if os.path.isdir(path):
+        return load_numpy_store(path)[1]
+    return np.load(path, mmap_mode="r")
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="faceapi fit-projection",
+        description="Fit a PCA/whitening projection on stored full embeddings",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--npy",
+        type=str,
+        default="",
+        help="Load embeddings from an (N, dim) .npy file or a numpy vector store "
+        "directory instead of Milvus",
+    )
+    parser.add_argument(
+        "--limit", type=int, default=0, help="Maximum number of embeddings to load"
+    )
+    parser.add_argument(
+        "--whiten", action="store_true", help="Scale each component to unit variance"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="",
+        help="Output path (defaults to EMB_PROJECTION_PATH or next to the model)",
+    )
+    return parser
+
+
+def main(args: Optional[list] = None):
+    """fit-projectionサブコマンドのエントリーポイント"""
+    parsed_args = create_parser().parse_args(args)
+
+    if parsed_args.npy:
+        matrix = load_npy_embeddings(parsed_args.npy)
+        if parsed_args.limit > 0:
+            matrix = matrix[: parsed_args.limit]
+    else:
+        if _CONFIG_.EMB_PROJECTION_ENABLED:
+            logger.error(
+                "射影が有効な場合、Milvusには射影後の埋め込みしかありません。"
+                "--npy に全次元の埋め込み（EMB_PROJECTION_RERANK_PATHなど）を指定してください"
+            )
+            return
+        from .recall_report import load_milvus_embeddings
+
+        _, matrix = load_milvus_embeddings(parsed_args.limit)
+
+    if len(matrix) < 2:
+        logger.error("射影の学習には2件以上の埋め込みが必要です")
+        return
+    if matrix.shape[1] != _CONFIG_.MODEL_EMB_DIM:
+        logger.error(
+            f"埋め込みの次元数 {matrix.shape[1]} が"
+            f"MODEL_EMB_DIM {_CONFIG_.MODEL_EMB_DIM} と一致しません"
+        )
+        return
+
+    logger.info(f"{len(matrix)} 件の埋め込みで射影を学習しています...")
+    projection = EmbeddingProjection.fit(matrix, whiten=parsed_args.whiten)
+    output = parsed_args.output or get_projection_path()
+    projection.save(output)
+
+    ratios = projection.explained_variance_ratio()
+    print(f"{'dim':>6}{'explained_variance':>20}")
+    for dim in _REPORT_DIMS:
+        if dim < len(ratios):
+            print(f"{dim:>6}{ratios[dim - 1]:>20.4f}")
+    logger.info(f"射影を {output} に保存しました (whiten={parsed_args.whiten})")
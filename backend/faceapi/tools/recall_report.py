@@ -0,0 +1,278 @@
+"""
+埋め込みの保存形式の再現率評価ツールモジュール。
+
+現在のFLAT/COSINE（float32の厳密検索）を正解として、FLOAT16 / BFLOAT16への丸めと、
+2値コードのハミング距離で候補を絞ってから再ランキングする2段階検索の
+recall@k とベクトル1件あたりのメモリ量を比較します。
+
+使用例:
+    faceapi recall-report --queries 500 --k 10 --candidates 50,100,200
+    faceapi recall-report --npy embeddings.npy --noise 0.4
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import List, Optional
+
+import numpy as np
+from loguru import logger
+
+from ..core import _CONFIG_
+from ..vector_store.base import normalize_rows
+from ..vector_store.codec import (
+    VECTOR_DTYPE_BYTES,
+    VECTOR_DTYPES,
+    binarize,
+    decode_vector,
+    hamming_distances,
+    quantize,
+)
+from ..vector_store.local_index import blocked_top_k
+
+
+def load_milvus_embeddings(limit: int = 0):
+    """
+    face_features コレクションから埋め込みを読み込む。
+
+    引数:
+        limit: 読み込む最大件数（0で全件）
+
+    戻り値:
+        (ユーザーIDの配列, (N, dim) のfloat32行列)
+    """
+    from ..db import (
+        FACE_FEATURES_COLLECTION,
+        get_feature_storage,
+        get_milvus_client,
+        milvus_init,
+    )
+
+    asyncio.run(milvus_init())
+    dtype = get_feature_storage()["dtype"]
+    iterator = get_milvus_client().query_iterator(
+        collection_name=FACE_FEATURES_COLLECTION,
+        batch_size=1000,
+        limit=limit if limit > 0 else -1,
+        output_fields=["user_id", "feature_vector"],
+    )
+    ids, vectors = [], []
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            for row in batch:
+                ids.append(int(row["user_id"]))
+                vectors.append(decode_vector(row["feature_vector"], dtype))
+    finally:
+        iterator.close()
+    if not vectors:
+        return np.zeros(0, dtype=np.int64), np.zeros(
+            (0, _CONFIG_.INDEX_EMB_DIM), np.float32
+        )
+    return np.asarray(ids, dtype=np.int64), np.stack(vectors)
+
+
+def make_queries(matrix: np.ndarray, count: int, noise: float, seed: int):
+    """
+    登録済みの埋め込みにノイズを加えたクエリを生成。
+
+    同一人物を別の画像で撮影した状態を模して、L2ノルムが noise の
+    ランダムな方向のベクトルを加えてから正規化します。
+
+    引数:
+        matrix: (N, dim) のL2正規化済み埋め込み行列
+        count: クエリ数
+        noise: 加えるノイズのノルム
+        seed: 乱数シード
+
+    戻り値:
+        (count, dim) のL2正規化済みクエリ行列
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(matrix), size=min(count, len(matrix)), replace=False)
+    perturbation = normalize_rows(rng.standard_normal((len(rows), matrix.shape[1])))
+    return normalize_rows(matrix[rows] + noise * perturbation)
+
+
+def _recall(truth: List[List[int]], found: List[List[int]], k: int) -> float:
+    """正解の上位k件のうち見つかった割合の平均"""
+    hits = [
+        len(set(expected[:k]) & set(actual[:k])) / max(min(k, len(expected)), 1)
+        for expected, actual in zip(truth, found)
+    ]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def _ids(results) -> List[List[int]]:
+    return [[hit["user_id"] for hit in hits] for hits in results]
+
+
+def evaluate(
+    ids: np.ndarray,
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    candidates: List[int],
+) -> List[dict]:
+    """
+    保存形式ごとの再現率を評価。
+
+    引数:
+        ids: 各行のユーザーID
+        matrix: (N, dim) のL2正規化済み埋め込み行列
+        queries: (クエリ数, dim) のL2正規化済みクエリ行列
+        k: 評価する上位件数
+        candidates: 2段階検索で評価する候補数のリスト
+
+    戻り値:
+        構成ごとの評価結果のリスト
+    """
+    dim = matrix.shape[1]
+    truth = _ids(blocked_top_k(matrix, ids, queries, k))
+    report = []
+
+    # 全次元を保存形式に丸めた厳密検索（FLATインデックス相当）
+    for dtype in VECTOR_DTYPES:
+        stored = normalize_rows(quantize(matrix, dtype))
+        started = time.perf_counter()
+        found = _ids(
+            blocked_top_k(stored, ids, normalize_rows(quantize(queries, dtype)), k)
+        )
+        elapsed = time.perf_counter() - started
+        report.append(
+            {
+                "config": f"{dtype}",
+                "recall@1": _recall(truth, found, 1),
+                f"recall@{k}": _recall(truth, found, k),
+                "index_bytes": VECTOR_DTYPE_BYTES[dtype] * dim,
+                "ms_per_query": elapsed * 1000 / len(queries),
+            }
+        )
+
+    # 2値コードのハミング距離で候補を絞り、保存形式の埋め込みで再ランキング
+    codes = binarize(matrix)
+    query_codes = binarize(queries)
+    started = time.perf_counter()
+    distances = hamming_distances(codes, query_codes)
+    hamming_elapsed = time.perf_counter() - started
+    for count in candidates:
+        count = min(count, len(ids))
+        shortlist = np.argpartition(distances, count - 1, axis=1)[:, :count]
+        for dtype in VECTOR_DTYPES:
+            stored = quantize(matrix, dtype)
+            found = []
+            started = time.perf_counter()
+            for query, rows in zip(queries, shortlist):
+                scores = normalize_rows(stored[rows]) @ query
+                found.append([int(ids[rows[i]]) for i in np.argsort(-scores)[:k]])
+            elapsed = time.perf_counter() - started + hamming_elapsed
+            report.append(
+                {
+                    "config": f"BINARY({count})+{dtype}",
+                    "recall@1": _recall(truth, found, 1),
+                    f"recall@{k}": _recall(truth, found, k),
+                    # インデックスに載るのは2値コードのみで、埋め込みは再ランキング時に参照
+                    "index_bytes": dim // 8,
+                    "ms_per_query": elapsed * 1000 / len(queries),
+                }
+            )
+    return report
+
+
+def format_report(report: List[dict], k: int) -> str:
+    """評価結果を表形式の文字列に整形"""
+    baseline = report[0]["index_bytes"]
+    lines = [
+        f"{'config':<24}{'recall@1':>10}{f'recall@{k}':>12}"
+        f"{'index_bytes':>13}{'reduction':>11}{'ms/query':>10}"
+    ]
+    for row in report:
+        lines.append(
+            f"{row['config']:<24}{row['recall@1']:>10.4f}{row[f'recall@{k}']:>12.4f}"
+            f"{row['index_bytes']:>13}{baseline / row['index_bytes']:>10.1f}x"
+            f"{row['ms_per_query']:>10.3f}"
+        )
+    return "\n".join(lines)
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="faceapi recall-report",
+        description="Compare recall and index memory of FLOAT16/BFLOAT16 and "
+        "binary pre-filtered search against exact float32 FLAT/COSINE search",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--npy",
+        type=str,
+        default="",
+        help="Load embeddings from an (N, dim) .npy file instead of Milvus",
+    )
+    parser.add_argument(
+        "--limit", type=int, default=0, help="Maximum number of embeddings to load"
+    )
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--k", type=int, default=10, help="Top-k used for recall")
+    parser.add_argument(
+        "--candidates",
+        type=str,
+        default="50,100,200,500",
+        help="Comma separated candidate counts for the Hamming pre-filter",
+    )
+    parser.add_argument(
+        "--noise",
+        type=float,
+        default=0.3,
+        help="Norm of the random perturbation added to sampled queries",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "--output", type=str, default="", help="Write the report as JSON"
+    )
+    return parser
+
+
+def main(args: Optional[list] = None):
+    """recall-reportサブコマンドのエントリーポイント"""
+    parsed_args = create_parser().parse_args(args)
+
+    if parsed_args.npy:
+        matrix = np.load(parsed_args.npy, mmap_mode="r")
+        if parsed_args.limit > 0:
+            matrix = matrix[: parsed_args.limit]
+        ids = np.arange(len(matrix), dtype=np.int64)
+    else:
+        ids, matrix = load_milvus_embeddings(parsed_args.limit)
+    if len(ids) == 0:
+        logger.error("評価する埋め込みがありません")
+        return
+
+    matrix = normalize_rows(matrix)
+    queries = make_queries(
+        matrix, parsed_args.queries, parsed_args.noise, parsed_args.seed
+    )
+    candidates = [int(c) for c in parsed_args.candidates.split(",") if c.strip()]
+    logger.info(
+        f"{len(ids)} 件の埋め込みと {len(queries)} 件のクエリで再現率を評価しています..."
+    )
+
+    report = evaluate(ids, matrix, queries, parsed_args.k, candidates)
+    print(format_report(report, parsed_args.k))
+
+    if parsed_args.output:
+        with open(parsed_args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "rows": len(ids),
+                    "queries": len(queries),
+                    "k": parsed_args.k,
+                    "noise": parsed_args.noise,
+                    "report": report,
+                },
+                f,
+                indent=2,
+            )
+        logger.info(f"評価結果を {parsed_args.output} に書き出しました")
@@ -0,0 +1,452 @@
+"""
+モデル更新時の再埋め込みツールモジュール。
+
+MODEL_LOADER / MODEL_PATH を変更すると保存済みの埋め込みとの互換性がなくなるため、
+UserModel.head_pic に保存されている顔画像を新しいモデルで埋め込み直し、
+シャドウコレクション face_features_<モデル名> に書き込みます。
+ユーザーはID順（キーセット）に読み出し、チャンクの書き込みが完了するたびに
+チェックポイントを保存するため、中断しても同じコマンドで続きから再開できます。
+全件の書き込み後、index_lock を取得した上で、更新日時が前回の追いつき以降の
+ユーザーを該当者がいなくなるまで埋め込み直し、顔データをリセットされた
+ユーザーを除いてから face_features エイリアスを切り替えます（--swap-only でも同様）。
+切り替え後は古いモデルのサーバーが切り替えを検知するまで待ち、その間に
+登録されたユーザーをもう一度埋め込み直します。
+
+新しいモデルの設定（MODEL_LOADER / MODEL_PATH など）で実行し、切り替え後は
+APIサーバーを同じ設定で再起動してください。切り替え前のコレクションは
+ロールバック用に残されます。
+
+使用例:
+    MODEL_PATH=./models/new.onnx faceapi reembed
+    faceapi reembed --no-swap
+    faceapi reembed --swap-only
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from ..core import _CONFIG_
+
+# ユーザーの読み出しで取得するフィールド
+_USER_FIELDS = ("id", "head_pic", "is_active", "is_admin", "site")
+
+# 切り替え前に更新されたユーザーを取り込む回数の上限
+_CATCH_UP_PASSES = 5
+
+# APIサーバーとの時刻のずれを見込んで取り込む範囲を広げる幅（秒）
+_CATCH_UP_MARGIN = 60
+
+
+def shadow_collection_name() -> str:
+    """現在のモデルの埋め込みを書き込むシャドウコレクション名"""
+    from ..db import FACE_FEATURES_COLLECTION
+    from .snapshot import model_name
+
+    return f"{FACE_FEATURES_COLLECTION}_{re.sub(r'[^0-9A-Za-z_]', '_', model_name())}"
+
+
+def _checkpoint_path(collection_name: str) -> str:
+    """シャドウコレクションのチェックポイントのパス"""
+    return os.path.join(_CONFIG_.REEMBED_DIR, f"{collection_name}.json")
+
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    """
+    再埋め込みのチェックポイントを読み込む。
+
+    戻り値:
+        チェックポイントの辞書（ファイルがない場合は空）
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path: str, checkpoint: Dict[str, Any]):
+    """チェックポイントを一時ファイル経由で置き換え、書きかけの状態を残さない"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _prepare_stored_face(head_pic: str):
+    """
+    保存されている画像をデコードし、顔を切り出す（スレッドプールで実行）。
+
+    例外:
+        ValueError: 画像をデコードできない、または顔が検出されない場合
+    """
+    from ..utils import base64_to_image, detect_face
+
+    img = base64_to_image(head_pic)
+    if img is None:
+        raise ValueError("Invalid stored image")
+    faces = detect_face(img)
+    if not faces:
+        raise ValueError("No face detected in the image")
+    return faces[0]
+
+
+async def _reembed_chunk(store, users, executor: ThreadPoolExecutor) -> Tuple[int, int]:
+    """
+    ユーザーのチャンクを埋め込み直してシャドウコレクションに書き込む。
+
+    戻り値:
+        (書き込んだ件数, 失敗した件数)
+    """
+    from ..services.face import vector_attributes
+    from ..utils import inference_batch
+
+    loop = asyncio.get_running_loop()
+    tasks = [
+        loop.run_in_executor(executor, _prepare_stored_face, user.head_pic)
+        for user in users
+    ]
+    faces, embedded_users = [], []
+    for user, task in zip(users, tasks):
+        try:
+            faces.append(await task)
+            embedded_users.append(user)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning(f"ユーザー {user.id} の再埋め込みに失敗しました: {e}")
+
+    if embedded_users:
+        features = await loop.run_in_executor(executor, inference_batch, faces)
+        await store.upsert(
+            [user.id for user in embedded_users],
+            features,
+            attributes=[vector_attributes(user) for user in embedded_users],
+        )
+    return len(embedded_users), len(users) - len(embedded_users)
+
+
+async def _reembed_pass(
+    store,
+    checkpoint: Dict[str, Any],
+    path: str,
+    key: str,
+    executor: ThreadPoolExecutor,
+    batch_size: int,
+    **filters,
+):
+    """
+    条件に一致するユーザーをID順に埋め込み直し、チャンクごとにチェックポイントを保存。
+
+    引数:
+        key: 最後に処理したユーザーIDを記録するチェックポイントのキー
+        **filters: UserModelの絞り込み条件
+    """
+    from ..models import UserModel
+
+    while True:
+        users: List[UserModel] = (
+            await UserModel.filter(
+                id__gt=checkpoint[key], head_pic__isnull=False, **filters
+            )
+            .order_by("id")
+            .limit(batch_size)
+            .only(*_USER_FIELDS)
+        )
+        if not users:
+            return
+        embedded, failed = await _reembed_chunk(store, users, executor)
+        checkpoint[key] = users[-1].id
+        checkpoint["embedded"] += embedded
+        checkpoint["failed"] += failed
+        _save_checkpoint(path, checkpoint)
+        logger.info(
+            f"再埋め込み: user_id<={checkpoint[key]} "
+            f"(登録={checkpoint['embedded']}, 失敗={checkpoint['failed']})"
+        )
+
+
+async def _catch_up(
+    store,
+    checkpoint: Dict[str, Any],
+    path: str,
+    executor: ThreadPoolExecutor,
+    batch_size: int,
+):
+    """
+    前回の追いつき以降に顔を登録し直したユーザーを、該当者がいなくなるまで埋め込み直す。
+
+    ユーザーは updated_at で絞り込み、各回の開始時刻をチェックポイントの
+    caught_up_at に記録します（最初は再埋め込みの開始時刻から）。
+    """
+    from tortoise import timezone
+
+    for _ in range(_CATCH_UP_PASSES):
+        since = datetime.fromisoformat(
+            checkpoint.get("caught_up_at", checkpoint["started_at"])
+        )
+        marker = timezone.now() - timedelta(seconds=_CATCH_UP_MARGIN)
+        processed = checkpoint["embedded"] + checkpoint["failed"]
+        checkpoint["catch_up_last_id"] = 0
+        await _reembed_pass(
+            store,
+            checkpoint,
+            path,
+            "catch_up_last_id",
+            executor,
+            batch_size,
+            updated_at__gte=since,
+        )
+        checkpoint["caught_up_at"] = marker.isoformat()
+        _save_checkpoint(path, checkpoint)
+        if checkpoint["embedded"] + checkpoint["failed"] == processed:
+            return
+
+
+async def _remove_reset_faces(store, batch_size: int):
+    """顔データがリセットされたユーザーをシャドウコレクションから削除"""
+    from ..models import UserModel
+
+    last_id = 0
+    while True:
+        ids = (
+            await UserModel.filter(id__gt=last_id, head_pic__isnull=True)
+            .order_by("id")
+            .limit(batch_size)
+            .values_list("id", flat=True)
+        )
+        if not ids:
+            return
+        await store.delete(ids)
+        last_id = ids[-1]
+
+
+def _create_shadow_store(collection_name: str):
+    """シャドウコレクションに書き込むベクトルストアを生成"""
+    from ..vector_store.milvus_store import MilvusVectorStore
+
+    store = MilvusVectorStore(collection_name)
+    if _CONFIG_.EMB_PROJECTION_ENABLED:
+        from ..vector_store.projected_store import ProjectedVectorStore
+        from ..vector_store.projection import get_projection
+
+        store = ProjectedVectorStore(store, get_projection())
+    return store
+
+
+async def reembed(
+    batch_size: int, workers: int, swap: bool = True, restart: bool = False
+) -> Dict[str, Any]:
+    """
+    全ユーザーの顔画像を現在のモデルで埋め込み直し、エイリアスを切り替える。
+
+    引数:
+        batch_size: 1回にまとめて推論・書き込みするユーザー数
+        workers: デコードと顔検出のスレッド数
+        swap: 完了後に face_features エイリアスを切り替えるかどうか
+        restart: チェックポイントとシャドウコレクションを破棄して最初からやり直すかどうか
+
+    戻り値:
+        チェックポイントの辞書
+    """
+    from tortoise import timezone
+
+    from ..db import (
+        create_shadow_features_collection,
+        get_milvus_client,
+        resolve_face_features_collection,
+    )
+    from ..models import UserModel
+    from .snapshot import model_name
+
+    collection_name = shadow_collection_name()
+    if resolve_face_features_collection() == collection_name:
+        # 検索に使われているコレクションには書き込まない
+        raise RuntimeError(f"{collection_name} は既に face_features として使用中です")
+    path = _checkpoint_path(collection_name)
+    checkpoint = {} if restart else load_checkpoint(path)
+    if restart and collection_name in get_milvus_client().list_collections():
+        get_milvus_client().drop_collection(collection_name=collection_name)
+    if not checkpoint:
+        checkpoint = {
+            "collection": collection_name,
+            "model": model_name(),
+            "started_at": timezone.now().isoformat(),
+            "state": "running",
+            "last_id": 0,
+            "catch_up_last_id": 0,
+            "embedded": 0,
+            "failed": 0,
+        }
+        _save_checkpoint(path, checkpoint)
+
+    store = _create_shadow_store(collection_name)
+    await create_shadow_features_collection(
+        collection_name, await UserModel.filter(head_pic__isnull=False).count()
+    )
+    logger.info(
+        f"{collection_name} への再埋め込みを開始します "
+        f"(user_id>{checkpoint['last_id']}, モデル={checkpoint['model']})"
+    )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        await _reembed_pass(store, checkpoint, path, "last_id", executor, batch_size)
+        if not swap:
+            # 切り替える場合は swap_to_shadow がロックを取得してから行う
+            await _finish_shadow(store, checkpoint, path, executor, batch_size)
+    checkpoint["state"] = "completed"
+    _save_checkpoint(path, checkpoint)
+
+    if swap:
+        await swap_to_shadow(checkpoint, path, batch_size, workers)
+    return checkpoint
+
+
+async def _finish_shadow(
+    store,
+    checkpoint: Dict[str, Any],
+    path: str,
+    executor: ThreadPoolExecutor,
+    batch_size: int,
+):
+    """実行中に更新されたユーザー、顔データのリセット、属性の変更をシャドウに反映"""
+    from ..services.admin import sync_vector_attributes_service
+
+    await _catch_up(store, checkpoint, path, executor, batch_size)
+    await _remove_reset_faces(store, batch_size)
+    await sync_vector_attributes_service(store)
+
+
+async def swap_to_shadow(
+    checkpoint: Dict[str, Any], path: str, batch_size: int, workers: int
+):
+    """
+    face_features エイリアスを完了したシャドウコレクションに切り替える。
+
+    インデックスの再構築と重ならないよう index_lock を取得し、切り替えの直前に
+    再埋め込みの完了（または --no-swap）以降の更新をシャドウに反映します。
+    切り替え後は、古いモデルのサーバーがモデル名の変化を検知して書き込みを止めるまで
+    （MILVUS_MODEL_CHECK_INTERVAL）待ち、その間に更新されたユーザーを埋め込み直します。
+    テンプレートは以前のモデルの埋め込みのため削除します
+    （削除後はプロトタイプの類似度で照合され、次回の登録からテンプレートが蓄積されます）。
+    """
+    from ..db import (
+        FACE_TEMPLATES_COLLECTION,
+        get_milvus_client,
+        index_lock,
+        swap_face_features_alias,
+    )
+
+    store = _create_shadow_store(checkpoint["collection"])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        lock = index_lock()
+        await asyncio.to_thread(lock.acquire)
+        try:
+            await _finish_shadow(store, checkpoint, path, executor, batch_size)
+            previous = await swap_face_features_alias(checkpoint["collection"])
+        finally:
+            lock.release()
+        checkpoint.update(state="swapped", previous_collection=previous)
+        _save_checkpoint(path, checkpoint)
+
+        interval = _CONFIG_.MILVUS_MODEL_CHECK_INTERVAL
+        if interval > 0:
+            logger.info(
+                f"古いモデルのサーバーが切り替えを検知するまで {interval} 秒待機します"
+            )
+            await asyncio.sleep(interval)
+            await _catch_up(store, checkpoint, path, executor, batch_size)
+
+    if _CONFIG_.FACE_TEMPLATES_ENABLED:
+        get_milvus_client().delete(
+            collection_name=FACE_TEMPLATES_COLLECTION, filter="template_id >= 0"
+        )
+        logger.info(
+            f"{FACE_TEMPLATES_COLLECTION} の以前のモデルのテンプレートを削除しました"
+        )
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="faceapi reembed",
+        description="Re-embed the stored face images with the configured model into "
+        "a shadow collection and swap the face_features alias to it",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=_CONFIG_.BULK_ENROLL_BATCH_SIZE,
+        help="Users embedded and written per batch",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=_CONFIG_.BULK_ENROLL_WORKERS,
+        help="Threads used to decode images and detect faces",
+    )
+    parser.add_argument(
+        "--no-swap",
+        action="store_true",
+        help="Fill the shadow collection without swapping the alias",
+    )
+    parser.add_argument(
+        "--swap-only",
+        action="store_true",
+        help="Only swap the alias to a completed shadow collection",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Drop the checkpoint and shadow collection and start over",
+    )
+    return parser
+
+
+async def _run(parsed_args):
+    """データベースに接続して再埋め込みまたは切り替えを実行"""
+    from tortoise import Tortoise
+
+    from ..db import TORTOISE_ORM, milvus_init
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    await milvus_init()
+    try:
+        if not parsed_args.swap_only:
+            return await reembed(
+                parsed_args.batch_size,
+                parsed_args.workers,
+                swap=not parsed_args.no_swap,
+                restart=parsed_args.restart,
+            )
+
+        path = _checkpoint_path(shadow_collection_name())
+        checkpoint = load_checkpoint(path)
+        if checkpoint.get("state") != "completed":
+            logger.error(f"完了した再埋め込みがありません: {path}")
+            return checkpoint
+        await swap_to_shadow(
+            checkpoint, path, parsed_args.batch_size, parsed_args.workers
+        )
+        return checkpoint
+    finally:
+        await Tortoise.close_connections()
+
+
+def main(args: Optional[list] = None):
+    """reembedサブコマンドのエントリーポイント"""
+    parsed_args = create_parser().parse_args(args)
+    if _CONFIG_.VECTOR_STORE_BACKEND.lower() != "milvus":
+        logger.error("再埋め込みはMilvusバックエンドのみ対応しています")
+        return
+    checkpoint = asyncio.run(_run(parsed_args))
+    logger.info(
+        f"再埋め込み: {checkpoint.get('state')} "
+        f"(登録={checkpoint.get('embedded', 0)}, 失敗={checkpoint.get('failed', 0)}, "
+        f"切り替え前={checkpoint.get('previous_collection')})"
+    )
@@ -0,0 +1,338 @@
+"""
+埋め込みのスナップショットツールモジュール。
+
+face_features コレクションを query_iterator で順に読み出し、メモリマップした
+.npy の埋め込み行列と user_id・update_at・属性の配列に書き出します。
+配置はNumPyベクトルストアと同じため、そのまま分析に使うことができ、
+復元時は一括インポート（bulk-import）と同じ経路でMilvusに投入します。
+
+スナップショットは SNAPSHOT_DIR/<モデル名>/<作成時刻>/ に保存され、
+別のモデルの埋め込みを誤って復元しないよう、復元時にモデル名を確認します。
+一括インポートでの復元は空の face_features にのみ行えるため、既存の行がある場合は
+--method upsert を使用してください。
+
+使用例:
+    faceapi snapshot export
+    faceapi snapshot list
+    faceapi snapshot restore ./data/snapshots/facenet-g_m3/20260101-000000
+    faceapi snapshot restore <path> --method upsert
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from ..core import _CONFIG_
+from ..vector_store.base import ATTRIBUTE_DEFAULTS
+
+# メタデータのファイル名（書き出しの完了後に作成）
+META_FILE = "meta.json"
+
+# 書き込み件数のログを出力する間隔
+_LOG_EVERY_ROWS = 100000
+
+
+def model_name() -> str:
+    """
+    スナップショットの版として使うモデル名を返す。
+
+    face_features のコレクションに記録するモデル名と同じです。
+    """
+    from ..db import feature_model_name
+
+    return feature_model_name()
+
+
+def _grow_matrix(path: str, matrix: np.memmap, size: int, capacity: int) -> np.memmap:
+    """メモリマップした行列を capacity 行に拡張（既存の size 行をコピー）"""
+    tmp_path = path + ".tmp"
+    grown = np.lib.format.open_memmap(
+        tmp_path, mode="w+", dtype=np.float32, shape=(capacity, matrix.shape[1])
+    )
+    grown[:size] = matrix[:size]
+    grown.flush()
+    del matrix
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r+")
+
+
+def export_snapshot(output_dir: str = "", batch_size: int = 1000) -> str:
+    """
+    face_features コレクションをスナップショットに書き出す。
+
+    引数:
+        output_dir: 書き出し先（空の場合は SNAPSHOT_DIR/<モデル名>/<作成時刻>）
+        batch_size: query_iterator で1回に読み出す件数
+
+    戻り値:
+        スナップショットのディレクトリ
+    """
+    from ..db import (
+        FACE_FEATURES_COLLECTION,
+        get_feature_storage,
+        get_milvus_client,
+        milvus_init,
+    )
+    from ..vector_store.codec import decode_vector
+
+    asyncio.run(milvus_init())
+    client = get_milvus_client()
+    storage = get_feature_storage()
+
+    output_dir = output_dir or os.path.join(
+        _CONFIG_.SNAPSHOT_DIR, model_name(), time.strftime("%Y%m%d-%H%M%S")
+    )
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 件数は目安のため、超えた場合は行列を拡張する
+    stats = client.get_collection_stats(collection_name=FACE_FEATURES_COLLECTION)
+    capacity = max(int(stats.get("row_count", 0)), 1)
+    matrix_path = os.path.join(output_dir, "embeddings.npy")
+    matrix = np.lib.format.open_memmap(
+        matrix_path,
+        mode="w+",
+        dtype=np.float32,
+        shape=(capacity, _CONFIG_.INDEX_EMB_DIM),
+    )
+    ids, update_at = [], []
+    attributes = {name: [] for name in storage["attributes"]}
+
+    output_fields = ["user_id", "feature_vector", "update_at"] + storage["attributes"]
+    iterator = client.query_iterator(
+        collection_name=FACE_FEATURES_COLLECTION,
+        batch_size=batch_size,
+        output_fields=output_fields,
+    )
+    size = 0
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            if size + len(batch) > capacity:
+                capacity = max(capacity * 2, size + len(batch))
+                matrix = _grow_matrix(matrix_path, matrix, size, capacity)
+            matrix[size : size + len(batch)] = np.stack(
+                [
+                    decode_vector(row["feature_vector"], storage["dtype"])
+                    for row in batch
+                ]
+            )
+            for row in batch:
+                ids.append(int(row["user_id"]))
+                update_at.append(int(row["update_at"]))
+                for name, column in attributes.items():
+                    column.append(row.get(name, ATTRIBUTE_DEFAULTS[name]))
+            previous, size = size, size + len(batch)
+            if size // _LOG_EVERY_ROWS > previous // _LOG_EVERY_ROWS:
+                logger.info(f"{size} 件を書き出しました")
+    finally:
+        iterator.close()
+    matrix.flush()
+    del matrix
+
+    np.save(os.path.join(output_dir, "ids.npy"), np.asarray(ids, dtype=np.int64))
+    np.save(
+        os.path.join(output_dir, "update_at.npy"), np.asarray(update_at, dtype=np.int64)
+    )
+    for name, column in attributes.items():
+        np.save(os.path.join(output_dir, f"attr_{name}.npy"), np.asarray(column))
+
+    # メタデータは最後に書き込み、途中で失敗したスナップショットと区別する
+    meta = {
+        "model": model_name(),
+        "dim": _CONFIG_.INDEX_EMB_DIM,
+        "size": size,
+        "collection": FACE_FEATURES_COLLECTION,
+        "dtype": storage["dtype"],
+        "attributes": storage["attributes"],
+        "created_at": int(time.time() * 1000),
+    }
+    with open(os.path.join(output_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    logger.info(f"{size} 件のスナップショットを作成しました: {output_dir}")
+    return output_dir
+
+
+def list_snapshots(root: str = "") -> list:
+    """
+    保存されているスナップショットのメタデータを返す。
+
+    引数:
+        root: スナップショットのルート（空の場合は SNAPSHOT_DIR）
+
+    戻り値:
+        {"path": ディレクトリ, ...メタデータ} のリスト（作成順）
+    """
+    root = root or _CONFIG_.SNAPSHOT_DIR
+    snapshots = []
+    if not os.path.isdir(root):
+        return snapshots
+    for model in sorted(os.listdir(root)):
+        model_dir = os.path.join(root, model)
+        if not os.path.isdir(model_dir):
+            continue
+        for name in sorted(os.listdir(model_dir)):
+            meta_path = os.path.join(model_dir, name, META_FILE)
+            if not os.path.exists(meta_path):
+                continue
+            with open(meta_path, encoding="utf-8") as f:
+                snapshots.append({"path": os.path.dirname(meta_path), **json.load(f)})
+    return sorted(snapshots, key=lambda snapshot: snapshot["created_at"])
+
+
+async def restore_snapshot(
+    path: str,
+    method: str = "bulk",
+    file_format: str = "parquet",
+    drop_index: bool = False,
+    force: bool = False,
+    batch_size: int = 1000,
+):
+    """
+    スナップショットを face_features コレクションに復元する。
+
+    引数:
+        path: スナップショットのディレクトリ
+        method: bulk（一括インポート）または upsert（件数が少ない場合向け）
+        file_format: 一括インポートのファイル形式（parquet, numpy）
+        drop_index: 一括インポート中はインデックスを削除し、完了後に一度だけ構築するか
+        force: モデル名が異なっても復元するかどうか
+        batch_size: upsert で1回に書き込む件数
+
+    例外:
+        ValueError: スナップショットが不完全、モデル・次元数が異なる場合、
+            または一括インポートで face_features が空でない場合
+    """
+    from pymilvus.bulk_writer import BulkFileType
+
+    from ..db import milvus_init
+    from ..vector_store.milvus_store import MilvusVectorStore
+    from .bulk_import import import_files, load_source, upload_files
+
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        raise ValueError(f"{path} は完了したスナップショットではありません")
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["dim"] != _CONFIG_.INDEX_EMB_DIM:
+        raise ValueError(
+            f"スナップショットの次元数 {meta['dim']} がインデックスの次元数 "
+            f"{_CONFIG_.INDEX_EMB_DIM} と一致しません"
+        )
+    if meta["model"] != model_name() and not force:
+        raise ValueError(
+            f"スナップショットのモデル {meta['model']} が現在のモデル {model_name()} と"
+            "異なります（--force で復元できます）"
+        )
+
+    await milvus_init()
+    ids, matrix, attributes = load_source(path)
+    if method == "bulk":
+        file_type = (
+            BulkFileType.PARQUET if file_format == "parquet" else BulkFileType.NUMPY
+        )
+        batches = upload_files(ids, matrix, attributes, file_type)
+        await import_files(batches, drop_index)
+        return
+
+    store = MilvusVectorStore()
+    for start in range(0, len(ids), batch_size):
+        end = min(start + batch_size, len(ids))
+        rows = [
+            {name: column[index].item() for name, column in attributes.items()}
+            for index in range(start, end)
+        ]
+        # 更新時刻は復元時刻とし、ローカル複製の差分同期に取り込ませる
+        await store.upsert(
+            ids[start:end].tolist(),
+            np.asarray(matrix[start:end]),
+            attributes=rows,
+        )
+        logger.info(f"{end}/{len(ids)} 件を復元しました")
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="faceapi snapshot",
+        description="Export face_features to a memory-mapped .npy snapshot versioned "
+        "by model name, or restore a snapshot into Milvus",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write a snapshot")
+    export_parser.add_argument(
+        "--output",
+        type=str,
+        default="",
+        help="Snapshot directory (defaults to SNAPSHOT_DIR/<model>/<timestamp>)",
+    )
+    export_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Rows read per query_iterator batch",
+    )
+
+    subparsers.add_parser("list", help="List the snapshots under SNAPSHOT_DIR")
+
+    restore_parser = subparsers.add_parser(
+        "restore", help="Load a snapshot into Milvus"
+    )
+    restore_parser.add_argument("path", type=str, help="Snapshot directory")
+    restore_parser.add_argument(
+        "--method",
+        choices=["bulk", "upsert"],
+        default="bulk",
+        help="Milvus bulk insert through MinIO/S3, or plain upserts",
+    )
+    restore_parser.add_argument(
+        "--format", choices=["parquet", "numpy"], default="parquet", help="File format"
+    )
+    restore_parser.add_argument(
+        "--drop-index",
+        action="store_true",
+        help="Drop the index during a bulk restore and build it once at the end "
+        "(face_features cannot be searched until then)",
+    )
+    restore_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Restore even if the snapshot was taken with another model",
+    )
+    restore_parser.add_argument(
+        "--batch-size", type=int, default=1000, help="Rows per upsert"
+    )
+    return parser
+
+
+def main(args: Optional[list] = None):
+    """snapshotサブコマンドのエントリーポイント"""
+    parsed_args = create_parser().parse_args(args)
+    if parsed_args.action == "export":
+        export_snapshot(parsed_args.output, parsed_args.batch_size)
+    elif parsed_args.action == "list":
+        for snapshot in list_snapshots():
+            created = time.localtime(snapshot["created_at"] / 1000)
+            print(
+                f"{snapshot['path']}\t{snapshot['model']}\tsize={snapshot['size']}\t"
+                f"dim={snapshot['dim']}\t{time.strftime('%Y-%m-%d %H:%M:%S', created)}"
+            )
+    else:
+        asyncio.run(
+            restore_snapshot(
+                parsed_args.path,
+                method=parsed_args.method,
+                file_format=parsed_args.format,
+                drop_index=parsed_args.drop_index,
+                force=parsed_args.force,
+                batch_size=parsed_args.batch_size,
+            )
+        )
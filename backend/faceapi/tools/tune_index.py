@@ -0,0 +1,431 @@
+"""
+インデックスのパラメータ調整ツールモジュール。
+
+face_features から抽出した埋め込み（または合成した埋め込み）を一時コレクションに
+投入し、ブロック単位の行列積で求めた厳密な上位k件を正解として、インデックス種類と
+検索パラメータ（nprobe / ef）の組み合わせごとに recall@k、QPS、p99レイテンシを
+計測します。再現率とp99レイテンシのパレート最適な設定と、目標の再現率を満たす
+最も速い設定に対応する Config の値を出力します。
+
+使用例:
+    faceapi tune-index --limit 100000 --queries 500 --k 10
+    faceapi tune-index --synthetic 200000 --index-types HNSW,IVF_SQ8
+    faceapi tune-index --target-recall 0.98 --output tune.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from ..core import _CONFIG_
+from ..vector_store.base import normalize_rows
+from ..vector_store.local_index import blocked_top_k
+from .recall_report import _ids, _recall, load_milvus_embeddings, make_queries
+
+# 調整に使う一時コレクション名
+TUNE_COLLECTION = "face_features_tune"
+
+# 1回のupsertで投入する件数
+_UPSERT_BATCH = 1000
+
+
+def synthetic_embeddings(count: int, dim: int, seed: int, per_identity: int = 4):
+    """
+    1人あたり複数枚の顔を模した合成埋め込みを生成。
+
+    ランダムな中心の周りに per_identity 件ずつ分布させ、顔の埋め込みのように
+    同一人物が近くに集まる分布にします。
+
+    引数:
+        count: 生成する件数
+        dim: 次元数
+        seed: 乱数シード
+        per_identity: 1人あたりの件数
+
+    戻り値:
+        (count, dim) のL2正規化済み行列
+    """
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(
+        rng.standard_normal((count // per_identity + 1, dim)).astype(np.float32)
+    )
+    rows = centers[np.arange(count) // per_identity]
+    spread = rng.standard_normal((count, dim)).astype(np.float32) / np.sqrt(dim)
+    return normalize_rows(rows + 0.6 * spread)
+
+
+async def _load_tune_collection(ids: np.ndarray, matrix: np.ndarray):
+    """face_features と同じ保存形式の一時コレクションを作成して埋め込みを投入"""
+    from ..db import create_shadow_features_collection, get_milvus_client
+    from ..vector_store.milvus_store import MilvusVectorStore
+
+    client = get_milvus_client()
+    if TUNE_COLLECTION in client.list_collections():
+        client.drop_collection(TUNE_COLLECTION)
+    await create_shadow_features_collection(TUNE_COLLECTION, len(ids))
+    store = MilvusVectorStore(TUNE_COLLECTION)
+    for start in range(0, len(ids), _UPSERT_BATCH):
+        end = min(start + _UPSERT_BATCH, len(ids))
+        await store.upsert(ids[start:end].tolist(), matrix[start:end])
+    client.flush(TUNE_COLLECTION)
+    logger.info(f"一時コレクション {TUNE_COLLECTION} に {len(ids)} 件を投入しました")
+
+
+def _build_index(client, index_type: str, row_count: int):
+    """一時コレクションのベクトルインデックスを作り直す"""
+    from pymilvus import MilvusClient
+
+    from ..db.init_milvus import FEATURE_VECTOR_INDEX, build_index_params
+
+    client.release_collection(collection_name=TUNE_COLLECTION)
+    if client.describe_index(
+        collection_name=TUNE_COLLECTION, index_name=FEATURE_VECTOR_INDEX
+    ):
+        client.drop_index(
+            collection_name=TUNE_COLLECTION, index_name=FEATURE_VECTOR_INDEX
+        )
+    index_params = MilvusClient.prepare_index_params()
+    index_params.add_index(
+        field_name="feature_vector",
+        metric_type="COSINE",
+        index_type=index_type,
+        index_name=FEATURE_VECTOR_INDEX,
+        params=build_index_params(index_type, row_count),
+    )
+    started = time.perf_counter()
+    client.create_index(
+        collection_name=TUNE_COLLECTION, index_params=index_params, sync=True
+    )
+    client.load_collection(TUNE_COLLECTION)
+    return time.perf_counter() - started
+
+
+def _run_queries(
+    client, queries: np.ndarray, k: int, search_params: dict, concurrency: int
+):
+    """
+    クエリを1件ずつ並列に検索し、結果とレイテンシを返す。
+
+    戻り値:
+        (クエリごとのユーザーIDのリスト, レイテンシ（ミリ秒）の配列, 経過時間（秒）)
+    """
+    from ..db import get_feature_storage
+    from ..vector_store.codec import encode_vectors
+
+    dtype = get_feature_storage()["dtype"]
+
+    def search(query):
+        started = time.perf_counter()
+        hits = client.search(
+            collection_name=TUNE_COLLECTION,
+            data=encode_vectors(query[np.newaxis], dtype),
+            anns_field="feature_vector",
+            limit=k,
+            output_fields=["user_id"],
+            search_params=search_params,
+        )[0]
+        latency = (time.perf_counter() - started) * 1000
+        return [hit["entity"]["user_id"] for hit in hits], latency
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(search, queries))
+    elapsed = time.perf_counter() - started
+    return (
+        [found for found, _ in results],
+        np.asarray([latency for _, latency in results]),
+        elapsed,
+    )
+
+
+def search_settings(index_type: str, nprobes: List[int], efs: List[int], k: int):
+    """
+    インデックス種類ごとに試す検索パラメータを列挙。
+
+    戻り値:
+        {"nprobe": 値} / {"ef": 値} / {} のリスト
+    """
+    if index_type == "HNSW":
+        # efは上位件数以上である必要がある
+        return [{"ef": ef} for ef in efs if ef >= k]
+    if index_type.startswith("IVF"):
+        return [{"nprobe": nprobe} for nprobe in nprobes]
+    return [{}]
+
+
+def sweep(
+    queries: np.ndarray,
+    truth: List[List[int]],
+    row_count: int,
+    k: int,
+    index_types: List[str],
+    nprobes: List[int],
+    efs: List[int],
+    concurrency: int,
+) -> List[dict]:
+    """
+    インデックス種類と検索パラメータの組み合わせごとに再現率と速度を計測。
+
+    引数:
+        queries: (クエリ数, dim) のL2正規化済みクエリ行列
+        truth: クエリごとの厳密な上位k件のユーザーID
+        row_count: 一時コレクションの件数
+        k: 評価する上位件数
+        index_types: 試すインデックス種類
+        nprobes: IVF系で試すnprobe
+        efs: HNSWで試すef
+        concurrency: 同時に実行する検索数
+
+    戻り値:
+        設定ごとの計測結果のリスト
+    """
+    from ..db import get_milvus_client
+
+    client = get_milvus_client()
+    dim = queries.shape[1]
+    results = []
+    for index_type in index_types:
+        if index_type == "IVF_PQ" and dim % _CONFIG_.MILVUS_IVF_PQ_M:
+            logger.warning(
+                f"次元数 {dim} が MILVUS_IVF_PQ_M={_CONFIG_.MILVUS_IVF_PQ_M} で"
+                "割り切れないため IVF_PQ を省略します"
+            )
+            continue
+        build_seconds = _build_index(client, index_type, row_count)
+        logger.info(f"{index_type} を {build_seconds:.1f} 秒で構築しました")
+        for params in search_settings(index_type, nprobes, efs, k):
+            search_params = {"metric_type": "COSINE", "params": dict(params)}
+            # 接続やキャッシュの初回のコストを除くため、1回目は計測に含めない
+            _run_queries(client, queries[:concurrency], k, search_params, concurrency)
+            found, latencies, elapsed = _run_queries(
+                client, queries, k, search_params, concurrency
+            )
+            row = {
+                "index_type": index_type,
+                "params": params,
+                f"recall@{k}": _recall(truth, found, k),
+                "recall@1": _recall(truth, found, 1),
+                "qps": len(queries) / elapsed,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "build_seconds": build_seconds,
+            }
+            results.append(row)
+            logger.info(
+                f"{format_setting(row)}: recall@{k}={row[f'recall@{k}']:.4f} "
+                f"qps={row['qps']:.0f} p99={row['p99_ms']:.2f}ms"
+            )
+    return results
+
+
+def format_setting(row: dict) -> str:
+    """設定を "HNSW(ef=64)" の形式で表す"""
+    params = ",".join(f"{name}={value}" for name, value in row["params"].items())
+    return f"{row['index_type']}({params})" if params else row["index_type"]
+
+
+def pareto_front(results: List[dict], k: int) -> List[dict]:
+    """
+    再現率が高く、p99レイテンシが低い方向でパレート最適な設定を返す。
+
+    戻り値:
+        他の設定に再現率とp99レイテンシの両方で劣らない設定のリスト（p99の昇順）
+    """
+    key = f"recall@{k}"
+    front = [
+        row
+        for row in results
+        if not any(
+            other[key] >= row[key]
+            and other["p99_ms"] <= row["p99_ms"]
+            and (other[key] > row[key] or other["p99_ms"] < row["p99_ms"])
+            for other in results
+        )
+    ]
+    return sorted(front, key=lambda row: row["p99_ms"])
+
+
+def recommend(results: List[dict], k: int, target_recall: float) -> Optional[dict]:
+    """目標の再現率を満たす設定のうちp99レイテンシが最も低いもの"""
+    candidates = [row for row in results if row[f"recall@{k}"] >= target_recall]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda row: row["p99_ms"])
+
+
+def config_values(row: dict) -> Dict[str, str]:
+    """設定に対応する Config の値（環境変数）"""
+    values = {"MILVUS_INDEX_TYPE": row["index_type"]}
+    if "ef" in row["params"]:
+        values["MILVUS_HNSW_EF"] = str(row["params"]["ef"])
+    if "nprobe" in row["params"]:
+        values["MILVUS_IVF_NPROBE"] = str(row["params"]["nprobe"])
+    return values
+
+
+def format_results(results: List[dict], k: int) -> str:
+    """計測結果を表形式の文字列に整形"""
+    lines = [
+        f"{'setting':<24}{f'recall@{k}':>12}{'recall@1':>10}"
+        f"{'qps':>10}{'p50_ms':>10}{'p99_ms':>10}"
+    ]
+    for row in results:
+        lines.append(
+            f"{format_setting(row):<24}{row[f'recall@{k}']:>12.4f}"
+            f"{row['recall@1']:>10.4f}{row['qps']:>10.0f}"
+            f"{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="faceapi tune-index",
+        description="Sweep Milvus index types and nprobe/ef on a temporary copy of "
+        "face_features, measure recall@k against exact search, QPS and p99 latency, "
+        "and recommend Config values",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=100000,
+        help="Maximum number of embeddings sampled from face_features (0 for all)",
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="Use this many synthetic embeddings instead of face_features",
+    )
+    parser.add_argument("--queries", type=int, default=500, help="Number of queries")
+    parser.add_argument("--k", type=int, default=10, help="Top-k used for recall")
+    parser.add_argument(
+        "--noise",
+        type=float,
+        default=0.3,
+        help="Norm of the random perturbation added to sampled queries",
+    )
+    parser.add_argument(
+        "--index-types",
+        type=str,
+        default="FLAT,HNSW,IVF_FLAT,IVF_SQ8,IVF_PQ",
+        help="Comma separated index types to sweep",
+    )
+    parser.add_argument(
+        "--nprobe",
+        type=str,
+        default="4,8,16,32,64,128",
+        help="Comma separated nprobe values for IVF indexes",
+    )
+    parser.add_argument(
+        "--ef",
+        type=str,
+        default="16,32,64,128,256",
+        help="Comma separated ef values for HNSW",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="Concurrent single-query searches"
+    )
+    parser.add_argument(
+        "--target-recall",
+        type=float,
+        default=0.95,
+        help="Recall@k the recommended setting must reach",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the temporary collection"
+    )
+    parser.add_argument("--output", type=str, default="", help="Write results as JSON")
+    return parser
+
+
+def main(args: Optional[list] = None):
+    """tune-indexサブコマンドのエントリーポイント"""
+    from ..db import get_milvus_client, milvus_init
+
+    parsed_args = create_parser().parse_args(args)
+    k = parsed_args.k
+    index_types = [
+        name.strip().upper() for name in parsed_args.index_types.split(",") if name
+    ]
+
+    if parsed_args.synthetic > 0:
+        asyncio.run(milvus_init())
+        matrix = synthetic_embeddings(
+            parsed_args.synthetic, _CONFIG_.INDEX_EMB_DIM, parsed_args.seed
+        )
+        ids = np.arange(1, len(matrix) + 1, dtype=np.int64)
+    else:
+        ids, matrix = load_milvus_embeddings(parsed_args.limit)
+    if len(ids) == 0:
+        logger.error("調整に使う埋め込みがありません")
+        return
+
+    matrix = normalize_rows(matrix)
+    queries = make_queries(
+        matrix, parsed_args.queries, parsed_args.noise, parsed_args.seed
+    )
+    logger.info(
+        f"{len(ids)} 件の埋め込みで {len(queries)} 件のクエリの正解を計算しています..."
+    )
+    truth = _ids(blocked_top_k(matrix, ids, queries, k))
+
+    asyncio.run(_load_tune_collection(ids, matrix))
+    try:
+        results = sweep(
+            queries,
+            truth,
+            len(ids),
+            k,
+            index_types,
+            _int_list(parsed_args.nprobe),
+            _int_list(parsed_args.ef),
+            max(parsed_args.concurrency, 1),
+        )
+    finally:
+        if not parsed_args.keep:
+            get_milvus_client().drop_collection(TUNE_COLLECTION)
+
+    print(format_results(results, k))
+    front = pareto_front(results, k)
+    print(f"\nPareto front (recall@{k} vs p99):")
+    print(format_results(front, k))
+
+    best = recommend(results, k, parsed_args.target_recall)
+    if best is None:
+        print(f"\nNo setting reached recall@{k} >= {parsed_args.target_recall}")
+    else:
+        print(
+            f"\nRecommended for recall@{k} >= {parsed_args.target_recall}: "
+            f"{format_setting(best)}"
+        )
+        for name, value in config_values(best).items():
+            print(f"{name}={value}")
+
+    if parsed_args.output:
+        with open(parsed_args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "rows": len(ids),
+                    "queries": len(queries),
+                    "k": k,
+                    "results": results,
+                    "pareto_front": front,
+                    "recommended": best,
+                },
+                f,
+                indent=2,
+            )
+        logger.info(f"計測結果を {parsed_args.output} に書き出しました")
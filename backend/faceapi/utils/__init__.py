@@ -4,9 +4,13 @@
 from .face_utils import (
     FaceDetector,
     base64_to_image,
+    bytes_to_image,
     detect_face,
+    detect_face_boxes,
     image_to_base64,
     inference,
+    inference_batch,
+    parse_face_box,
 )
 from .jwt_utils import (
     create_access_token,
@@ -14,8 +18,24 @@ from .jwt_utils import (
     get_current_admin_user,
     get_current_user,
 )
-from .milvus_utils import load_collection
+from .milvus_utils import (
+    collection_call,
+    collection_state_refresh_loop,
+    invalidate_collection_state,
+    load_collection,
+    milvus_call,
+    run_in_milvus_executor,
+    search_call,
+)
 from .pass_utils import hash_password, verify_password
+from .track_utils import FaceTracker
+from .upload_utils import (
+    RequestSizeLimitMiddleware,
+    admit_image_bytes,
+    read_upload_image,
+    sniff_image_header,
+)
+from .quality_utils import QUALITY_MESSAGES, check_face_quality
 
 __ALL__ = [
     "create_access_token",
@@ -27,8 +47,25 @@ __ALL__ = [
     "verify_password",
     "FaceDetector",
     "detect_face",
+    "detect_face_boxes",
+    "parse_face_box",
     "inference",
+    "inference_batch",
     "image_to_base64",
     "base64_to_image",
+    "bytes_to_image",
     "load_collection",
+    "milvus_call",
+    "run_in_milvus_executor",
+    "collection_call",
+    "search_call",
+    "collection_state_refresh_loop",
+    "invalidate_collection_state",
+    "check_face_quality",
+    "QUALITY_MESSAGES",
+    "FaceTracker",
+    "admit_image_bytes",
+    "read_upload_image",
+    "sniff_image_header",
+    "RequestSizeLimitMiddleware",
 ]
@@ -44,20 +44,113 @@ class FaceDetector:
         return [image_array[y : y + h, x : x + w] for (x, y, w, h) in faces]
 
 
-def detect_face(image):
+# Haarカスケード分類器（XMLの読み込みはコストが高いため一度だけ生成）
+_FACE_CASCADE = None
+
+
+def _get_face_cascade():
+    """共有のHaarカスケード分類器を返す"""
+    global _FACE_CASCADE
+    if _FACE_CASCADE is None:
+        _FACE_CASCADE = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+    return _FACE_CASCADE
+
+
+def parse_face_box(value):
+    """
+    クライアントから送信された顔領域ヒントを解析。
+
+    引数:
+        value: "x,y,w,h" 形式の文字列、4要素のシーケンス、またはNone
+
+    戻り値:
+        (x, y, w, h) の整数タプル、ヒントがない場合はNone
+
+    例外:
+        ValueError: 形式が不正な場合
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    try:
+        x, y, w, h = (int(round(float(v))) for v in value)
+    except (TypeError, ValueError) as e:
+        raise ValueError("face_boxは 'x,y,w,h' 形式である必要があります") from e
+    if w <= 0 or h <= 0:
+        raise ValueError("face_boxの幅と高さは正の値である必要があります")
+    return x, y, w, h
+
+
+def _expand_face_box(face_box, image_shape, padding):
+    """顔領域ヒントを余白付きで拡張し、画像範囲内にクリップした探索窓を返す"""
+    height, width = image_shape[:2]
+    x, y, w, h = face_box
+    pad_x = int(w * padding)
+    pad_y = int(h * padding)
+    x0 = max(0, x - pad_x)
+    y0 = max(0, y - pad_y)
+    x1 = min(width, x + w + pad_x)
+    y1 = min(height, y + h + pad_y)
+    if x1 - x0 < 30 or y1 - y0 < 30:
+        # 探索窓が最小検出サイズより小さい場合はヒントを無視
+        return None
+    return x0, y0, x1, y1
+
+
+def detect_face_boxes(image, face_box=None):
+    """
+    OpenCV Haarカスケードを使用して画像内の顔の矩形を検出。
+
+    face_boxが指定された場合は、その周囲に余白を付けた探索窓の中だけを
+    検出し、何も見つからない場合は画像全体で再検出します。
+
+    引数:
+        image: 画像を表すnumpy配列
+        face_box: クライアント側で検出された顔の矩形 (x, y, w, h)（オプション）
+
+    戻り値:
+        画像全体の座標系での (x, y, w, h) のリスト
+    """
+    face_cascade = _get_face_cascade()
+    gray_image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+    if face_box is not None:
+        window = _expand_face_box(face_box, image.shape, _CONFIG_.FACE_ROI_PADDING)
+        if window is not None:
+            x0, y0, x1, y1 = window
+            faces = face_cascade.detectMultiScale(
+                gray_image[y0:y1, x0:x1],
+                scaleFactor=1.1,
+                minNeighbors=5,
+                minSize=(30, 30),
+            )
+            if len(faces) > 0:
+                return [(x + x0, y + y0, w, h) for (x, y, w, h) in faces]
+
+    # ヒントがない、またはヒント領域で見つからない場合は全体を検出
+    faces = face_cascade.detectMultiScale(
+        gray_image,
+        scaleFactor=1.1,
+        minNeighbors=5,
+        minSize=(30, 30),
+    )
+    return [tuple(face) for face in faces]
+
+
+def detect_face(image, face_box=None):
     """
     OpenCV Haarカスケードを使用して画像内の顔を検出。
 
     引数:
         image: ファイルパス（文字列）または画像を表すnumpy配列のいずれか
+        face_box: クライアント側で検出された顔の矩形 (x, y, w, h)（オプション）
 
     戻り値:
         検出された顔を表すnumpy配列のリスト、または顔が見つからない場合は空リスト
     """
-    face_cascade = cv2.CascadeClassifier(
-        cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-    )
-
     # 異なる入力タイプを処理
     if isinstance(image, str):
         # 画像がファイルパスの場合
@@ -71,13 +164,7 @@ def detect_face(image):
     if image is None:
         return []
 
-    gray_image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-    faces = face_cascade.detectMultiScale(
-        gray_image,
-        scaleFactor=1.1,
-        minNeighbors=5,
-        minSize=(30, 30),
-    )
+    faces = detect_face_boxes(image, face_box)
 
     # 切り取られた顔画像を返す
     return [image[y : y + h, x : x + w] for (x, y, w, h) in faces]
@@ -116,6 +203,22 @@ def image_to_base64(image):
     return base64_string
 
 
+def bytes_to_image(image_bytes: bytes):
+    """
+    エンコードされた画像バイトを画像（numpy配列）にデコード
+
+    引数:
+        image_bytes: JPEGやPNGなどでエンコードされた画像のバイト
+
+    戻り値:
+        デコードされた画像を表すnumpy配列、デコードできない場合はNone
+    """
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    if nparr.size == 0:
+        return None
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
 def base64_to_image(base64_string: str):
     """
     base64エンコードされた文字列を画像（numpy配列）に変換
@@ -215,6 +318,57 @@ def inference_onnx(session, img, to_array=True):
     return feat.reshape(-1, _CONFIG_.MODEL_EMB_DIM)
 
 
+def inference_batch_onnx(session, images):
+    """
+    ONNXモデルで複数の顔画像をまとめて推論する
+
+    モデルの入力のバッチ次元が固定されている場合は1枚ずつ推論します。
+
+    引数:
+        session: ONNXセッションオブジェクト
+        images: 顔画像（numpy配列）のリスト
+
+    戻り値:
+        (画像数, MODEL_EMB_DIM) の特徴行列
+    """
+    if len(images) == 0:
+        return np.zeros((0, _CONFIG_.MODEL_EMB_DIM), dtype=np.float32)
+
+    input_meta = session.get_inputs()[0]
+    if isinstance(input_meta.shape[0], int) and input_meta.shape[0] != len(images):
+        return np.concatenate([inference_onnx(session, img) for img in images])
+
+    input_tensor = np.concatenate([preprocess_image(img) for img in images])
+    output_name = session.get_outputs()[0].name
+    result = session.run([output_name], {input_meta.name: input_tensor})
+    return np.asarray(result[0]).reshape(-1, _CONFIG_.MODEL_EMB_DIM)
+
+
+def inference_batch_pytorch(net, images, device="cuda"):
+    """
+    PyTorchモデルで複数の顔画像をまとめて推論する
+
+    引数:
+        net: PyTorchモデル
+        images: 顔画像（numpy配列）のリスト
+        device: 推論に使用するデバイス
+
+    戻り値:
+        (画像数, MODEL_EMB_DIM) の特徴行列
+    """
+    if len(images) == 0:
+        return np.zeros((0, _CONFIG_.MODEL_EMB_DIM), dtype=np.float32)
+
+    batch = torch.from_numpy(np.concatenate([preprocess_image(img) for img in images]))
+    with torch.no_grad():
+        feat = net(batch.to(device), device)
+        return feat.cpu().numpy().reshape(-1, _CONFIG_.MODEL_EMB_DIM)
+
+
 inference = partial(inference_onnx, _MODEL_)
+inference_batch = partial(inference_batch_onnx, _MODEL_)
 if not _CONFIG_.MODEL_LOADER == "onnx":
     inference = partial(inference_pytorch, _MODEL_, device=_CONFIG_.MODEL_DEVICE)
+    inference_batch = partial(
+        inference_batch_pytorch, _MODEL_, device=_CONFIG_.MODEL_DEVICE
+    )
@@ -1,28 +1,351 @@
+"""
+Milvusへの非同期アクセスユーティリティモジュール。
+
+pymilvusの同期gRPC呼び出しを専用のI/Oスレッドプールで実行し、
+呼び出しごとのタイムアウトを設定することで、イベントループを停止させずに
+並行するリクエストのMilvus待ち時間を重ね合わせます。
+"""
+
 import asyncio
-from typing import Optional
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Optional
+
+import numpy as np
+
+from fastapi import HTTPException
+from loguru import logger
+from pymilvus.client.types import LoadState
 
-from ..db import get_milvus_client
+from ..core import _CONFIG_
+from ..db import get_milvus_pool, is_transient_milvus_error
 
 # 各コレクションのロックを格納する辞書
 _collection_locks = {}
 
+# ロード済みであることを確認したコレクションのキャッシュ
+_loaded_collections: Dict[str, bool] = {}
+
+# Milvusの「コレクションが未ロード」エラーコード
+_COLLECTION_NOT_LOADED_CODE = 101
+
+# ヘッジの待ち時間を計算する前に必要な検索レイテンシの件数
+_MIN_LATENCY_SAMPLES = 20
+
+# Milvus呼び出し専用のI/Oスレッドプール
+_MILVUS_EXECUTOR = ThreadPoolExecutor(
+    max_workers=_CONFIG_.MILVUS_IO_THREADS, thread_name_prefix="milvus-io"
+)
+
+
+async def run_in_milvus_executor(func, *args, **kwargs):
+    """
+    任意の同期関数をMilvus用I/Oスレッドプールで実行。
+
+    引数:
+        func: 実行する同期関数
+        *args: 関数に渡す引数
+        **kwargs: 関数に渡すキーワード引数
+
+    戻り値:
+        関数の戻り値
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_MILVUS_EXECUTOR, partial(func, *args, **kwargs))
+
+
+async def milvus_call(method: str, *args, timeout: Optional[float] = None, **kwargs):
+    """
+    プールしたMilvusクライアントのメソッドをI/Oスレッドプールで非同期に呼び出す。
+
+    呼び出しは実行中の呼び出しが最も少ないクライアント（gRPCチャネル）に振り分けられます。
+
+    引数:
+        method: MilvusClientのメソッド名（"search"、"upsert"など）
+        *args: メソッドに渡す引数
+        timeout: 呼び出しのタイムアウト秒数（省略時はMILVUS_CALL_TIMEOUT）
+        **kwargs: メソッドに渡すキーワード引数
+
+    戻り値:
+        メソッドの戻り値
+
+    例外:
+        HTTPException: タイムアウトした場合（504）
+    """
+    if timeout is None:
+        timeout = _CONFIG_.MILVUS_CALL_TIMEOUT
+    try:
+        with get_milvus_pool().client() as client:
+            # gRPC側のタイムアウトに加え、スレッドプールの待ち時間も含めて打ち切る
+            return await asyncio.wait_for(
+                run_in_milvus_executor(
+                    getattr(client, method), *args, timeout=timeout, **kwargs
+                ),
+                timeout=timeout * 2,
+            )
+    except asyncio.TimeoutError as e:
+        raise HTTPException(
+            status_code=504, detail=f"Milvus {method} timed out"
+        ) from e
+
+
+def invalidate_collection_state(collection_name: Optional[str] = None):
+    """
+    コレクションのロード状態キャッシュを破棄。
+
+    引数:
+        collection_name: 破棄するコレクション名（省略時はすべて）
+    """
+    if collection_name is None:
+        _loaded_collections.clear()
+    else:
+        _loaded_collections.pop(collection_name, None)
+
+
+def is_collection_not_loaded_error(error: Exception) -> bool:
+    """Milvusの例外がコレクション未ロードによるものかどうか"""
+    if getattr(error, "code", None) == _COLLECTION_NOT_LOADED_CODE:
+        return True
+    return "not loaded" in str(error).lower()
+
+
+async def load_collection(collection_name: str, timeout: float = 60.0, **kwargs):
+    """
+    milvusコレクションをロード。
+
+    ロード済みであることが確認されたコレクションはキャッシュされ、
+    以降の呼び出しはMilvusへの問い合わせもロックも行わずに返ります。
+    """
+    if _loaded_collections.get(collection_name):
+        return True
 
-async def load_collection(
-    collection_name: str, timeout: Optional[float] = None, **kwargs
-):
-    """milvusコレクションをロード。"""
     # この特定のコレクションのロックを取得または作成
     if collection_name not in _collection_locks:
         _collection_locks[collection_name] = asyncio.Lock()
 
-    # スレッドセーフを確保するためにこのコレクションのロックを取得
+    # 同時に到着したリクエストがロードを重複して実行しないようにロックを取得
     async with _collection_locks[collection_name]:
-        milvus_client = get_milvus_client()
+        if _loaded_collections.get(collection_name):
+            return True
 
-        state = milvus_client.get_load_state(collection_name=collection_name)
-        if state != "3":
-            milvus_client.load_collection(
-                collection_name=collection_name, timeout=timeout, **kwargs
+        state = await milvus_call("get_load_state", collection_name=collection_name)
+        if state.get("state") != LoadState.Loaded:
+            await milvus_call(
+                "load_collection",
+                collection_name=collection_name,
+                timeout=timeout,
+                **kwargs,
             )
+        _loaded_collections[collection_name] = True
     # 成功した完了を示すためにTrueを返す
     return True
+
+
+async def collection_call(collection_name: str, method: str, **kwargs):
+    """
+    ロード済みのコレクションに対してMilvusのメソッドを呼び出す。
+
+    呼び出しが失敗した場合はロード状態のキャッシュを破棄し、
+    コレクション未ロードのエラーであれば1度だけロードして再試行します。
+
+    引数:
+        collection_name: 対象のコレクション名
+        method: MilvusClientのメソッド名
+        **kwargs: メソッドに渡すキーワード引数
+
+    戻り値:
+        メソッドの戻り値
+    """
+    await load_collection(collection_name)
+    try:
+        return await milvus_call(method, collection_name=collection_name, **kwargs)
+    except Exception as e:
+        invalidate_collection_state(collection_name)
+        if not is_collection_not_loaded_error(e):
+            raise
+    await load_collection(collection_name)
+    return await milvus_call(method, collection_name=collection_name, **kwargs)
+
+
+class LatencyTracker:
+    """直近の呼び出しのレイテンシを保持し、パーセンタイルを返す"""
+
+    def __init__(self, size: int = 1024):
+        self._samples = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        """レイテンシ（秒）を記録"""
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """レイテンシのパーセンタイル（秒、件数が少ない場合はNone）"""
+        if len(self._samples) < _MIN_LATENCY_SAMPLES:
+            return None
+        return float(np.percentile(self._samples, q))
+
+
+class HedgeBudget:
+    """
+    ヘッジを検索件数の一定割合以下に抑えるトークンバケット。
+
+    検索ごとに ratio 個のトークンを貯め、ヘッジごとに1個消費します。
+    Milvus全体が遅い場合にすべての検索がヘッジされて負荷が倍になるのを防ぎます。
+    """
+
+    def __init__(self, ratio: float, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = 0.0
+
+    def record_request(self):
+        """検索を1件記録"""
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        """ヘッジを送れる場合はトークンを1個消費してTrueを返す"""
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+# 検索のレイテンシ（ヘッジの待ち時間の計算に使用）
+SEARCH_LATENCY = LatencyTracker()
+
+# ヘッジの予算（イベントループのスレッドからのみ使用）
+HEDGE_BUDGET = HedgeBudget(_CONFIG_.MILVUS_SEARCH_HEDGE_BUDGET)
+
+
+async def _timed_search(collection_name: str, timeout: float, kwargs: dict):
+    """検索を1回実行し、成功した場合はレイテンシを記録"""
+    start = time.monotonic()
+    result = await collection_call(
+        collection_name, "search", timeout=timeout, **kwargs
+    )
+    SEARCH_LATENCY.record(time.monotonic() - start)
+    return result
+
+
+async def _hedged_search(collection_name: str, timeout: float, kwargs: dict):
+    """
+    検索を実行し、直近のレイテンシのパーセンタイルを過ぎても応答がなければ
+    同じ検索をもう1つ送り、先に成功した結果を返す。
+
+    ヘッジは実行中の呼び出しが少ないクライアントに振り分けられるため、
+    最初の検索とは別のgRPCチャネルで送られます。ヘッジの数は
+    MILVUS_SEARCH_HEDGE_BUDGET の割合までに抑えます。
+    """
+    HEDGE_BUDGET.record_request()
+    first = asyncio.ensure_future(_timed_search(collection_name, timeout, kwargs))
+    delay = SEARCH_LATENCY.percentile(_CONFIG_.MILVUS_SEARCH_HEDGE_PERCENTILE)
+    if not _CONFIG_.MILVUS_SEARCH_HEDGE or delay is None:
+        return await first
+    delay = max(delay, _CONFIG_.MILVUS_SEARCH_HEDGE_MIN_DELAY_MS / 1000)
+    if delay >= timeout:
+        return await first
+
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done or not HEDGE_BUDGET.try_acquire():
+        return await first
+    hedge = asyncio.ensure_future(
+        _timed_search(collection_name, timeout - delay, kwargs)
+    )
+    pending = {first, hedge}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # 遅れた方の結果は使わない（スレッドで実行中の呼び出しは完了まで続く）
+        for task in pending:
+            task.cancel()
+
+
+async def search_call(collection_name: str, **kwargs):
+    """
+    締め切り・再試行・ヘッジ付きでコレクションを検索。
+
+    検索全体を MILVUS_SEARCH_DEADLINE 秒で打ち切り、その範囲内でタイムアウトまたは
+    接続エラーになった検索を MILVUS_SEARCH_RETRIES 回まで、揺らぎを加えた
+    指数バックオフで再試行します（パラメータの誤りなどはそのまま送出）。
+    pymilvusはgRPCのDEADLINE_EXCEEDEDを再試行せずにgrpc.RpcErrorのまま送出し、
+    UNAVAILABLEは内部の再試行を使い切ると MilvusException として送出するため、
+    どちらもステータスコードで判定します。
+
+    引数:
+        collection_name: 対象のコレクション名
+        **kwargs: MilvusClient.search に渡すキーワード引数
+
+    戻り値:
+        検索結果
+
+    例外:
+        HTTPException: 締め切りまでに検索できなかった場合（504）
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _CONFIG_.MILVUS_SEARCH_DEADLINE
+    attempt = 0
+    while True:
+        remaining = deadline - loop.time()
+        timeout = min(_CONFIG_.MILVUS_CALL_TIMEOUT, remaining)
+        try:
+            return await _hedged_search(collection_name, timeout, kwargs)
+        except HTTPException as e:
+            if e.status_code != 504:
+                raise
+            error = e
+        except Exception as e:
+            if not is_transient_milvus_error(e):
+                raise
+            error = e
+        attempt += 1
+        backoff = (
+            _CONFIG_.MILVUS_SEARCH_RETRY_BACKOFF_MS
+            / 1000
+            * 2 ** (attempt - 1)
+            * random.uniform(0.5, 1.5)
+        )
+        if (
+            attempt > _CONFIG_.MILVUS_SEARCH_RETRIES
+            or deadline - loop.time() <= backoff
+        ):
+            if isinstance(error, HTTPException):
+                raise error
+            raise HTTPException(
+                status_code=504, detail="Milvus search did not complete in time"
+            ) from error
+        logger.warning(
+            f"コレクション {collection_name} の検索を再試行します "
+            f"({attempt}/{_CONFIG_.MILVUS_SEARCH_RETRIES}): {error}"
+        )
+        await asyncio.sleep(backoff)
+
+
+async def collection_state_refresh_loop():
+    """キャッシュされたコレクションのロード状態を定期的に確認するバックグラウンドタスク"""
+    interval = _CONFIG_.MILVUS_LOAD_STATE_REFRESH_INTERVAL
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        for collection_name in list(_loaded_collections):
+            try:
+                state = await milvus_call(
+                    "get_load_state", collection_name=collection_name
+                )
+                if state.get("state") != LoadState.Loaded:
+                    invalidate_collection_state(collection_name)
+                    await load_collection(collection_name)
+            except Exception as e:
+                invalidate_collection_state(collection_name)
+                logger.error(f"コレクション {collection_name} の状態確認に失敗しました: {e}")
@@ -0,0 +1,84 @@
+"""
+埋め込み前に顔画像の品質を判定するユーティリティモジュール。
+
+ぼやけ・小さすぎる顔・露出不良・極端な縦横比の切り取り画像を、
+推論やベクトル検索の前に安価に除外するための判定を提供します。
+"""
+
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from ..core import _CONFIG_
+
+# 品質判定の理由コード
+FACE_TOO_SMALL = "FACE_TOO_SMALL"
+FACE_BAD_ASPECT_RATIO = "FACE_BAD_ASPECT_RATIO"
+FACE_TOO_DARK = "FACE_TOO_DARK"
+FACE_TOO_BRIGHT = "FACE_TOO_BRIGHT"
+FACE_LOW_CONTRAST = "FACE_LOW_CONTRAST"
+FACE_BLURRY = "FACE_BLURRY"
+
+QUALITY_MESSAGES = {
+    FACE_TOO_SMALL: "Face is too small, please move closer to the camera",
+    FACE_BAD_ASPECT_RATIO: "Face region has an unexpected shape",
+    FACE_TOO_DARK: "Image is too dark",
+    FACE_TOO_BRIGHT: "Image is too bright",
+    FACE_LOW_CONTRAST: "Image contrast is too low",
+    FACE_BLURRY: "Image is too blurry, please hold still",
+}
+
+# 判定用に縮小する一辺のサイズ（推論入力と同じ112px）
+_QUALITY_SIZE = 112
+
+
+def check_face_quality(face_img: np.ndarray) -> Optional[str]:
+    """
+    切り取られた顔画像が埋め込みに十分な品質か判定。
+
+    判定は固定サイズに縮小したグレースケール画像で行うため、
+    入力サイズによらず推論よりはるかに小さいコストで完了します。
+
+    引数:
+        face_img: 切り取られた顔画像（BGRのnumpy配列）
+
+    戻り値:
+        品質が不十分な場合は理由コード、問題がない場合はNone
+    """
+    if not _CONFIG_.FACE_QUALITY_ENABLED:
+        return None
+
+    height, width = face_img.shape[:2]
+    if min(height, width) < _CONFIG_.FACE_QUALITY_MIN_SIZE:
+        return FACE_TOO_SMALL
+
+    aspect = width / height
+    if not (
+        _CONFIG_.FACE_QUALITY_MIN_ASPECT <= aspect <= _CONFIG_.FACE_QUALITY_MAX_ASPECT
+    ):
+        return FACE_BAD_ASPECT_RATIO
+
+    gray = face_img
+    if face_img.ndim == 3:
+        gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    gray = cv2.resize(
+        gray, (_QUALITY_SIZE, _QUALITY_SIZE), interpolation=cv2.INTER_AREA
+    )
+
+    # 明るさとコントラスト（平均と標準偏差）
+    mean, stddev = cv2.meanStdDev(gray)
+    brightness = float(mean[0][0])
+    if brightness < _CONFIG_.FACE_QUALITY_MIN_BRIGHTNESS:
+        return FACE_TOO_DARK
+    if brightness > _CONFIG_.FACE_QUALITY_MAX_BRIGHTNESS:
+        return FACE_TOO_BRIGHT
+    if float(stddev[0][0]) < _CONFIG_.FACE_QUALITY_MIN_CONTRAST:
+        return FACE_LOW_CONTRAST
+
+    # ラプラシアンの分散によるぼやけ判定
+    _, lap_stddev = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_64F))
+    if float(lap_stddev[0][0]) ** 2 < _CONFIG_.FACE_QUALITY_MIN_SHARPNESS:
+        return FACE_BLURRY
+
+    return None
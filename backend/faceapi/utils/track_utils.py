@@ -0,0 +1,111 @@
+"""
+連続フレーム間で顔を追跡するユーティリティモジュール。
+
+1つのWebSocket接続から届く連続フレームに対して、前回の顔の矩形を
+テンプレートマッチングで追跡し、顔検出を省略します。
+識別結果は再利用せず、追跡中のフレームでも毎回埋め込みと検索を行います。
+"""
+
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ..core import _CONFIG_
+
+Box = Tuple[int, int, int, int]
+
+
+class FaceTracker:
+    """
+    1つのセッションの顔の追跡状態を保持するクラス。
+
+    最後に検出した顔の矩形とテンプレートを保持し、
+    追跡が失われるか更新間隔を過ぎるまで顔検出を省略します。
+    """
+
+    def __init__(self):
+        self.box: Optional[Box] = None
+        self.template: Optional[np.ndarray] = None
+        self.frames_since_refresh = 0
+        self.refreshed_at = 0.0
+        self.last_seen = time.monotonic()
+
+    def reset(self):
+        """追跡状態を破棄"""
+        self.box = None
+        self.template = None
+        self.frames_since_refresh = 0
+
+    def needs_refresh(self) -> bool:
+        """完全な顔検出を再実行する必要があるかどうか"""
+        if self.box is None or self.template is None:
+            return True
+        if self.frames_since_refresh >= _CONFIG_.FACE_TRACK_REFRESH_FRAMES:
+            return True
+        return (
+            time.monotonic() - self.refreshed_at >= _CONFIG_.FACE_TRACK_REFRESH_SECONDS
+        )
+
+    def update(self, image: np.ndarray, box: Box):
+        """
+        顔検出で得た矩形で追跡を開始し直す。
+
+        更新間隔の計測をリセットするため、顔検出を実行したフレームでのみ呼び出します。
+        追跡したフレームの矩形とテンプレートは track() が更新します。
+
+        引数:
+            image: 顔検出と識別を行った画像
+            box: 識別に使用した顔の矩形 (x, y, w, h)
+        """
+        self.box = tuple(int(v) for v in box)
+        self.template = self._crop_gray(image, self.box)
+        self.frames_since_refresh = 0
+        self.refreshed_at = time.monotonic()
+        self.last_seen = self.refreshed_at
+
+    def track(self, image: np.ndarray) -> Optional[Box]:
+        """
+        前回の矩形の周辺でテンプレートマッチングを行い、顔の新しい位置を推定。
+
+        引数:
+            image: 新しいフレーム
+
+        戻り値:
+            追跡に成功した場合は新しい矩形 (x, y, w, h)、失敗した場合はNone
+        """
+        self.last_seen = time.monotonic()
+        if self.box is None or self.template is None:
+            return None
+
+        height, width = image.shape[:2]
+        x, y, w, h = self.box
+        pad_x = int(w * _CONFIG_.FACE_TRACK_SEARCH_PADDING)
+        pad_y = int(h * _CONFIG_.FACE_TRACK_SEARCH_PADDING)
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(width, x + w + pad_x), min(height, y + h + pad_y)
+        if x1 - x0 < w or y1 - y0 < h:
+            self.reset()
+            return None
+
+        window = self._crop_gray(image, (x0, y0, x1 - x0, y1 - y0))
+        scores = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, max_score, _, (dx, dy) = cv2.minMaxLoc(scores)
+        if max_score < _CONFIG_.FACE_TRACK_MIN_SCORE:
+            self.reset()
+            return None
+
+        self.box = (x0 + dx, y0 + dy, w, h)
+        # 徐々に変化する見た目に追従するためテンプレートを更新
+        self.template = self._crop_gray(image, self.box)
+        self.frames_since_refresh += 1
+        return self.box
+
+    @staticmethod
+    def _crop_gray(image: np.ndarray, box: Box) -> np.ndarray:
+        x, y, w, h = box
+        crop = image[y : y + h, x : x + w]
+        if crop.ndim == 3:
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        return crop
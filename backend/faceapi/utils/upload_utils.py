@@ -0,0 +1,269 @@
+"""
+アップロード画像の受け入れ判定ユーティリティモジュール。
+
+アップロードを設定されたバイト数まで分割して読み込み、画像ヘッダーから
+形式と画素数を判定してから、コピーなしでデコーダーに渡します。
+巨大なファイルや画素数を偽った画像をデコード前に拒否するために使用します。
+マルチパートの解析（一時ファイルへの書き出し）より前の上限は
+RequestSizeLimitMiddleware で適用します。
+"""
+
+import re
+import struct
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+from ..core import _CONFIG_
+
+# アップロードを読み込む単位
+_READ_CHUNK_SIZE = 64 * 1024
+
+# マルチパートの境界やフォーム項目のために画像の上限に加えて許容するバイト数
+_MULTIPART_OVERHEAD = 64 * 1024
+
+# 一括登録のアーカイブをアップロードするパス（BULK_ENROLL_MAX_BYTES を適用）
+_ARCHIVE_UPLOAD_PATH = re.compile(r"/face/bulk/?$")
+
+# 寸法を持つJPEGのSOFマーカー
+_JPEG_SOF_MARKERS = {
+    0xC0,
+    0xC1,
+    0xC2,
+    0xC3,
+    0xC5,
+    0xC6,
+    0xC7,
+    0xC9,
+    0xCA,
+    0xCB,
+    0xCD,
+    0xCE,
+    0xCF,
+}
+
+
+def _jpeg_size(data) -> Optional[Tuple[int, int]]:
+    """JPEGのSOFセグメントから (幅, 高さ) を取得"""
+    i = 2
+    length = len(data)
+    while i + 4 <= length:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # フィルバイトを読み飛ばす
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            # 長さを持たないスタンドアロンマーカー
+            i += 2
+            continue
+        if marker == 0xD9:
+            return None
+        segment_length = struct.unpack(">H", bytes(data[i + 2 : i + 4]))[0]
+        if marker in _JPEG_SOF_MARKERS:
+            if i + 9 > length:
+                return None
+            height, width = struct.unpack(">HH", bytes(data[i + 5 : i + 9]))
+            return width, height
+        i += 2 + segment_length
+    return None
+
+
+def _png_size(data) -> Optional[Tuple[int, int]]:
+    """PNGのIHDRチャンクから (幅, 高さ) を取得"""
+    if len(data) < 24 or bytes(data[12:16]) != b"IHDR":
+        return None
+    return struct.unpack(">II", bytes(data[16:24]))
+
+
+def _webp_size(data) -> Optional[Tuple[int, int]]:
+    """WebPのVP8/VP8L/VP8Xチャンクから (幅, 高さ) を取得"""
+    if len(data) < 30:
+        return None
+    chunk = bytes(data[12:16])
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", bytes(data[26:30]))
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        bits = struct.unpack("<I", bytes(data[21:25]))[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(bytes(data[24:27]), "little") + 1
+        height = int.from_bytes(bytes(data[27:30]), "little") + 1
+        return width, height
+    return None
+
+
+def _bmp_size(data) -> Optional[Tuple[int, int]]:
+    """BMPのDIBヘッダーから (幅, 高さ) を取得"""
+    if len(data) < 26:
+        return None
+    width, height = struct.unpack("<ii", bytes(data[18:26]))
+    return abs(width), abs(height)
+
+
+def sniff_image_header(data) -> Tuple[Optional[str], Optional[Tuple[int, int]]]:
+    """
+    画像ヘッダーから形式と寸法を判定。
+
+    引数:
+        data: 画像のバイト列（bytes、bytearray、memoryview）
+
+    戻り値:
+        (形式名, (幅, 高さ))。判定できない場合はそれぞれNone
+    """
+    head = bytes(data[:12])
+    if head.startswith(b"\xff\xd8"):
+        return "jpeg", _jpeg_size(data)
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png", _png_size(data)
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "webp", _webp_size(data)
+    if head.startswith(b"BM"):
+        return "bmp", _bmp_size(data)
+    return None, None
+
+
+def admit_image_bytes(data) -> np.ndarray:
+    """
+    画像のバイト列を検査し、受け入れ可能な場合のみデコード。
+
+    引数:
+        data: 画像のバイト列（bytes、bytearray、memoryview）
+
+    戻り値:
+        デコードされた画像（BGRのnumpy配列）
+
+    例外:
+        HTTPException: サイズ超過（413）、未対応の形式（415）、デコード失敗（400）
+    """
+    if len(data) > _CONFIG_.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Image file is too large")
+
+    image_format, size = sniff_image_header(data)
+    if image_format is None or image_format not in _CONFIG_.UPLOAD_ALLOWED_FORMATS:
+        raise HTTPException(status_code=415, detail="Unsupported image format")
+    if size is None:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+
+    width, height = size
+    if (
+        width == 0
+        or height == 0
+        or max(width, height) > _CONFIG_.UPLOAD_MAX_SIDE
+        or width * height > _CONFIG_.UPLOAD_MAX_PIXELS
+    ):
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image dimensions {width}x{height} exceed the allowed limit",
+        )
+
+    # バッファをコピーせずにnumpy配列として参照
+    nparr = np.frombuffer(data, np.uint8)
+    # pylint: disable=no-member
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    # pylint: enable=no-member
+
+    if img is None:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    return img
+
+
+async def read_upload_bytes(image: UploadFile) -> bytearray:
+    """
+    アップロードを設定された上限まで分割して読み込む。
+
+    リクエスト全体の上限は RequestSizeLimitMiddleware で解析前に適用済みのため、
+    ここでは画像ファイル単体の上限を検査します。
+
+    引数:
+        image: アップロードされた画像ファイル
+
+    戻り値:
+        読み込まれた画像のバイト列
+
+    例外:
+        HTTPException: 上限を超えた場合（413）
+    """
+    max_bytes = _CONFIG_.UPLOAD_MAX_BYTES
+    declared_size = getattr(image, "size", None)
+    if declared_size is not None and declared_size > max_bytes:
+        raise HTTPException(status_code=413, detail="Image file is too large")
+
+    buffer = bytearray()
+    while True:
+        chunk = await image.read(_READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise HTTPException(status_code=413, detail="Image file is too large")
+    return buffer
+
+
+class RequestSizeLimitMiddleware:
+    """
+    リクエストボディのサイズをマルチパートの解析前に制限するASGIミドルウェア。
+
+    Content-Length が上限を超える場合はボディを読まずに413を返し、
+    Content-Length のないチャンク転送では受信したバイト数が上限を超えた時点で
+    413エラーを送出して読み込みを打ち切ります。上限は画像の UPLOAD_MAX_BYTES
+    （一括登録のアーカイブは BULK_ENROLL_MAX_BYTES）にフォーム項目の分を加えたものです。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _limit(path: str) -> int:
+        """パスに対応するリクエストボディの上限"""
+        if _ARCHIVE_UPLOAD_PATH.search(path):
+            return _CONFIG_.BULK_ENROLL_MAX_BYTES + _MULTIPART_OVERHEAD
+        return _CONFIG_.UPLOAD_MAX_BYTES + _MULTIPART_OVERHEAD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self._limit(scope["path"])
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(
+                {"detail": "Request body is too large"}, status_code=413
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(
+                        status_code=413, detail="Request body is too large"
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload_image(image: UploadFile) -> np.ndarray:
+    """
+    すべての画像エンドポイントで共有されるアップロード受け入れ処理。
+
+    引数:
+        image: アップロードされた画像ファイル
+
+    戻り値:
+        デコードされた画像（BGRのnumpy配列）
+    """
+    return admit_image_bytes(await read_upload_bytes(image))
@@ -0,0 +1,134 @@
+"""
+顔認識システムのベクトルストアモジュール。
+
+このモジュールは顔特徴の登録・削除・検索を行うVectorStoreインターフェースと、
+設定で選択されるバックエンド（Milvus、NumPy組み込み）を提供します。
+"""
+
+from ..core import _CONFIG_
+from .base import SearchHit, VectorStore, normalize_rows
+
+SUPPORTED_VECTOR_STORES = ["milvus", "numpy"]
+
+# グローバルベクトルストアインスタンス
+VECTOR_STORE = None
+
+
+def create_vector_store(backend: str = None) -> VectorStore:
+    """
+    設定に応じたベクトルストアを生成。
+
+    引数:
+        backend: バックエンド名（省略時はVECTOR_STORE_BACKEND）
+
+    戻り値:
+        VectorStoreインスタンス
+    """
+    backend = (backend or _CONFIG_.VECTOR_STORE_BACKEND).lower()
+    store = _create_backend_store(backend)
+    if _CONFIG_.EMB_PROJECTION_ENABLED:
+        store = _create_projected_store(store, backend)
+
+    # 複数テンプレートからプロトタイプを集約して登録
+    if _CONFIG_.FACE_TEMPLATES_ENABLED:
+        from .templates import (
+            MilvusTemplateStore,
+            NumpyTemplateStore,
+            TemplateVectorStore,
+        )
+
+        templates = (
+            MilvusTemplateStore() if backend == "milvus" else NumpyTemplateStore()
+        )
+        store = TemplateVectorStore(store, templates)
+
+    # 同時に届いた登録をまとめて書き込む
+    if _CONFIG_.WRITE_QUEUE_ENABLED:
+        from .write_queue import WriteQueueVectorStore
+
+        store = WriteQueueVectorStore(store)
+    return store
+
+
+def _create_projected_store(store: VectorStore, backend: str) -> VectorStore:
+    """射影した埋め込みを登録し、必要なら全次元で再ランキングするラッパーを生成"""
+    from .numpy_store import NumpyVectorStore
+    from .projected_store import ProjectedVectorStore
+    from .projection import get_projection
+
+    full_store = None
+    if _CONFIG_.EMB_PROJECTION_RERANK:
+        # 全次元の埋め込みはプロセスのローカルファイルに保存されるため、
+        # 複数のサーバーが共有するMilvusの検索結果とは整合しない
+        if backend != "numpy":
+            raise ValueError(
+                "EMB_PROJECTION_RERANKはVECTOR_STORE_BACKEND=numpyの場合のみ使用できます"
+            )
+        full_store = NumpyVectorStore(
+            _CONFIG_.EMB_PROJECTION_RERANK_PATH, dim=_CONFIG_.MODEL_EMB_DIM
+        )
+    return ProjectedVectorStore(store, get_projection(), full_store)
+
+
+def _create_backend_store(backend: str) -> VectorStore:
+    """バックエンド名に対応するベクトルストアを生成"""
+    if backend == "milvus":
+        if _CONFIG_.VECTOR_STORE_LOCAL_REPLICA:
+            from .replica_store import ReplicatedMilvusVectorStore
+
+            return ReplicatedMilvusVectorStore()
+
+        from .milvus_store import MilvusVectorStore
+
+        store = MilvusVectorStore()
+        if (
+            _CONFIG_.WRITE_QUEUE_ENABLED
+            and _CONFIG_.WRITE_QUEUE_READ_YOUR_WRITES_SECONDS > 0
+        ):
+            # 書き込んだ顔特徴（射影・集約後）を保持し、直後の検索に合成する。
+            # ローカル複製とNumPyのストアは自プロセスの書き込みがすぐに検索に反映される
+            from .write_queue import ReadYourWritesVectorStore
+
+            store = ReadYourWritesVectorStore(store)
+        return store
+    if backend == "numpy":
+        from .numpy_store import NumpyVectorStore
+
+        return NumpyVectorStore()
+    raise ValueError(
+        f"VECTOR_STORE_BACKENDは{SUPPORTED_VECTOR_STORES}のいずれかである必要があります"
+    )
+
+
+async def init_vector_store():
+    """グローバルベクトルストアを初期化"""
+    global VECTOR_STORE
+    VECTOR_STORE = create_vector_store()
+    await VECTOR_STORE.init()
+    return VECTOR_STORE
+
+
+async def close_vector_store():
+    """グローバルベクトルストアを終了"""
+    if VECTOR_STORE is not None:
+        await VECTOR_STORE.close()
+
+
+def get_vector_store() -> VectorStore:
+    """グローバルベクトルストアインスタンスを返す"""
+    if VECTOR_STORE is None:
+        raise RuntimeError(
+            "ベクトルストアが初期化されていません。まずinit_vector_store()を呼び出してください。"
+        )
+    return VECTOR_STORE
+
+
+__ALL__ = [
+    "VectorStore",
+    "SearchHit",
+    "normalize_rows",
+    "create_vector_store",
+    "init_vector_store",
+    "close_vector_store",
+    "get_vector_store",
+]
@@ -0,0 +1,252 @@
+"""
+顔特徴ベクトルストアの共通インターフェースモジュール。
+
+サービス層はこのインターフェースを通じて顔特徴の登録・削除・検索を行い、
+MilvusとNumPy（組み込み）のどちらのバックエンドでも同じように動作します。
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Coroutine, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# 検索結果の1件: {"user_id": int, "distance": float}
+# distanceはMilvusのCOSINEと同様に類似度（大きいほど近い）を表します
+SearchHit = Dict[str, float]
+
+# 顔特徴と共に保存するスカラー属性と既定値
+# site: 拠点・テナント（Milvusではパーティションキー）
+# is_active / is_admin: ユーザーの有効状態と権限（SQLのユーザー情報の非正規化）
+ATTRIBUTE_DEFAULTS: Dict[str, Any] = {"site": "", "is_active": True, "is_admin": False}
+
+
+class VectorStore(ABC):
+    """
+    顔特徴ベクトルストアの抽象基底クラス。
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def init(self):
+        """ストアを初期化（接続・コレクション作成・ファイルの読み込みなど）"""
+
+    async def close(self):
+        """ストアを終了"""
+
+    def background_jobs(self) -> List[Coroutine]:
+        """アプリケーションのライフスパン中に実行するバックグラウンドタスクを返す"""
+        return []
+
+    @abstractmethod
+    async def upsert(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]] = None,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        """
+        ユーザーIDごとの顔特徴を登録または置き換え。
+
+        引数:
+            ids: ユーザーIDのリスト
+            vectors: (len(ids), dim) の顔特徴行列
+            update_at: 更新時刻（エポックミリ秒）のリスト（省略時は現在時刻）
+            attributes: 行ごとのスカラー属性の辞書のリスト（省略時は既定値）
+
+        戻り値:
+            書き込まれたユーザーIDのリスト
+        """
+
+    async def replace(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]] = None,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        """
+        ユーザーの既存の顔特徴を破棄し、この埋め込みのみを登録。
+
+        1ユーザー1件のストアでは upsert と同じです。複数テンプレートのストアでは
+        新しい埋め込みを書き込んでから古いテンプレートを削除するため、
+        置き換えの途中でユーザーが検索対象から外れることはありません。
+
+        引数:
+            ids: ユーザーIDのリスト
+            vectors: (len(ids), dim) の顔特徴行列
+            update_at: 更新時刻（エポックミリ秒）のリスト（省略時は現在時刻）
+            attributes: 行ごとのスカラー属性の辞書のリスト（省略時は既定値）
+
+        戻り値:
+            書き込まれたユーザーIDのリスト
+        """
+        return await self.upsert(ids, vectors, update_at, attributes)
+
+    @abstractmethod
+    async def delete(self, ids: Sequence[int]) -> int:
+        """
+        ユーザーIDの顔特徴を削除。
+
+        引数:
+            ids: 削除するユーザーIDのリスト
+
+        戻り値:
+            削除要求した件数
+        """
+
+    @abstractmethod
+    async def update_attributes(self, ids: Sequence[int], attributes: Dict[str, Any]):
+        """
+        登録済みの顔特徴のスカラー属性を更新。
+
+        引数:
+            ids: 更新するユーザーIDのリスト
+            attributes: 設定する属性の辞書
+        """
+
+    @abstractmethod
+    async def search(
+        self,
+        vectors: np.ndarray,
+        limit: int = 1,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[SearchHit]]:
+        """
+        クエリごとに類似度の高い顔特徴を検索。
+
+        引数:
+            vectors: (クエリ数, dim) のクエリ行列
+            limit: クエリごとに返す最大件数
+            radius: 指定した場合、類似度がこの値より大きい結果のみを返す範囲検索
+            filters: 指定した場合、属性が一致する顔特徴のみを検索
+
+        戻り値:
+            クエリごとの検索結果のリスト（類似度の降順）
+        """
+
+    def search_cursor(
+        self,
+        vector: np.ndarray,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> "SearchCursor":
+        """
+        1件のクエリの検索結果をページ単位で取り出すカーソルを返す。
+
+        引数:
+            vector: (dim,) のクエリベクトル
+            radius: 指定した場合、類似度がこの値より大きい結果のみを返す
+            filters: 指定した場合、属性が一致する顔特徴のみを検索
+
+        戻り値:
+            SearchCursorインスタンス
+        """
+        return SearchCursor(self, vector, radius, filters)
+
+    def supported_filters(
+        self, filters: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        属性の条件のうち、このストアの検索で適用されるものを返す。
+
+        保存していない属性の条件を無視するストアでは、ストアの外で同じ条件を
+        適用する場合（ローカル複製や書き込み直後の顔特徴）に結果を揃えるため使用します。
+
+        引数:
+            filters: 一致させる属性の辞書
+
+        戻り値:
+            適用される条件のみの辞書
+        """
+        return filters
+
+    @abstractmethod
+    async def count(self) -> int:
+        """登録されている顔特徴の件数を返す"""
+
+
+class SearchCursor:
+    """
+    1件のクエリの検索結果を類似度の降順に少しずつ取り出すカーソル。
+
+    既定の実装は取り出し済みの件数に次のページの件数を加えて検索し直すため、
+    深いページほどコストが増えます。Milvusでは検索イテレータを使う実装に置き換えます。
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        vector: np.ndarray,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        self.store = store
+        self.vector = np.asarray(vector, dtype=np.float32)
+        self.radius = radius
+        self.filters = filters
+        self.offset = 0
+        self.exhausted = False
+
+    async def next(self, size: int) -> List[SearchHit]:
+        """
+        次のページの検索結果を取り出す。
+
+        引数:
+            size: ページの件数
+
+        戻り値:
+            検索結果のリスト（size件未満の場合は最後のページ）
+        """
+        if self.exhausted:
+            return []
+        hits = (
+            await self.store.search(
+                self.vector[None, :], self.offset + size, self.radius, self.filters
+            )
+        )[0]
+        page = hits[self.offset : self.offset + size]
+        self.offset += len(page)
+        self.exhausted = len(page) < size
+        return page
+
+    async def close(self):
+        """カーソルを閉じる"""
+
+
+def fill_attributes(
+    attributes: Optional[Sequence[Dict[str, Any]]], count: int
+) -> List[Dict[str, Any]]:
+    """
+    行ごとのスカラー属性を既定値で補完。
+
+    引数:
+        attributes: 行ごとの属性の辞書のリスト（Noneも可）
+        count: 行数
+
+    戻り値:
+        すべての属性を持つ辞書のリスト
+    """
+    if attributes is None:
+        attributes = [{}] * count
+    return [{**ATTRIBUTE_DEFAULTS, **(row or {})} for row in attributes]
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """
+    行ごとにL2正規化したfloat32行列を返す。
+
+    引数:
+        vectors: (N, dim) または (dim,) の配列
+
+    戻り値:
+        L2正規化された (N, dim) のfloat32行列
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
@@ -0,0 +1,187 @@
+"""
+顔特徴ベクトルの保存形式の変換モジュール。
+
+float32の埋め込みをMilvusのFLOAT16_VECTOR / BFLOAT16_VECTORのバイト列や、
+符号で2値化したBINARY_VECTORのコードに変換し、検索結果から復元します。
+"""
+
+from typing import List, Sequence
+
+import numpy as np
+
+# サポートする埋め込みの保存形式
+VECTOR_DTYPES = ["FLOAT", "FLOAT16", "BFLOAT16"]
+
+# 保存形式ごとの1次元あたりのバイト数
+VECTOR_DTYPE_BYTES = {"FLOAT": 4, "FLOAT16": 2, "BFLOAT16": 2}
+
+
+def to_bfloat16_bits(vectors) -> np.ndarray:
+    """
+    float32をbfloat16のビット列（uint16）に最近接偶数丸めで変換。
+
+    引数:
+        vectors: float32に変換可能な配列
+
+    戻り値:
+        同じ形状のuint16配列
+    """
+    bits = np.ascontiguousarray(vectors, dtype=np.float32).view(np.uint32)
+    rounding = ((bits >> 16) & 1) + 0x7FFF
+    return ((bits + rounding) >> 16).astype(np.uint16)
+
+
+def from_bfloat16_bits(bits) -> np.ndarray:
+    """bfloat16のビット列（uint16）をfloat32に変換"""
+    return (np.asarray(bits, dtype=np.uint16).astype(np.uint32) << 16).view(np.float32)
+
+
+def quantize(vectors, dtype: str) -> np.ndarray:
+    """
+    保存形式の精度に丸めたfloat32配列を返す（再現率の評価用）。
+
+    引数:
+        vectors: float32に変換可能な配列
+        dtype: 保存形式（FLOAT, FLOAT16, BFLOAT16）
+
+    戻り値:
+        保存形式で表現できる値に丸めたfloat32配列
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "FLOAT16":
+        return vectors.astype(np.float16).astype(np.float32)
+    if dtype == "BFLOAT16":
+        return from_bfloat16_bits(to_bfloat16_bits(vectors))
+    return vectors
+
+
+def encode_vectors(vectors, dtype: str) -> list:
+    """
+    埋め込みをMilvusの保存形式に合わせて変換。
+
+    引数:
+        vectors: (N, dim) の埋め込み行列
+        dtype: 保存形式（FLOAT, FLOAT16, BFLOAT16）
+
+    戻り値:
+        insert/upsert/searchに渡せる値のリスト
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "FLOAT16":
+        return [row.tobytes() for row in vectors.astype(np.float16)]
+    if dtype == "BFLOAT16":
+        return [row.tobytes() for row in to_bfloat16_bits(vectors)]
+    return vectors.tolist()
+
+
+def decode_vector(value, dtype: str) -> np.ndarray:
+    """
+    Milvusから取得した埋め込みをfloat32配列に復元。
+
+    pymilvusのバージョンによってバイト列、バイト列を1つ含むリスト、
+    数値のリストのいずれかで返されるため、すべての形式を受け付けます。
+
+    引数:
+        value: query/searchで取得したフィールドの値
+        dtype: 保存形式（FLOAT, FLOAT16, BFLOAT16）
+
+    戻り値:
+        (dim,) のfloat32配列
+    """
+    if (
+        isinstance(value, (list, tuple))
+        and len(value) == 1
+        and isinstance(value[0], (bytes, bytearray))
+    ):
+        value = value[0]
+    if isinstance(value, (bytes, bytearray)):
+        if dtype == "FLOAT16":
+            return np.frombuffer(value, dtype=np.float16).astype(np.float32)
+        if dtype == "BFLOAT16":
+            return from_bfloat16_bits(np.frombuffer(value, dtype=np.uint16))
+        return np.frombuffer(value, dtype=np.float32).copy()
+
+    array = np.asarray(value)
+    if dtype == "BFLOAT16" and array.dtype.kind in "iu":
+        # bfloat16型を持たないnumpyではビット列のまま返される
+        return from_bfloat16_bits(array)
+    return array.astype(np.float32)
+
+
+def binarize(vectors) -> np.ndarray:
+    """
+    埋め込みを符号で2値化し、8次元ずつ1バイトに詰めたコードを返す。
+
+    引数:
+        vectors: (N, dim) の埋め込み行列
+
+    戻り値:
+        (N, dim / 8) のuint8行列
+    """
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+def binary_codes(vectors) -> List[bytes]:
+    """BINARY_VECTORフィールドに渡すバイト列のリスト"""
+    return [row.tobytes() for row in binarize(vectors)]
+
+
+# 1バイトごとの立っているビット数
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hamming_distances(codes: np.ndarray, query_codes: np.ndarray) -> np.ndarray:
+    """
+    2値コード同士のハミング距離を計算。
+
+    引数:
+        codes: (N, bytes) のuint8コード行列
+        query_codes: (クエリ数, bytes) のuint8コード行列
+
+    戻り値:
+        (クエリ数, N) の距離行列
+    """
+    return np.stack(
+        [
+            _POPCOUNT[np.bitwise_xor(codes, query)].sum(axis=1, dtype=np.int32)
+            for query in query_codes
+        ]
+    )
+
+
+def rerank(
+    queries: np.ndarray,
+    candidates: Sequence[Sequence[int]],
+    vectors: Sequence[np.ndarray],
+    limit: int,
+    radius: float = None,
+):
+    """
+    候補をコサイン類似度で並べ替え、上位k件を返す。
+
+    引数:
+        queries: (クエリ数, dim) のL2正規化済みクエリ行列
+        candidates: クエリごとの候補ユーザーIDのリスト
+        vectors: クエリごとの候補の埋め込み行列
+        limit: クエリごとに返す最大件数
+        radius: 指定した場合、類似度がこの値より大きい結果のみを返す
+
+    戻り値:
+        クエリごとの {"user_id", "distance"} のリスト（類似度の降順）
+    """
+    results = []
+    for query, ids, matrix in zip(queries, candidates, vectors):
+        if len(ids) == 0:
+            results.append([])
+            continue
+        matrix = np.asarray(matrix, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        scores = matrix @ query / norms
+        hits = []
+        for row in np.argsort(-scores)[:limit]:
+            if radius is not None and scores[row] <= radius:
+                break
+            hits.append({"user_id": int(ids[row]), "distance": float(scores[row])})
+        results.append(hits)
+    return results
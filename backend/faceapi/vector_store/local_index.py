@@ -0,0 +1,247 @@
+"""
+プロセス内の厳密検索インデックスモジュール。
+
+L2正規化済み埋め込みの行列をブロック単位の行列積で検索し、
+ブロックごとに上位k件をマージすることで一時メモリを一定に抑えます。
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..core import _CONFIG_
+from .base import ATTRIBUTE_DEFAULTS, SearchHit, fill_attributes, normalize_rows
+
+# 無効な行がこの割合を超えたら行列を詰める
+_COMPACT_DELETED_RATIO = 0.25
+
+
+def new_attribute_columns(capacity: int) -> Dict[str, np.ndarray]:
+    """既定値で埋めたスカラー属性の列を作成"""
+    return {
+        name: np.full(capacity, default, dtype=object)
+        for name, default in ATTRIBUTE_DEFAULTS.items()
+    }
+
+
+def resize_attribute_columns(columns: Dict[str, np.ndarray], size: int, capacity: int):
+    """先頭 size 行を保ったまま属性の列の容量を変更"""
+    resized = new_attribute_columns(capacity)
+    for name, column in columns.items():
+        resized[name][:size] = column[:size]
+    return resized
+
+
+def attribute_mask(
+    columns: Dict[str, np.ndarray], size: int, filters: Optional[Dict[str, Any]]
+) -> Optional[np.ndarray]:
+    """
+    属性が一致する行のマスクを作成。
+
+    引数:
+        columns: 属性名と列の辞書
+        size: 有効な行数
+        filters: 一致させる属性の辞書（Noneの場合はマスクなし）
+
+    戻り値:
+        (size,) の真偽値配列、またはNone
+    """
+    if not filters:
+        return None
+    mask = np.ones(size, dtype=bool)
+    for name, value in filters.items():
+        if name in columns:
+            mask &= columns[name][:size] == value
+    return mask
+
+
+def blocked_top_k(
+    matrix: np.ndarray,
+    ids: np.ndarray,
+    queries: np.ndarray,
+    limit: int,
+    radius: Optional[float] = None,
+    block_size: int = None,
+    mask: Optional[np.ndarray] = None,
+) -> List[List[SearchHit]]:
+    """
+    ブロック単位の行列積でコサイン類似度の上位k件を求める。
+
+    引数:
+        matrix: (N, dim) のL2正規化済み埋め込み行列（memmapも可）
+        ids: 各行のユーザーID
+        queries: (クエリ数, dim) のL2正規化済みクエリ行列
+        limit: クエリごとに返す最大件数
+        radius: 指定した場合、類似度がこの値より大きい結果のみを返す
+        block_size: 1回の行列積で扱う行数（省略時はVECTOR_STORE_SEARCH_BLOCK_SIZE）
+        mask: 指定した場合、Trueの行のみを検索対象とする
+
+    戻り値:
+        クエリごとの検索結果のリスト（類似度の降順）
+    """
+    size = len(ids)
+    if size == 0 or limit <= 0:
+        return [[] for _ in range(len(queries))]
+
+    block_size = block_size or _CONFIG_.VECTOR_STORE_SEARCH_BLOCK_SIZE
+    k = min(limit, size)
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), k), dtype=np.int64)
+
+    for start in range(0, size, block_size):
+        block = np.asarray(matrix[start : start + block_size])
+        # (クエリ数, ブロック行数) の類似度
+        scores = queries @ block.T
+        if mask is not None:
+            scores[:, ~mask[start : start + block_size]] = -np.inf
+        block_k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, block_k - 1, axis=1)[:, :block_k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+
+        # 既存の上位k件とマージ
+        merged_scores = np.concatenate([best_scores, top_scores], axis=1)
+        merged_rows = np.concatenate([best_rows, top + start], axis=1)
+        keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+        best_rows = np.take_along_axis(merged_rows, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+    results = []
+    for scores, rows in zip(best_scores, best_rows):
+        hits = []
+        for score, row in zip(scores, rows):
+            if not np.isfinite(score) or (radius is not None and score <= radius):
+                break
+            hits.append({"user_id": int(ids[row]), "distance": float(score)})
+        results.append(hits)
+    return results
+
+
+class LocalIndex:
+    """
+    メモリ上に顔特徴を保持する厳密検索インデックス。
+
+    検索はスレッドで実行できます。行は一度割り当てたユーザーから変わらず、
+    削除は行を無効にするだけで、行列を詰める場合や拡張する場合は新しい配列を
+    作成するため、検索中のスレッドが取り出した行列とIDの対応は変わりません。
+    """
+
+    def __init__(self, dim: int = None):
+        self.dim = dim or _CONFIG_.INDEX_EMB_DIM
+        self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._live = np.zeros(0, dtype=bool)
+        self._rows: Dict[int, int] = {}
+        self._attributes = new_attribute_columns(0)
+        self._size = 0
+        # 検索スレッドが状態を取り出す間の変更を排他
+        self._mutex = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def ids(self) -> np.ndarray:
+        """登録されているユーザーIDの配列"""
+        with self._mutex:
+            return self._ids[: self._size][self._live[: self._size]]
+
+    def upsert(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ):
+        """ユーザーIDごとの顔特徴を登録または置き換え"""
+        vectors = normalize_rows(vectors)
+        attributes = fill_attributes(attributes, len(ids))
+        with self._mutex:
+            required = self._size + sum(
+                1 for user_id in set(ids) if int(user_id) not in self._rows
+            )
+            if required > len(self._vectors):
+                self._resize(max(required, len(self._vectors) * 2, 1024))
+
+            for user_id, vector, row_attributes in zip(ids, vectors, attributes):
+                user_id = int(user_id)
+                row = self._rows.get(user_id)
+                if row is None:
+                    row = self._size
+                    self._rows[user_id] = row
+                    self._ids[row] = user_id
+                    self._live[row] = True
+                    self._size += 1
+                self._vectors[row] = vector
+                for name, value in row_attributes.items():
+                    self._attributes[name][row] = value
+
+    def _resize(self, capacity: int, rows: Optional[np.ndarray] = None):
+        """
+        新しい配列に行をコピーして差し替える。
+
+        引数:
+            capacity: 新しい配列の行数
+            rows: コピーする行の番号（省略時は先頭 size 行）
+        """
+        if rows is None:
+            rows = np.arange(self._size)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[: len(rows)] = self._vectors[rows]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[: len(rows)] = self._ids[rows]
+        live = np.zeros(capacity, dtype=bool)
+        live[: len(rows)] = self._live[rows]
+        attributes = new_attribute_columns(capacity)
+        for name, column in attributes.items():
+            column[: len(rows)] = self._attributes[name][rows]
+        self._vectors, self._ids, self._live = vectors, ids, live
+        self._attributes = attributes
+        self._size = len(rows)
+
+    def update_attributes(self, ids: Sequence[int], attributes: Dict[str, Any]):
+        """登録済みの顔特徴のスカラー属性を更新"""
+        with self._mutex:
+            for user_id in ids:
+                row = self._rows.get(int(user_id))
+                if row is None:
+                    continue
+                for name, value in attributes.items():
+                    self._attributes[name][row] = value
+
+    def delete(self, ids: Sequence[int]):
+        """ユーザーIDの顔特徴を削除"""
+        with self._mutex:
+            for user_id in ids:
+                row = self._rows.pop(int(user_id), None)
+                if row is not None:
+                    # 検索中のスレッドが別のユーザーのIDで一致しないよう、行は移動しない
+                    self._live[row] = False
+            if self._size - len(self._rows) > self._size * _COMPACT_DELETED_RATIO:
+                rows = np.flatnonzero(self._live[: self._size])
+                self._resize(len(self._vectors), rows)
+                self._rows = {
+                    int(user_id): row
+                    for row, user_id in enumerate(self._ids[: self._size])
+                }
+
+    def search(
+        self,
+        vectors: np.ndarray,
+        limit: int = 1,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[SearchHit]]:
+        """クエリごとに類似度の高い顔特徴を検索（スレッドから呼び出し可能）"""
+        with self._mutex:
+            size = self._size
+            mask = self._live[:size].copy()
+            matched = attribute_mask(self._attributes, size, filters)
+            if matched is not None:
+                mask &= matched
+            matrix, ids = self._vectors[:size], self._ids[:size]
+        return blocked_top_k(
+            matrix, ids, normalize_rows(vectors), limit, radius, mask=mask
+        )
@@ -0,0 +1,315 @@
+"""
+Milvusを使用する顔特徴ベクトルストアのモジュール。
+"""
+
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..core import _CONFIG_
+from ..db import (
+    FACE_FEATURES_COLLECTION,
+    FEATURE_CODE_FIELD,
+    compaction_maintenance_loop,
+    feature_model_check_loop,
+    get_feature_storage,
+    get_milvus_client,
+    get_search_params,
+    index_auto_select_loop,
+    milvus_close,
+    milvus_init,
+    milvus_pool_health_loop,
+)
+from ..utils import (
+    collection_call,
+    collection_state_refresh_loop,
+    milvus_call,
+    run_in_milvus_executor,
+    search_call,
+)
+from .base import (
+    SearchCursor,
+    SearchHit,
+    VectorStore,
+    fill_attributes,
+    normalize_rows,
+)
+from .codec import binary_codes, decode_vector, encode_vectors, rerank
+
+
+class MilvusVectorStore(VectorStore):
+    """
+    Milvusの face_features コレクションを使用するベクトルストア。
+
+    埋め込みはコレクションの保存形式（FLOAT / FLOAT16 / BFLOAT16）に変換して書き込み、
+    2値コードを持つコレクションではハミング距離で候補を絞ってから
+    コサイン類似度で再ランキングします。
+    """
+
+    name = "milvus"
+
+    def __init__(self, collection_name: str = FACE_FEATURES_COLLECTION):
+        self.collection_name = collection_name
+
+    @staticmethod
+    def filter_expression(filters: Optional[Dict[str, Any]]) -> str:
+        """
+        属性の一致条件をMilvusのフィルタ式に変換。
+
+        コレクションに存在しない属性の条件は無視されます。
+
+        引数:
+            filters: 一致させる属性の辞書
+
+        戻り値:
+            フィルタ式（条件がない場合は空文字列）
+        """
+        attributes = get_feature_storage()["attributes"]
+        conditions = [
+            f"{name} == {json.dumps(value)}"
+            for name, value in (filters or {}).items()
+            if name in attributes
+        ]
+        return " and ".join(conditions)
+
+    def supported_filters(self, filters):
+        attributes = get_feature_storage()["attributes"]
+        return {
+            name: value for name, value in (filters or {}).items() if name in attributes
+        }
+
+    def _entities(self, ids, vectors, update_at, attributes) -> List[dict]:
+        """コレクションの保存形式に合わせたエンティティを生成"""
+        storage = get_feature_storage()
+        entities = [
+            {
+                "user_id": int(user_id),
+                "feature_vector": vector,
+                "update_at": int(timestamp),
+                **{name: row[name] for name in storage["attributes"]},
+            }
+            for user_id, vector, timestamp, row in zip(
+                ids,
+                encode_vectors(vectors, storage["dtype"]),
+                update_at,
+                fill_attributes(attributes, len(ids)),
+            )
+        ]
+        if storage["binary"]:
+            for entity, code in zip(entities, binary_codes(vectors)):
+                entity[FEATURE_CODE_FIELD] = code
+        return entities
+
+    async def init(self):
+        await milvus_init()
+
+    async def close(self):
+        milvus_close()
+
+    def background_jobs(self):
+        # 件数に応じたインデックスの自動選択、ロード状態キャッシュの更新、
+        # プールしたクライアントのヘルスチェック、コンパクションなどの保守、
+        # 再埋め込みによるモデルの切り替えの検知
+        return [
+            index_auto_select_loop(),
+            collection_state_refresh_loop(),
+            milvus_pool_health_loop(),
+            compaction_maintenance_loop(),
+            feature_model_check_loop(),
+        ]
+
+    async def upsert(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]] = None,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        if update_at is None:
+            update_at = [int(time.time() * 1000)] * len(ids)  # エポックからのミリ秒
+
+        entities = self._entities(ids, vectors, update_at, attributes)
+        await collection_call(self.collection_name, "upsert", data=entities)
+        return [int(user_id) for user_id in ids]
+
+    async def update_attributes(self, ids: Sequence[int], attributes: Dict[str, Any]):
+        storage = get_feature_storage()
+        attributes = {
+            name: value
+            for name, value in attributes.items()
+            if name in storage["attributes"]
+        }
+        if not attributes or not ids:
+            return
+
+        # 存在しない行の部分更新は挿入になり失敗するため、登録済みで値が変わる行のみ
+        rows = await collection_call(
+            self.collection_name,
+            "get",
+            ids=[int(user_id) for user_id in ids],
+            output_fields=["user_id"] + list(attributes),
+        )
+        rows = [
+            row
+            for row in rows or []
+            if any(row.get(name) != value for name, value in attributes.items())
+        ]
+        if not rows:
+            return
+
+        # 埋め込みは読み書きせず、属性と更新時刻だけを部分更新する
+        # （同時の再登録で書かれた新しい埋め込みを古い値で上書きしない）
+        # 更新時刻を進めてローカル複製の差分同期に変更を拾わせる
+        update_at = int(time.time() * 1000)  # エポックからのミリ秒
+        await collection_call(
+            self.collection_name,
+            "upsert",
+            data=[
+                {"user_id": int(row["user_id"]), "update_at": update_at, **attributes}
+                for row in rows
+            ],
+            partial_update=True,
+        )
+
+    async def delete(self, ids: Sequence[int]) -> int:
+        await collection_call(
+            self.collection_name,
+            "delete",
+            ids=[int(user_id) for user_id in ids],
+        )
+        return len(ids)
+
+    async def search(
+        self,
+        vectors: np.ndarray,
+        limit: int = 1,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[SearchHit]]:
+        storage = get_feature_storage()
+        queries = normalize_rows(vectors)
+        # パーティションキーの条件を含むフィルタでは該当するパーティションのみを検索
+        filter_expr = self.filter_expression(filters)
+        if storage["binary"]:
+            return await self._search_with_codes(
+                queries, limit, radius, storage["dtype"], filter_expr
+            )
+
+        search_params = get_search_params(radius=radius)
+        if radius is None:
+            # 上位k件検索では範囲検索の閾値を指定しない
+            search_params["params"].pop("radius")
+
+        search_results = await search_call(
+            self.collection_name,
+            data=encode_vectors(queries, storage["dtype"]),
+            anns_field="feature_vector",
+            limit=limit,
+            filter=filter_expr,
+            output_fields=["user_id"],
+            search_params=search_params,
+        )
+        return [
+            [
+                {"user_id": hit["entity"]["user_id"], "distance": hit["distance"]}
+                for hit in hits
+            ]
+            for hits in search_results
+        ]
+
+    async def _search_with_codes(
+        self,
+        queries: np.ndarray,
+        limit: int,
+        radius: Optional[float],
+        dtype: str,
+        filter_expr: str = "",
+    ) -> List[List[SearchHit]]:
+        """ハミング距離で候補を取得し、保存された埋め込みとのコサイン類似度で再ランキング"""
+        search_results = await search_call(
+            self.collection_name,
+            data=binary_codes(queries),
+            anns_field=FEATURE_CODE_FIELD,
+            limit=max(_CONFIG_.MILVUS_BINARY_CANDIDATES, limit),
+            filter=filter_expr,
+            output_fields=["user_id", "feature_vector"],
+            search_params={"metric_type": "HAMMING", "params": {}},
+        )
+        candidates = [
+            [hit["entity"]["user_id"] for hit in hits] for hits in search_results
+        ]
+        vectors = [
+            [decode_vector(hit["entity"]["feature_vector"], dtype) for hit in hits]
+            for hits in search_results
+        ]
+        return rerank(queries, candidates, vectors, limit, radius)
+
+    def search_cursor(
+        self,
+        vector: np.ndarray,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> SearchCursor:
+        return MilvusSearchCursor(self, vector, radius, filters)
+
+    async def count(self) -> int:
+        stats = await milvus_call(
+            "get_collection_stats", collection_name=self.collection_name
+        )
+        return int(stats.get("row_count", 0))
+
+
+class MilvusSearchCursor(SearchCursor):
+    """
+    Milvusの検索イテレータで検索結果をページ単位に取り出すカーソル。
+
+    limitを増やして検索し直す代わりに、サーバー側で前のページの結果を除外しながら
+    次のバッチを取得するため、深いページでもコストが増えません。
+    2値コードを持つコレクションでもベクトルフィールドのインデックスで検索します。
+    """
+
+    def __init__(self, store: MilvusVectorStore, *args, **kwargs):
+        super().__init__(store, *args, **kwargs)
+        self._iterator = None
+        self._buffer: List[SearchHit] = []
+
+    async def _open(self, batch_size: int):
+        """検索イテレータを作成"""
+        storage = get_feature_storage()
+        search_params = get_search_params(radius=self.radius)
+        if self.radius is None:
+            search_params["params"].pop("radius")
+        self._iterator = await run_in_milvus_executor(
+            get_milvus_client().search_iterator,
+            collection_name=self.store.collection_name,
+            data=encode_vectors(normalize_rows(self.vector), storage["dtype"]),
+            batch_size=batch_size,
+            filter=self.store.filter_expression(self.filters),
+            output_fields=["user_id"],
+            search_params=search_params,
+            anns_field="feature_vector",
+            timeout=_CONFIG_.MILVUS_CALL_TIMEOUT,
+        )
+
+    async def next(self, size: int) -> List[SearchHit]:
+        if self._iterator is None and not self.exhausted:
+            await self._open(size)
+        while len(self._buffer) < size and not self.exhausted:
+            batch = await run_in_milvus_executor(self._iterator.next)
+            if not batch:
+                self.exhausted = True
+                break
+            self._buffer.extend(
+                {"user_id": hit["entity"]["user_id"], "distance": hit["distance"]}
+                for hit in batch
+            )
+        page, self._buffer = self._buffer[:size], self._buffer[size:]
+        self.offset += len(page)
+        return page
+
+    async def close(self):
+        if self._iterator is not None:
+            await run_in_milvus_executor(self._iterator.close)
+            self._iterator = None
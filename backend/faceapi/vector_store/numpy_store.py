@@ -0,0 +1,466 @@
+"""
+NumPyのメモリマップ行列を使用する組み込み顔特徴ベクトルストアのモジュール。
+
+L2正規化した埋め込みをfloat32の .npy 行列としてメモリマップし、
+ユーザーIDと更新時刻の配列と共に保存します。検索は行列ベクトル積で行い、
+おおよそ100万件までの顔であれば外部サービスなしで運用できます。
+
+同じディレクトリを使う複数のワーカーの書き込みはファイルロックで直列化します。
+書き込みのたびにIDと属性の配列全体を新しい世代のファイルとして書き出し、
+meta.json の置き換えで確定するため（件数に比例）、登録が多い場合は
+WRITE_QUEUE_ENABLED で書き込みをまとめてください。
+
+行列の行は一度割り当てたユーザーから変わりません。削除は行を無効にするだけで、
+無効な行が増えた場合は詰めた行列を新しいファイルに書き出します。そのため、
+古い世代を読み込んだままのワーカーが検索しても、別のユーザーのIDで
+一致することはありません。
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from ..core import _CONFIG_
+from ..db.locks import FileLock
+from .base import (
+    ATTRIBUTE_DEFAULTS,
+    SearchHit,
+    VectorStore,
+    fill_attributes,
+    normalize_rows,
+)
+from .local_index import (
+    _COMPACT_DELETED_RATIO,
+    attribute_mask,
+    blocked_top_k,
+    new_attribute_columns,
+    resize_attribute_columns,
+)
+
+_INITIAL_CAPACITY = 1024
+
+# 行列をコピーする際の1回あたりの行数
+_COPY_BLOCK_ROWS = 65536
+
+_META_FILE = "meta.json"
+_LOCK_FILE = "store.lock"
+
+
+def _read_meta(path: Path) -> Optional[dict]:
+    """meta.json を読み込む（存在しない場合はNone）"""
+    try:
+        return json.loads((path / _META_FILE).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def _read_columns(path: Path, meta: dict) -> Dict[str, np.ndarray]:
+    """
+    meta.json が指す世代のIDと更新時刻、属性の配列を読み込む。
+
+    戻り値:
+        "ids"、"update_at"、"attr_<名前>" をキーとする配列の辞書（無効な行のIDは-1）
+    """
+    size = int(meta["size"])
+    if "rows" in meta:
+        with np.load(path / meta["rows"]) as data:
+            return {key: data[key][:size] for key in data.files}
+
+    # 世代を持たない以前の形式
+    columns = {
+        "ids": np.load(path / "ids.npy")[:size],
+        "update_at": np.load(path / "update_at.npy")[:size],
+    }
+    for name in ATTRIBUTE_DEFAULTS:
+        attribute_path = path / f"attr_{name}.npy"
+        if attribute_path.exists():
+            columns[f"attr_{name}"] = np.load(attribute_path)[:size]
+    return columns
+
+
+def load_numpy_store(
+    path: str,
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+    """
+    NumPyベクトルストアのディレクトリから有効な行を読み込む。
+
+    書き込み中のワーカーと排他するため、ロックファイルがある場合は共有ロックを
+    取得して読み込みます。同じ形式で書き出したスナップショットも読み込めます。
+
+    引数:
+        path: NumPyベクトルストア（またはスナップショット）のディレクトリ
+
+    戻り値:
+        (ユーザーIDの配列, (N, dim) の行列, 属性名と列の辞書)
+        削除された行がない場合、行列はmemmapのまま返します
+    """
+    path = Path(path)
+    lock = FileLock(str(path / _LOCK_FILE))
+    if (path / _LOCK_FILE).exists():
+        lock.acquire(shared=True)
+    try:
+        meta = _read_meta(path)
+        if meta is None:
+            raise FileNotFoundError(f"{path / _META_FILE} が見つかりません")
+        matrix = np.load(path / meta.get("matrix", "embeddings.npy"), mmap_mode="r")
+        matrix = matrix[: int(meta["size"])]
+        columns = _read_columns(path, meta)
+    finally:
+        lock.release()
+
+    ids = columns["ids"]
+    attributes = {
+        key[len("attr_") :]: value
+        for key, value in columns.items()
+        if key.startswith("attr_")
+    }
+    live = ids >= 0
+    if not live.all():
+        ids, matrix = ids[live], matrix[live]
+        attributes = {name: column[live] for name, column in attributes.items()}
+    return ids, matrix, attributes
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    プロセス内でメモリマップされたfloat32行列を検索するベクトルストア。
+
+    ディレクトリ構成:
+        embeddings-<世代>.npy: (capacity, dim) のL2正規化済み埋め込み行列
+        rows-<世代>.npz: 先頭 size 行に対応するユーザーID（無効な行は-1）、
+            更新時刻（エポックミリ秒）、スカラー属性
+        meta.json: 次元数、有効な行数、世代と使用する行列・配列のファイル名
+        store.lock: 書き込みを排他し、読み込みと共有するロックファイル
+    """
+
+    name = "numpy"
+
+    def __init__(self, path: str = None, dim: int = None):
+        self.path = Path(path or _CONFIG_.VECTOR_STORE_PATH)
+        self.dim = dim or _CONFIG_.INDEX_EMB_DIM
+        self._vectors: Optional[np.memmap] = None
+        self._matrix_name = None
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._update_at = np.zeros(0, dtype=np.int64)
+        self._live = np.zeros(0, dtype=bool)
+        self._rows: Dict[int, int] = {}
+        self._attributes = new_attribute_columns(0)
+        self._size = 0
+        self._generation = None
+        self._lock = FileLock(str(self.path / _LOCK_FILE))
+        # 同じプロセスのスレッド間で状態の読み込みと変更を排他
+        self._mutex = threading.Lock()
+
+    async def init(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._mutex, self._lock:
+            meta = _read_meta(self.path)
+            if meta is not None:
+                self._load(meta)
+            else:
+                self._allocate(_INITIAL_CAPACITY)
+                self._persist()
+        logger.info(
+            f"NumPyベクトルストアを読み込みました: {self.path} (rows={len(self._rows)})"
+        )
+
+    async def close(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+
+    def _load(self, meta: dict):
+        """meta.json が指す世代の行列とIDを読み込む"""
+        if meta["dim"] != self.dim:
+            raise RuntimeError(
+                f"ベクトルストアの次元数 {meta['dim']} が埋め込みの次元数 {self.dim} と一致しません"
+            )
+        columns = _read_columns(self.path, meta)
+        self._size = int(meta["size"])
+        self._matrix_name = meta.get("matrix", "embeddings.npy")
+        self._vectors = np.load(self.path / self._matrix_name, mmap_mode="r+")
+        self._ids = columns["ids"].astype(np.int64)
+        self._update_at = columns["update_at"].astype(np.int64)
+        self._live = self._ids >= 0
+        self._rows = {
+            int(user_id): row for row, user_id in enumerate(self._ids) if user_id >= 0
+        }
+        self._attributes = new_attribute_columns(self._size)
+        for name, column in self._attributes.items():
+            if f"attr_{name}" in columns:
+                column[:] = columns[f"attr_{name}"].tolist()
+        self._generation = int(meta.get("generation", 0))
+
+    def _maybe_reload(self, locked: bool = False):
+        """
+        他のプロセスがストアを更新した場合は読み込み直す。
+
+        引数:
+            locked: 書き込みのロックを保持しているかどうか（Falseの場合は
+                    共有ロックを取得して、書き込み途中の世代を読み込まないようにする）
+        """
+        meta = _read_meta(self.path)
+        if meta is None or int(meta.get("generation", 0)) == self._generation:
+            return
+        if locked:
+            self._load(meta)
+            return
+        lock = FileLock(str(self.path / _LOCK_FILE))
+        lock.acquire(shared=True)
+        try:
+            self._load(_read_meta(self.path))
+        finally:
+            lock.release()
+
+    def _allocate(self, capacity: int, rows: Optional[np.ndarray] = None):
+        """
+        容量を確保した次の世代の行列ファイルを作成し、既存の行をコピー。
+
+        引数:
+            capacity: 行列の行数
+            rows: コピーする行の番号（省略時は先頭 size 行をそのままコピー）
+        """
+        name = f"embeddings-{(self._generation or 0) + 1}.npy"
+        tmp_path = self.path / f"{name}.tmp"
+        vectors = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.float32, shape=(capacity, self.dim)
+        )
+        if self._vectors is not None:
+            if rows is None:
+                rows = np.arange(self._size)
+            for start in range(0, len(rows), _COPY_BLOCK_ROWS):
+                block = rows[start : start + _COPY_BLOCK_ROWS]
+                vectors[start : start + len(block)] = self._vectors[block]
+        vectors.flush()
+        del vectors
+        os.replace(tmp_path, self.path / name)
+        self._matrix_name = name
+        self._vectors = np.load(self.path / name, mmap_mode="r+")
+
+    def _compact(self):
+        """無効な行を取り除いた行列を次の世代として作成"""
+        rows = np.flatnonzero(self._live[: self._size])
+        self._allocate(len(self._vectors), rows)
+        self._ids = self._ids[rows]
+        self._update_at = self._update_at[rows]
+        self._live = np.ones(len(rows), dtype=bool)
+        attributes = new_attribute_columns(len(rows))
+        for name, column in attributes.items():
+            column[:] = self._attributes[name][rows]
+        self._attributes = attributes
+        self._rows = {int(user_id): row for row, user_id in enumerate(self._ids)}
+        self._size = len(rows)
+
+    def _persist(self):
+        """IDと更新時刻、属性を次の世代として書き出し、meta.json の置き換えで確定"""
+        self._vectors.flush()
+        generation = (self._generation or 0) + 1
+        size = self._size
+        columns = {
+            "ids": np.where(self._live[:size], self._ids[:size], -1),
+            "update_at": self._update_at[:size],
+        }
+        for name, column in self._attributes.items():
+            columns[f"attr_{name}"] = np.asarray(column[:size].tolist())
+        rows_name = f"rows-{generation}.npz"
+        tmp_rows = self.path / f"{rows_name}.tmp"
+        with open(tmp_rows, "wb") as f:
+            np.savez(f, **columns)
+        os.replace(tmp_rows, self.path / rows_name)
+
+        meta = {
+            "dim": self.dim,
+            "size": size,
+            "generation": generation,
+            "matrix": self._matrix_name,
+            "rows": rows_name,
+        }
+        tmp_meta = self.path / f"{_META_FILE}.tmp"
+        tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp_meta, self.path / _META_FILE)
+        self._generation = generation
+        self._remove_stale_files(meta)
+
+    def _remove_stale_files(self, meta: dict):
+        """確定した世代が参照しない行列・配列のファイルを削除（書き込みのロック中に使用）"""
+        keep = {meta["matrix"], meta["rows"], _META_FILE, _LOCK_FILE}
+        for file in self.path.iterdir():
+            name = file.name
+            stale = (
+                name.endswith(".tmp")
+                or (name.startswith("embeddings") and name.endswith(".npy"))
+                or (name.startswith("rows-") and name.endswith(".npz"))
+                or name in ("ids.npy", "update_at.npy")
+                or (name.startswith("attr_") and name.endswith(".npy"))
+            )
+            if stale and name not in keep:
+                file.unlink(missing_ok=True)
+
+    @contextmanager
+    def _writing(self):
+        """
+        他のプロセスの書き込みと排他し、最新の状態を読み込んでから変更を書き出す。
+
+        ロックはディスクからの読み込み、変更、書き出しの間保持します。
+        同じプロセスの検索スレッドとはプロセス内のロックで排他します。
+        確定前に行列へ書き込むのは、追加した行（確定済みの行数より後）か同じユーザーの行、
+        または新しい世代の行列ファイルのみのため、失敗した場合は確定済みの世代を
+        読み込み直すだけで元に戻ります。
+        """
+        with self._mutex, self._lock:
+            self._maybe_reload(locked=True)
+            try:
+                yield
+                self._persist()
+            except BaseException:
+                # 書きかけの状態を破棄し、次の操作でディスクから読み込み直す
+                self._generation = None
+                raise
+
+    async def upsert(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]] = None,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        vectors = normalize_rows(vectors)
+        if update_at is None:
+            update_at = [int(time.time() * 1000)] * len(ids)
+        attributes = fill_attributes(attributes, len(ids))
+        # ロックの待機とファイルの書き出しでイベントループを止めないようスレッドで実行
+        await asyncio.to_thread(self._upsert_rows, ids, vectors, update_at, attributes)
+        return [int(user_id) for user_id in ids]
+
+    def _upsert_rows(self, ids, vectors, update_at, attributes):
+        """ユーザーIDごとの行を追加または置き換え（スレッドで実行）"""
+        with self._writing():
+            new_ids = [
+                int(user_id) for user_id in ids if int(user_id) not in self._rows
+            ]
+            required = self._size + len(set(new_ids))
+            if required > len(self._vectors):
+                self._allocate(max(required, len(self._vectors) * 2))
+            if required > len(self._ids):
+                self._ids = np.resize(self._ids, len(self._vectors))
+                self._update_at = np.resize(self._update_at, len(self._vectors))
+                self._live = np.resize(self._live, len(self._vectors))
+                self._attributes = resize_attribute_columns(
+                    self._attributes, self._size, len(self._vectors)
+                )
+
+            for user_id, vector, timestamp, row_attributes in zip(
+                ids, vectors, update_at, attributes
+            ):
+                user_id = int(user_id)
+                row = self._rows.get(user_id)
+                if row is None:
+                    row = self._size
+                    self._rows[user_id] = row
+                    self._ids[row] = user_id
+                    self._live[row] = True
+                    self._size += 1
+                self._vectors[row] = vector
+                self._update_at[row] = int(timestamp)
+                for name, value in row_attributes.items():
+                    self._attributes[name][row] = value
+
+    async def update_attributes(self, ids: Sequence[int], attributes: Dict[str, Any]):
+        await asyncio.to_thread(self._update_rows, ids, attributes)
+
+    def _update_rows(self, ids, attributes):
+        """登録済みの行の属性を更新（スレッドで実行）"""
+        with self._writing():
+            for user_id in ids:
+                row = self._rows.get(int(user_id))
+                if row is None:
+                    continue
+                for name, value in attributes.items():
+                    self._attributes[name][row] = value
+
+    async def delete(self, ids: Sequence[int]) -> int:
+        await asyncio.to_thread(self._delete_rows, ids)
+        return len(ids)
+
+    def _delete_rows(self, ids):
+        """ユーザーIDの行を無効にする（スレッドで実行）"""
+        with self._writing():
+            for user_id in ids:
+                row = self._rows.pop(int(user_id), None)
+                if row is not None:
+                    # 他のワーカーが読み込み済みの行を別のユーザーに使わないよう、
+                    # 行は移動せずに無効にする
+                    self._live[row] = False
+            deleted = self._size - len(self._rows)
+            if deleted > self._size * _COMPACT_DELETED_RATIO:
+                self._compact()
+
+    async def search(
+        self,
+        vectors: np.ndarray,
+        limit: int = 1,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[SearchHit]]:
+        # 最大で (size, dim) の行列積になるため、イベントループを止めないようスレッドで実行
+        return await asyncio.to_thread(
+            self._search_rows, normalize_rows(vectors), limit, radius, filters
+        )
+
+    def _search_rows(self, queries, limit, radius, filters) -> List[List[SearchHit]]:
+        """クエリごとに類似度の高い行を検索（スレッドで実行）"""
+        with self._mutex:
+            self._maybe_reload()
+            size = self._size
+            # 無効な行と属性が一致しない行を除外
+            mask = self._live[:size].copy()
+            matched = attribute_mask(self._attributes, size, filters)
+            if matched is not None:
+                mask &= matched
+            matrix, ids = self._vectors[:size], self._ids[:size]
+
+        # 行は別のユーザーに再利用されず、行列の置き換えは新しいファイルに行うため、
+        # ロックを解放した後も取り出した行列とIDの対応は変わらない
+        return blocked_top_k(matrix, ids, queries, limit, radius, mask=mask)
+
+    async def fetch(
+        self, ids: Sequence[int]
+    ) -> Tuple[List[int], np.ndarray, List[int]]:
+        """
+        ユーザーIDの埋め込みを取得。
+
+        引数:
+            ids: 取得するユーザーIDのリスト
+
+        戻り値:
+            (見つかったユーザーIDのリスト, 対応する (件数, dim) の行列, 更新時刻のリスト)
+        """
+        return await asyncio.to_thread(self._fetch_rows, ids)
+
+    def _fetch_rows(self, ids) -> Tuple[List[int], np.ndarray, List[int]]:
+        """ユーザーIDの行を取り出す（スレッドで実行）"""
+        with self._mutex:
+            self._maybe_reload()
+            found = [int(user_id) for user_id in ids if int(user_id) in self._rows]
+            rows = [self._rows[user_id] for user_id in found]
+            return (
+                found,
+                np.asarray(self._vectors[rows], dtype=np.float32),
+                [int(self._update_at[row]) for row in rows],
+            )
+
+    async def count(self) -> int:
+        return await asyncio.to_thread(self._count_rows)
+
+    def _count_rows(self) -> int:
+        """有効な行数（スレッドで実行）"""
+        with self._mutex:
+            self._maybe_reload()
+            return len(self._rows)
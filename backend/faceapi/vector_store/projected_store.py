@@ -0,0 +1,114 @@
+"""
+次元削減した埋め込みをインデックスに登録するベクトルストアのモジュール。
+
+推論後の埋め込みを学習済みの射影で EMB_PROJECTION_DIM 次元に落としてから
+下位のストアに登録・検索します。再ランキングが有効な場合は全次元の埋め込みを
+ファイル上のサイドストアに保存し、射影空間で取得した候補を全次元の
+コサイン類似度で並べ替えてから閾値を適用します。
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..core import _CONFIG_
+from .base import SearchHit, VectorStore, normalize_rows
+from .codec import rerank
+from .numpy_store import NumpyVectorStore
+from .projection import EmbeddingProjection
+
+
+class ProjectedVectorStore(VectorStore):
+    """
+    射影した埋め込みを下位のベクトルストアに保存するラッパー。
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        projection: EmbeddingProjection,
+        full_store: Optional[NumpyVectorStore] = None,
+    ):
+        self.store = store
+        self.projection = projection
+        self.full_store = full_store
+        self.name = store.name
+
+    async def init(self):
+        await self.store.init()
+        if self.full_store is not None:
+            await self.full_store.init()
+
+    async def close(self):
+        await self.store.close()
+        if self.full_store is not None:
+            await self.full_store.close()
+
+    def background_jobs(self):
+        return self.store.background_jobs()
+
+    async def upsert(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]] = None,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        if self.full_store is not None:
+            await self.full_store.upsert(ids, vectors, update_at)
+        return await self.store.upsert(
+            ids, self.projection.transform(vectors), update_at, attributes
+        )
+
+    async def update_attributes(self, ids: Sequence[int], attributes: Dict[str, Any]):
+        await self.store.update_attributes(ids, attributes)
+
+    async def delete(self, ids: Sequence[int]) -> int:
+        deleted = await self.store.delete(ids)
+        if self.full_store is not None:
+            await self.full_store.delete(ids)
+        return deleted
+
+    async def search(
+        self,
+        vectors: np.ndarray,
+        limit: int = 1,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[SearchHit]]:
+        projected = self.projection.transform(vectors)
+        if self.full_store is None:
+            return await self.store.search(projected, limit, radius, filters)
+
+        # 射影空間の類似度は閾値の基準と異なるため、候補は閾値なしで取得
+        results = await self.store.search(
+            projected,
+            max(_CONFIG_.EMB_PROJECTION_RERANK_CANDIDATES, limit),
+            filters=filters,
+        )
+        candidates, matrices = [], []
+        for hits in results:
+            found, matrix, _ = await self.full_store.fetch(
+                [hit["user_id"] for hit in hits]
+            )
+            candidates.append(found)
+            matrices.append(matrix)
+        return rerank(normalize_rows(vectors), candidates, matrices, limit, radius)
+
+    def search_cursor(
+        self,
+        vector: np.ndarray,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        if self.full_store is not None:
+            # 再ランキングする場合は候補の取得から検索し直す既定のカーソルを使用
+            return super().search_cursor(vector, radius, filters)
+        projected = self.projection.transform(np.asarray(vector)[None, :])[0]
+        return self.store.search_cursor(projected, radius, filters)
+
+    def supported_filters(self, filters):
+        return self.store.supported_filters(filters)
+
+    async def count(self) -> int:
+        return await self.store.count()
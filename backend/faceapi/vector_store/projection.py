@@ -0,0 +1,166 @@
+"""
+埋め込みの次元削減（PCA/白色化）射影のモジュール。
+
+登録済みの埋め込みから学習した主成分への射影をモデルの隣に保存し、
+推論後の埋め込みを設定した次元数に落としてからインデックスに登録します。
+主成分は寄与率の大きい順に保存されるため、同じファイルから任意の次元数を選べます。
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from ..core import _CONFIG_
+from .base import normalize_rows
+
+# 白色化で分散を割る際のゼロ除算防止
+_WHITEN_EPS = 1e-6
+
+# 読み込み済みの射影
+_PROJECTION = None
+
+
+class EmbeddingProjection:
+    """
+    平均を引いてから主成分に射影し、必要に応じて白色化する線形射影。
+    """
+
+    def __init__(
+        self,
+        mean: np.ndarray,
+        components: np.ndarray,
+        variances: np.ndarray,
+        whiten: bool = False,
+    ):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+        self.variances = np.asarray(variances, dtype=np.float32)
+        self.whiten = whiten
+
+    @property
+    def dim(self) -> int:
+        """射影後の次元数"""
+        return len(self.components)
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, whiten: bool = False, block_size: int = 65536):
+        """
+        埋め込みから主成分を学習。
+
+        共分散行列をブロック単位で集計するため、memmapの大きな行列も扱えます。
+
+        引数:
+            vectors: (N, dim) の埋め込み行列
+            whiten: 射影後に各成分の分散で正規化するかどうか
+            block_size: 1回に集計する行数
+
+        戻り値:
+            寄与率の大きい順にすべての主成分を持つEmbeddingProjection
+        """
+        size, dim = vectors.shape
+        total = np.zeros(dim, dtype=np.float64)
+        for start in range(0, size, block_size):
+            total += normalize_rows(vectors[start : start + block_size]).sum(axis=0)
+        mean = total / size
+
+        covariance = np.zeros((dim, dim), dtype=np.float64)
+        for start in range(0, size, block_size):
+            block = normalize_rows(vectors[start : start + block_size]) - mean
+            covariance += block.T @ block
+        covariance /= max(size - 1, 1)
+
+        variances, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(variances)[::-1]
+        return cls(mean, eigenvectors[:, order].T, variances[order], whiten)
+
+    def truncate(self, dim: int) -> "EmbeddingProjection":
+        """上位dim個の主成分のみを使う射影を返す"""
+        if dim > self.dim:
+            raise ValueError(
+                f"射影の次元数 {dim} が保存された主成分数 {self.dim} を超えています"
+            )
+        return EmbeddingProjection(
+            self.mean, self.components[:dim], self.variances[:dim], self.whiten
+        )
+
+    def transform(self, vectors) -> np.ndarray:
+        """
+        埋め込みを射影し、L2正規化して返す。
+
+        引数:
+            vectors: (N, dim) または (dim,) の埋め込み
+
+        戻り値:
+            (N, 射影後の次元数) のL2正規化済みfloat32行列
+        """
+        projected = (normalize_rows(vectors) - self.mean) @ self.components.T
+        if self.whiten:
+            projected /= np.sqrt(np.maximum(self.variances, 0) + _WHITEN_EPS)
+        return normalize_rows(projected)
+
+    def explained_variance_ratio(self) -> np.ndarray:
+        """各主成分までの累積寄与率"""
+        variances = np.maximum(self.variances, 0)
+        return np.cumsum(variances) / max(variances.sum(), _WHITEN_EPS)
+
+    def save(self, path: str):
+        """射影を .npz ファイルに保存"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                mean=self.mean,
+                components=self.components,
+                variances=self.variances,
+                whiten=np.array(self.whiten),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingProjection":
+        """保存された射影を読み込む"""
+        with np.load(path) as data:
+            return cls(
+                data["mean"],
+                data["components"],
+                data["variances"],
+                bool(data["whiten"]),
+            )
+
+
+def get_projection_path() -> str:
+    """
+    射影ファイルのパスを返す。
+
+    EMB_PROJECTION_PATHが未設定の場合はモデルの隣に配置します
+    （MODEL_PATHがディレクトリならその中、ファイルなら同じ名前の .projection.npz）。
+    """
+    if _CONFIG_.EMB_PROJECTION_PATH:
+        return _CONFIG_.EMB_PROJECTION_PATH
+    if os.path.isdir(_CONFIG_.MODEL_PATH):
+        return os.path.join(_CONFIG_.MODEL_PATH, "projection.npz")
+    return os.path.splitext(_CONFIG_.MODEL_PATH)[0] + ".projection.npz"
+
+
+def get_projection() -> Optional[EmbeddingProjection]:
+    """
+    設定で有効になっている射影を返す（無効な場合はNone）。
+
+    例外:
+        FileNotFoundError: 射影ファイルが存在しない場合
+    """
+    global _PROJECTION
+    if not _CONFIG_.EMB_PROJECTION_ENABLED:
+        return None
+    if _PROJECTION is None:
+        path = get_projection_path()
+        _PROJECTION = EmbeddingProjection.load(path).truncate(
+            _CONFIG_.EMB_PROJECTION_DIM
+        )
+        logger.info(
+            f"埋め込みの射影を読み込みました: {path} "
+            f"({_CONFIG_.MODEL_EMB_DIM} -> {_PROJECTION.dim}, "
+            f"whiten={_PROJECTION.whiten})"
+        )
+    return _PROJECTION
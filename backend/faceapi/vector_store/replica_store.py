@@ -0,0 +1,197 @@
+"""
+Milvusの face_features をプロセス内に複製して検索するベクトルストアのモジュール。
+
+起動時に query_iterator で全件を読み込んだローカルインデックスを作成し、
+自プロセスの登録・削除と update_at に基づく定期的な差分同期で最新に保ちます。
+検索はローカルで応答し、Milvusは正本および複製が使えない場合の代替として使用します。
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+from ..core import _CONFIG_
+from ..db import get_feature_storage, get_milvus_client
+from ..utils import run_in_milvus_executor
+from .base import SearchHit
+from .codec import decode_vector
+from .local_index import LocalIndex
+from .milvus_store import MilvusVectorStore
+
+# 差分同期で読み込む1バッチの件数
+_SYNC_BATCH_SIZE = 1000
+
+
+class ReplicatedMilvusVectorStore(MilvusVectorStore):
+    """
+    Milvusを正本とし、検索をプロセス内の複製インデックスで行うベクトルストア。
+    """
+
+    name = "milvus"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica = LocalIndex()
+        self.ready = False
+        self._last_update_at = 0
+
+    async def init(self):
+        await super().init()
+        try:
+            await self.bootstrap()
+        except Exception as e:
+            # 複製の作成に失敗してもMilvusでの検索は継続
+            logger.error(f"ローカル複製の作成に失敗しました: {e}")
+
+    async def _scan(self, filter_expr: str = "", output_fields=None):
+        """query_iteratorでコレクションを走査し、バッチごとに返す"""
+        iterator = await run_in_milvus_executor(
+            get_milvus_client().query_iterator,
+            collection_name=self.collection_name,
+            batch_size=_SYNC_BATCH_SIZE,
+            filter=filter_expr,
+            output_fields=output_fields
+            or ["user_id", "feature_vector", "update_at"]
+            + get_feature_storage()["attributes"],
+        )
+        try:
+            while True:
+                batch = await run_in_milvus_executor(iterator.next)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            iterator.close()
+
+    def _apply_rows(self, rows, replica: LocalIndex = None):
+        """走査結果を複製インデックスに反映"""
+        if not rows:
+            return
+        storage = get_feature_storage()
+        # 空のLocalIndexは偽と評価されるため、Noneかどうかで判定する
+        (self.replica if replica is None else replica).upsert(
+            [row["user_id"] for row in rows],
+            np.stack(
+                [decode_vector(row["feature_vector"], storage["dtype"]) for row in rows]
+            ),
+            [{name: row[name] for name in storage["attributes"]} for row in rows],
+        )
+        self._last_update_at = max(
+            self._last_update_at, max(int(row["update_at"]) for row in rows)
+        )
+
+    async def bootstrap(self):
+        """コレクション全体を読み込んで複製インデックスを作成"""
+        # 作成中も既存の複製で検索を続けられるよう、完成後に差し替える
+        replica = LocalIndex()
+        async for batch in self._scan():
+            self._apply_rows(batch, replica)
+        self.replica = replica
+        self.ready = True
+        logger.info(f"ローカル複製を作成しました (rows={len(self.replica)})")
+
+    async def sync_delta(self):
+        """update_atが前回同期以降の行を取り込む"""
+        # 書き込み元の時刻のずれを考慮して同期間隔分さかのぼる
+        since = (
+            self._last_update_at - _CONFIG_.VECTOR_STORE_REPLICA_SYNC_INTERVAL * 1000
+        )
+        async for batch in self._scan(filter_expr=f"update_at >= {max(since, 0)}"):
+            self._apply_rows(batch)
+
+    async def reconcile(self):
+        """
+        他プロセスで削除されたユーザーを複製から取り除き、複製にないユーザーを読み込む。
+
+        一括インポートやスナップショットの復元で書き込まれた行は update_at が
+        差分同期の範囲より古い場合があるため、ユーザーIDの差分で取り込みます。
+        """
+        remote_ids = set()
+        async for batch in self._scan(output_fields=["user_id"]):
+            remote_ids.update(int(row["user_id"]) for row in batch)
+        local_ids = {int(user_id) for user_id in self.replica.ids()}
+        removed = sorted(local_ids - remote_ids)
+        if removed:
+            self.replica.delete(removed)
+            logger.info(f"ローカル複製から {len(removed)} 件を削除しました")
+
+        missing = sorted(remote_ids - local_ids)
+        for start in range(0, len(missing), _SYNC_BATCH_SIZE):
+            rows = await run_in_milvus_executor(
+                get_milvus_client().get,
+                collection_name=self.collection_name,
+                ids=missing[start : start + _SYNC_BATCH_SIZE],
+                output_fields=["user_id", "feature_vector", "update_at"]
+                + get_feature_storage()["attributes"],
+            )
+            self._apply_rows(rows)
+        if missing:
+            logger.info(f"ローカル複製に {len(missing)} 件を読み込みました")
+
+    async def sync_loop(self):
+        """差分同期と削除の照合を定期的に行うバックグラウンドタスク"""
+        interval = _CONFIG_.VECTOR_STORE_REPLICA_SYNC_INTERVAL
+        reconcile_every = max(
+            1, _CONFIG_.VECTOR_STORE_REPLICA_RECONCILE_INTERVAL // max(interval, 1)
+        )
+        cycle = 0
+        while True:
+            await asyncio.sleep(interval)
+            cycle += 1
+            try:
+                if not self.ready:
+                    await self.bootstrap()
+                    continue
+                await self.sync_delta()
+                if cycle % reconcile_every == 0:
+                    await self.reconcile()
+            except Exception as e:
+                logger.error(f"ローカル複製の同期に失敗しました: {e}")
+
+    def background_jobs(self):
+        return super().background_jobs() + [self.sync_loop()]
+
+    async def upsert(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]] = None,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        written = await super().upsert(ids, vectors, update_at, attributes)
+        self.replica.upsert(ids, vectors, attributes)
+        return written
+
+    async def update_attributes(self, ids: Sequence[int], attributes: Dict[str, Any]):
+        await super().update_attributes(ids, attributes)
+        self.replica.update_attributes(ids, attributes)
+
+    async def delete(self, ids: Sequence[int]) -> int:
+        deleted = await super().delete(ids)
+        self.replica.delete(ids)
+        return deleted
+
+    async def search(
+        self,
+        vectors: np.ndarray,
+        limit: int = 1,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[SearchHit]]:
+        if self.ready:
+            try:
+                # コレクションにない属性の条件はMilvusと同じく無視する
+                # （複製の属性列は既定値で埋まっているため一致しなくなる）
+                # 行列積でイベントループを止めないようスレッドで実行
+                return await asyncio.to_thread(
+                    self.replica.search,
+                    vectors,
+                    limit,
+                    radius,
+                    self.supported_filters(filters),
+                )
+            except Exception as e:
+                logger.error(f"ローカル複製での検索に失敗しました: {e}")
+        return await super().search(vectors, limit, radius, filters)
@@ -0,0 +1,358 @@
+"""
+ユーザーごとに複数の顔テンプレートを保持するベクトルストアのモジュール。
+
+登録された顔（照明・眼鏡の有無などが異なるテンプレート）はサイドストアに
+ユーザーあたり最大 FACE_TEMPLATES_MAX_PER_USER 件保存し、検索インデックスには
+テンプレートを平均して再正規化したプロトタイプを1ユーザー1件だけ登録します。
+プロトタイプは変更のあったユーザーについてのみ再計算され、
+再ランキングが有効な場合は候補ユーザーのテンプレートとの最大類似度で並べ替えます。
+"""
+
+import asyncio
+import time
+import weakref
+from abc import ABC, abstractmethod
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core import _CONFIG_
+from .base import SearchHit, VectorStore, fill_attributes, normalize_rows
+from .codec import decode_vector
+from .numpy_store import NumpyVectorStore
+
+
+class TemplateStore(ABC):
+    """
+    テンプレートIDをキーに全次元の埋め込みを保存するサイドストア。
+    """
+
+    async def init(self):
+        """ストアを初期化"""
+
+    async def close(self):
+        """ストアを終了"""
+
+    @abstractmethod
+    async def put(
+        self, keys: Sequence[int], vectors: np.ndarray, update_at: Sequence[int]
+    ):
+        """テンプレートを登録または置き換え"""
+
+    @abstractmethod
+    async def get(self, keys: Sequence[int]) -> Tuple[List[int], np.ndarray, List[int]]:
+        """
+        テンプレートを取得。
+
+        戻り値:
+            (見つかったテンプレートIDのリスト, (件数, dim) の行列, 更新時刻のリスト)
+        """
+
+    @abstractmethod
+    async def remove(self, keys: Sequence[int]):
+        """テンプレートを削除"""
+
+
+class NumpyTemplateStore(TemplateStore):
+    """
+    NumPyのメモリマップ行列にテンプレートを保存するサイドストア。
+    """
+
+    def __init__(self, path: str = None):
+        self.store = NumpyVectorStore(
+            path or _CONFIG_.FACE_TEMPLATES_PATH, dim=_CONFIG_.MODEL_EMB_DIM
+        )
+
+    async def init(self):
+        await self.store.init()
+
+    async def close(self):
+        await self.store.close()
+
+    async def put(self, keys, vectors, update_at):
+        await self.store.upsert(keys, vectors, update_at)
+
+    async def get(self, keys):
+        return await self.store.fetch(keys)
+
+    async def remove(self, keys):
+        await self.store.delete(keys)
+
+
+class MilvusTemplateStore(TemplateStore):
+    """
+    Milvusの face_templates コレクションにテンプレートを保存するサイドストア。
+    """
+
+    def __init__(self, collection_name: str = None):
+        from ..db import FACE_TEMPLATES_COLLECTION
+
+        self.collection_name = collection_name or FACE_TEMPLATES_COLLECTION
+
+    async def put(self, keys, vectors, update_at):
+        from ..utils import collection_call
+
+        entities = [
+            {
+                "template_id": int(key),
+                "user_id": int(key) // _CONFIG_.FACE_TEMPLATES_MAX_PER_USER,
+                "feature_vector": np.asarray(vector, dtype=np.float32).tolist(),
+                "update_at": int(timestamp),
+            }
+            for key, vector, timestamp in zip(keys, vectors, update_at)
+        ]
+        await collection_call(self.collection_name, "upsert", data=entities)
+
+    async def get(self, keys):
+        from ..utils import collection_call
+
+        if not keys:
+            return [], np.zeros((0, _CONFIG_.MODEL_EMB_DIM), dtype=np.float32), []
+        rows = await collection_call(
+            self.collection_name,
+            "get",
+            ids=[int(key) for key in keys],
+            output_fields=["template_id", "feature_vector", "update_at"],
+        )
+        if not rows:
+            return [], np.zeros((0, _CONFIG_.MODEL_EMB_DIM), dtype=np.float32), []
+        return (
+            [int(row["template_id"]) for row in rows],
+            np.stack([decode_vector(row["feature_vector"], "FLOAT") for row in rows]),
+            [int(row["update_at"]) for row in rows],
+        )
+
+    async def remove(self, keys):
+        from ..utils import collection_call
+
+        await collection_call(
+            self.collection_name, "delete", ids=[int(key) for key in keys]
+        )
+
+
+class TemplateVectorStore(VectorStore):
+    """
+    登録された顔をテンプレートとして蓄積し、プロトタイプを検索インデックスに保存するラッパー。
+
+    upsert はユーザーの既存テンプレートを置き換えずに追加し、上限に達している場合は
+    最も古いテンプレートを入れ替えます。テンプレートIDは
+    user_id * FACE_TEMPLATES_MAX_PER_USER + スロット番号 です。
+    同じユーザーのテンプレートの読み出しから書き込みまではユーザーごとの
+    ロックで直列化します（プロセス内のみ）。
+    """
+
+    def __init__(self, store: VectorStore, templates: TemplateStore):
+        self.store = store
+        self.templates = templates
+        self.name = store.name
+        self.max_per_user = _CONFIG_.FACE_TEMPLATES_MAX_PER_USER
+        # 使用中のユーザーのロックのみを保持
+        self._locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+
+    def _keys(self, user_id: int) -> List[int]:
+        """ユーザーのテンプレートIDの範囲"""
+        start = int(user_id) * self.max_per_user
+        return list(range(start, start + self.max_per_user))
+
+    async def init(self):
+        await self.store.init()
+        await self.templates.init()
+
+    async def close(self):
+        await self.store.close()
+        await self.templates.close()
+
+    def background_jobs(self):
+        return self.store.background_jobs()
+
+    @asynccontextmanager
+    async def _locked(self, user_ids: Sequence[int]):
+        """ユーザーごとのロックをID順に取得（デッドロックを避けるため）"""
+        locks = []
+        for user_id in sorted({int(user_id) for user_id in user_ids}):
+            lock = self._locks.get(user_id)
+            if lock is None:
+                lock = self._locks[user_id] = asyncio.Lock()
+            locks.append(lock)
+        async with AsyncExitStack() as stack:
+            for lock in locks:
+                await stack.enter_async_context(lock)
+            yield
+
+    async def upsert(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]] = None,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        async with self._locked(ids):
+            return await self._write(ids, vectors, update_at, attributes, False)
+
+    async def replace(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]] = None,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        async with self._locked(ids):
+            return await self._write(ids, vectors, update_at, attributes, True)
+
+    async def _write(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]],
+        attributes: Optional[Sequence[Dict[str, Any]]],
+        replace: bool,
+    ) -> List[int]:
+        """
+        テンプレートを書き込み、プロトタイプを再計算して登録（ロックの保持中に使用）。
+
+        replace の場合は既存のテンプレートを使わずにプロトタイプを計算し、
+        プロトタイプの登録後に書き込まなかったスロットのテンプレートを削除します。
+        """
+        if update_at is None:
+            update_at = [int(time.time() * 1000)] * len(ids)  # エポックからのミリ秒
+        vectors = normalize_rows(vectors)
+
+        # ユーザーごとに新しいテンプレートをまとめる（属性は最後の行のものを使用）
+        added: Dict[int, List[Tuple[np.ndarray, int]]] = {}
+        user_attributes: Dict[int, Dict[str, Any]] = {}
+        for user_id, vector, timestamp, row in zip(
+            ids, vectors, update_at, fill_attributes(attributes, len(ids))
+        ):
+            added.setdefault(int(user_id), []).append((vector, int(timestamp)))
+            user_attributes[int(user_id)] = row
+
+        put_keys, put_vectors, put_update_at = [], [], []
+        prototypes, prototype_update_at = [], []
+        stale_keys = []
+        for user_id, entries in added.items():
+            found, matrix, stamps = await self.templates.get(self._keys(user_id))
+            current = {
+                key: (vector, stamp)
+                for key, vector, stamp in zip(found, matrix, stamps)
+            }
+            if replace:
+                stale_keys.extend(found)
+                current = {}
+            for vector, timestamp in entries[-self.max_per_user :]:
+                key = self._free_or_oldest_slot(user_id, current)
+                current[key] = (vector, timestamp)
+                put_keys.append(key)
+                put_vectors.append(vector)
+                put_update_at.append(timestamp)
+
+            # 変更のあったユーザーのみプロトタイプを再計算
+            templates = normalize_rows(
+                np.stack([vector for vector, _ in current.values()])
+            )
+            prototypes.append(templates.mean(axis=0))
+            prototype_update_at.append(max(stamp for _, stamp in current.values()))
+
+        await self.templates.put(put_keys, np.stack(put_vectors), put_update_at)
+        written = await self.store.upsert(
+            list(added),
+            normalize_rows(np.stack(prototypes)),
+            prototype_update_at,
+            [user_attributes[user_id] for user_id in added],
+        )
+        # 新しいプロトタイプの登録後に、置き換えられたテンプレートを削除
+        stale_keys = sorted(set(stale_keys) - set(put_keys))
+        if stale_keys:
+            await self.templates.remove(stale_keys)
+        return written
+
+    async def update_attributes(self, ids: Sequence[int], attributes: Dict[str, Any]):
+        await self.store.update_attributes(ids, attributes)
+
+    def _free_or_oldest_slot(self, user_id: int, current: dict) -> int:
+        """空いているスロット、なければ最も古いテンプレートのスロットを返す"""
+        for key in self._keys(user_id):
+            if key not in current:
+                return key
+        return min(current, key=lambda key: current[key][1])
+
+    async def delete(self, ids: Sequence[int]) -> int:
+        async with self._locked(ids):
+            deleted = await self.store.delete(ids)
+            await self.templates.remove(
+                [key for user_id in ids for key in self._keys(user_id)]
+            )
+        return deleted
+
+    async def search(
+        self,
+        vectors: np.ndarray,
+        limit: int = 1,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[SearchHit]]:
+        if not _CONFIG_.FACE_TEMPLATES_RERANK:
+            return await self.store.search(vectors, limit, radius, filters)
+
+        # プロトタイプで候補ユーザーを取得し、テンプレートとの最大類似度で並べ替え
+        results = await self.store.search(
+            vectors,
+            max(_CONFIG_.FACE_TEMPLATES_RERANK_CANDIDATES, limit),
+            filters=filters,
+        )
+        keys = {
+            key
+            for hits in results
+            for hit in hits
+            for key in self._keys(hit["user_id"])
+        }
+        found, matrix, _ = await self.templates.get(sorted(keys))
+        owners = np.asarray(found, dtype=np.int64) // self.max_per_user
+        scores = (
+            normalize_rows(vectors) @ normalize_rows(matrix).T if len(found) else None
+        )
+
+        reranked = []
+        for index, hits in enumerate(results):
+            # テンプレートのないユーザーはプロトタイプの類似度を使用
+            best = {hit["user_id"]: hit["distance"] for hit in hits}
+            with_templates = set()
+            if scores is not None:
+                for user_id, score in zip(owners, scores[index]):
+                    user_id = int(user_id)
+                    if user_id not in best:
+                        continue
+                    if user_id not in with_templates:
+                        best[user_id] = float(score)
+                        with_templates.add(user_id)
+                    else:
+                        best[user_id] = max(best[user_id], float(score))
+
+            ranked = sorted(best.items(), key=lambda item: -item[1])[:limit]
+            reranked.append(
+                [
+                    {"user_id": user_id, "distance": score}
+                    for user_id, score in ranked
+                    if radius is None or score > radius
+                ]
+            )
+        return reranked
+
+    def search_cursor(
+        self,
+        vector: np.ndarray,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        if _CONFIG_.FACE_TEMPLATES_RERANK:
+            # 再ランキングする場合は候補の取得から検索し直す既定のカーソルを使用
+            return super().search_cursor(vector, radius, filters)
+        return self.store.search_cursor(vector, radius, filters)
+
+    def supported_filters(self, filters):
+        return self.store.supported_filters(filters)
+
+    async def count(self) -> int:
+        return await self.store.count()
@@ -0,0 +1,326 @@
+"""
+顔特徴の登録をまとめて書き込むベクトルストアのモジュール。
+
+同時に届いた登録リクエストのupsertをキューに溜め、件数（WRITE_QUEUE_MAX_BATCH）
+または待ち時間（WRITE_QUEUE_MAX_DELAY_MS）のどちらかに達した時点で1回のupsertとして
+下位のストアに書き込みます。各リクエストは自分の登録を含むバッチの書き込みが
+完了するまで待つため、応答を返した時点で登録は永続化されています。
+
+Milvusの検索は既定の一貫性レベルでは直前の書き込みが見えないことがあるため、
+ReadYourWritesVectorStore をMilvusのストアの直上に挟み、Milvusに書き込んだ顔特徴
+（射影やプロトタイプの集約を済ませたもの）を WRITE_QUEUE_READ_YOUR_WRITES_SECONDS
+秒間メモリに保持して検索結果に合成します。保持はプロセスごとのため、他のワーカーが
+登録した顔は同期されるまで（Milvusの一貫性レベルの範囲で）見えないことがあります。
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from ..core import _CONFIG_
+from .base import SearchHit, VectorStore, fill_attributes, normalize_rows
+
+
+class WriteQueueVectorStore(VectorStore):
+    """
+    upsertをバッチにまとめて下位のストアに書き込むラッパー。
+
+    削除と属性の更新はキューに溜まっているupsertを書き込んでから実行するため、
+    リクエストの順序は保たれます。
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        max_batch: int = None,
+        max_delay: float = None,
+    ):
+        self.store = store
+        self.name = store.name
+        self.max_batch = max_batch or _CONFIG_.WRITE_QUEUE_MAX_BATCH
+        self.max_delay = (
+            _CONFIG_.WRITE_QUEUE_MAX_DELAY_MS / 1000 if max_delay is None else max_delay
+        )
+        # (ids, vectors, update_at, attributes, future) のリスト
+        self._pending: List[Tuple[list, np.ndarray, list, list, asyncio.Future]] = []
+        self._pending_rows = 0
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+    async def init(self):
+        await self.store.init()
+
+    async def close(self):
+        await self.flush()
+        await self.store.close()
+
+    def background_jobs(self):
+        return self.store.background_jobs()
+
+    async def upsert(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]] = None,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        if update_at is None:
+            update_at = [int(time.time() * 1000)] * len(ids)  # エポックからのミリ秒
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(
+            (
+                [int(user_id) for user_id in ids],
+                np.asarray(vectors, dtype=np.float32),
+                list(update_at),
+                fill_attributes(attributes, len(ids)),
+                future,
+            )
+        )
+        self._pending_rows += len(ids)
+
+        if self._pending_rows >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._start_flush)
+        # バッチの書き込みが完了するまで待つ
+        return await future
+
+    def _start_flush(self):
+        """キューの書き込みをバックグラウンドで開始"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self):
+        """キューに溜まっているupsertを書き込み、待っているリクエストに結果を返す"""
+        async with self._flush_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            batch, self._pending, self._pending_rows = self._pending, [], 0
+            if not batch:
+                return
+
+            # 同じユーザーが1回のupsertに重複しないよう、出現順に分けて書き込む
+            rounds: List[Dict[str, list]] = []
+            for ids, vectors, update_at, attributes, _ in batch:
+                for row, user_id in enumerate(ids):
+                    target = next(
+                        (item for item in rounds if user_id not in item["seen"]), None
+                    )
+                    if target is None:
+                        target = {"seen": set(), "rows": []}
+                        rounds.append(target)
+                    target["seen"].add(user_id)
+                    target["rows"].append(
+                        (user_id, vectors[row], update_at[row], attributes[row])
+                    )
+
+            try:
+                for item in rounds:
+                    rows = item["rows"]
+                    await self.store.upsert(
+                        [row[0] for row in rows],
+                        np.stack([row[1] for row in rows]),
+                        [row[2] for row in rows],
+                        [row[3] for row in rows],
+                    )
+            except Exception as e:  # pylint: disable=broad-except
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for ids, *_, future in batch:
+                if not future.done():
+                    future.set_result(ids)
+
+    async def replace(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]] = None,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        # キューの書き込みより後に置き換えるため、先に書き込んでから直接置き換える
+        await self.flush()
+        if update_at is None:
+            update_at = [int(time.time() * 1000)] * len(ids)  # エポックからのミリ秒
+        return await self.store.replace(ids, vectors, update_at, attributes)
+
+    async def update_attributes(self, ids: Sequence[int], attributes: Dict[str, Any]):
+        await self.flush()
+        await self.store.update_attributes(ids, attributes)
+
+    async def delete(self, ids: Sequence[int]) -> int:
+        await self.flush()
+        return await self.store.delete(ids)
+
+    async def search(
+        self,
+        vectors: np.ndarray,
+        limit: int = 1,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[SearchHit]]:
+        return await self.store.search(vectors, limit, radius, filters)
+
+    def search_cursor(
+        self,
+        vector: np.ndarray,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        return self.store.search_cursor(vector, radius, filters)
+
+    def supported_filters(self, filters):
+        return self.store.supported_filters(filters)
+
+    async def count(self) -> int:
+        return await self.store.count()
+
+
+class ReadYourWritesVectorStore(VectorStore):
+    """
+    書き込んだ顔特徴を一定時間保持し、検索結果に合成するラッパー。
+
+    Milvusのストアの直上に置き、Milvusに実際に書き込まれた顔特徴を保持するため、
+    合成する類似度はMilvusの検索結果と同じ空間・同じ尺度になります。上位の射影や
+    テンプレートのストアは合成された候補を通常の候補と同じく再ランキングします。
+    保持した顔特徴の類似度はMilvusの結果より優先します（同じユーザーの古い顔特徴が
+    返されても置き換え後の類似度を使用）。保持はプロセス内のみです。
+    """
+
+    def __init__(self, store: VectorStore, seconds: float = None):
+        self.store = store
+        self.name = store.name
+        if seconds is None:
+            seconds = _CONFIG_.WRITE_QUEUE_READ_YOUR_WRITES_SECONDS
+        self.seconds = seconds
+        # 書き込み直後の顔特徴: user_id -> (正規化した顔特徴, 属性, 有効期限)
+        self._recent: Dict[int, Tuple[np.ndarray, Dict[str, Any], float]] = {}
+
+    async def init(self):
+        await self.store.init()
+
+    async def close(self):
+        await self.store.close()
+
+    def background_jobs(self):
+        return self.store.background_jobs()
+
+    def _remember(self, ids, vectors, attributes):
+        """書き込んだ顔特徴を検索結果に合成するために保持"""
+        if self.seconds <= 0:
+            return
+        expires = time.monotonic() + self.seconds
+        for user_id, vector, row in zip(
+            ids, normalize_rows(vectors), fill_attributes(attributes, len(ids))
+        ):
+            self._recent[int(user_id)] = (vector, dict(row), expires)
+
+    def _recent_entries(self, filters: Optional[Dict[str, Any]]):
+        """有効期限内で属性の条件に一致する書き込み直後の顔特徴"""
+        # 下位のストアが無視する条件は、書き込み直後の顔特徴にも適用しない
+        filters = self.store.supported_filters(filters)
+        now = time.monotonic()
+        expired = [
+            user_id
+            for user_id, (_, _, expires) in self._recent.items()
+            if expires < now
+        ]
+        for user_id in expired:
+            del self._recent[user_id]
+        return [
+            (user_id, vector)
+            for user_id, (vector, row, _) in self._recent.items()
+            if all(row.get(name) == value for name, value in (filters or {}).items())
+        ]
+
+    async def upsert(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]] = None,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        written = await self.store.upsert(ids, vectors, update_at, attributes)
+        self._remember(ids, vectors, attributes)
+        return written
+
+    async def replace(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        update_at: Optional[Sequence[int]] = None,
+        attributes: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[int]:
+        written = await self.store.replace(ids, vectors, update_at, attributes)
+        self._remember(ids, vectors, attributes)
+        return written
+
+    async def update_attributes(self, ids: Sequence[int], attributes: Dict[str, Any]):
+        for user_id in ids:
+            if int(user_id) in self._recent:
+                self._recent[int(user_id)][1].update(attributes)
+        await self.store.update_attributes(ids, attributes)
+
+    async def delete(self, ids: Sequence[int]) -> int:
+        for user_id in ids:
+            self._recent.pop(int(user_id), None)
+        return await self.store.delete(ids)
+
+    async def search(
+        self,
+        vectors: np.ndarray,
+        limit: int = 1,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[SearchHit]]:
+        entries = self._recent_entries(filters)
+        if not entries:
+            return await self.store.search(vectors, limit, radius, filters)
+
+        # 古い顔特徴の結果を除いても limit 件残るよう、保持している件数だけ多く取得
+        results = await self.store.search(
+            vectors, limit + len(entries), radius, filters
+        )
+        recent_ids = {user_id for user_id, _ in entries}
+        scores = normalize_rows(vectors) @ np.stack([vector for _, vector in entries]).T
+        merged = []
+        for hits, row in zip(results, scores):
+            best = {
+                hit["user_id"]: hit["distance"]
+                for hit in hits
+                if hit["user_id"] not in recent_ids
+            }
+            for (user_id, _), score in zip(entries, row):
+                if radius is None or score > radius:
+                    best[user_id] = float(score)
+            ranked = sorted(best.items(), key=lambda item: -item[1])[:limit]
+            merged.append(
+                [{"user_id": user_id, "distance": score} for user_id, score in ranked]
+            )
+        return merged
+
+    def search_cursor(
+        self,
+        vector: np.ndarray,
+        radius: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        # 管理用の深い検索のため、書き込み直後の顔特徴は合成しない
+        return self.store.search_cursor(vector, radius, filters)
+
+    def supported_filters(self, filters):
+        return self.store.supported_filters(filters)
+
+    async def count(self) -> int:
+        return await self.store.count()
@@ -0,0 +1,49 @@
+"""
+Shared test setup.
+
+Importing faceapi loads the settings and the face recognition model, so the
+environment is configured here before any test module imports it. The model is
+a tiny ONNX Identity graph written to a temporary file, which keeps the tests
+independent of the real weights.
+"""
+
+import os
+import tempfile
+
+import onnx
+import pytest
+from onnx import TensorProto, helper
+from tortoise import Tortoise
+
+
+def _write_identity_model(path: str):
+    """Write an ONNX model that returns its [N, 3, 112, 112] input unchanged."""
+    shape = ["N", 3, 112, 112]
+    graph = helper.make_graph(
+        [helper.make_node("Identity", ["input"], ["output"])],
+        "identity",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, shape)],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, shape)],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+_MODEL_PATH = os.path.join(tempfile.mkdtemp(prefix="faceapi-tests-"), "identity.onnx")
+_write_identity_model(_MODEL_PATH)
+
+os.environ.setdefault("ALLOWED_ORIGINS", '["*"]')
+os.environ["MODEL_LOADER"] = "onnx"
+os.environ["MODEL_PATH"] = _MODEL_PATH
+
+
+@pytest.fixture
+async def db():
+    """An in-memory SQLite database with the faceapi models."""
+    await Tortoise.init(
+        db_url="sqlite://:memory:", modules={"models": ["faceapi.models"]}
+    )
+    await Tortoise.generate_schemas()
+    yield
+    await Tortoise.close_connections()
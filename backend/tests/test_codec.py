@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from faceapi.vector_store.codec import (
+    binarize,
+    binary_codes,
+    decode_vector,
+    encode_vectors,
+    from_bfloat16_bits,
+    hamming_distances,
+    quantize,
+    to_bfloat16_bits,
+)
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).standard_normal((4, 16)).astype(np.float32)
+
+
+@pytest.mark.parametrize("dtype", ["FLOAT", "FLOAT16", "BFLOAT16"])
+def test_encode_decode_round_trip_matches_quantize(vectors, dtype):
+    encoded = encode_vectors(vectors, dtype)
+    decoded = np.stack([decode_vector(value, dtype) for value in encoded])
+    np.testing.assert_array_equal(decoded, quantize(vectors, dtype))
+
+
+@pytest.mark.parametrize("dtype", ["FLOAT16", "BFLOAT16"])
+def test_decode_vector_accepts_wrapped_bytes(vectors, dtype):
+    value = encode_vectors(vectors[:1], dtype)[0]
+    np.testing.assert_array_equal(
+        decode_vector([value], dtype), decode_vector(value, dtype)
+    )
+
+
+def test_decode_vector_accepts_bfloat16_bits_as_integers(vectors):
+    bits = to_bfloat16_bits(vectors[0])
+    np.testing.assert_array_equal(
+        decode_vector(bits.tolist(), "BFLOAT16"), from_bfloat16_bits(bits)
+    )
+
+
+def test_bfloat16_rounds_to_nearest_even():
+    # 1 + 2^-8 は bfloat16 の2つの値のちょうど中間にあり、偶数側の 1.0 に丸める
+    value = np.array([1 + 2**-8], dtype=np.float32)
+    assert from_bfloat16_bits(to_bfloat16_bits(value))[0] == 1.0
+    assert abs(quantize(value, "BFLOAT16")[0] - value[0]) <= 2**-8
+
+
+def test_binary_codes_pack_signs():
+    vectors = np.array([[1, -1, 1, -1, 1, -1, 1, -1, -1, -1, -1, -1, -1, -1, -1, 1]])
+    assert binarize(vectors).tolist() == [[0b10101010, 0b00000001]]
+    assert binary_codes(vectors) == [bytes([0b10101010, 0b00000001])]
+
+
+def test_hamming_distances(vectors):
+    codes = binarize(vectors)
+    distances = hamming_distances(codes, codes[:2])
+    assert distances.shape == (2, 4)
+    assert distances[0, 0] == 0 and distances[1, 1] == 0
+    expected = np.unpackbits(codes[0] ^ codes[3]).sum()
+    assert distances[0, 3] == expected
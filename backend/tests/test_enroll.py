@@ -0,0 +1,127 @@
+import datetime
+import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from faceapi.core import _CONFIG_
+from faceapi.models import UserModel
+from faceapi.services import enroll
+from faceapi.services.enroll import EnrollSource, entry_username, load_report
+
+
+@pytest.mark.parametrize(
+    "name, by_folder, expected",
+    [
+        ("alice.jpg", False, "alice"),
+        ("photos/alice.jpg", False, "alice"),
+        ("alice/1.jpg", True, "alice"),
+        ("alice.jpg", True, "alice"),
+    ],
+)
+def test_entry_username(name, by_folder, expected):
+    assert entry_username(name, by_folder=by_folder) == expected
+
+
+def test_entry_username_prefers_mapping():
+    mapping = {"alice/1.jpg": "bob"}
+    assert entry_username("alice/1.jpg", mapping, by_folder=True) == "bob"
+
+
+def test_load_report_missing_file(tmp_path):
+    assert load_report(str(tmp_path / "report.jsonl")) == {}
+
+
+def test_load_report_keeps_latest_row_and_skips_partial_line(tmp_path):
+    path = tmp_path / "report.jsonl"
+    rows = [
+        {"file": "a.jpg", "status": "error"},
+        {"file": "b.jpg", "status": "enrolled"},
+        {"file": "a.jpg", "status": "enrolled"},
+    ]
+    path.write_text(
+        "".join(json.dumps(row) + "\n" for row in rows) + '{"file": "c.jp',
+        encoding="utf-8",
+    )
+
+    report = load_report(str(path))
+
+    assert sorted(report) == ["a.jpg", "b.jpg"]
+    assert report["a.jpg"]["status"] == "enrolled"
+
+
+def _zip_source(tmp_path, members):
+    path = tmp_path / "faces.zip"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return EnrollSource(str(path))
+
+
+def test_enroll_source_reads_zip_member_within_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(_CONFIG_, "UPLOAD_MAX_BYTES", 100)
+    source = _zip_source(tmp_path, {"alice.jpg": b"x" * 100})
+    assert source.read("alice.jpg") == b"x" * 100
+
+
+def test_enroll_source_rejects_large_zip_member_before_reading(tmp_path, monkeypatch):
+    monkeypatch.setattr(_CONFIG_, "UPLOAD_MAX_BYTES", 100)
+    source = _zip_source(tmp_path, {"bomb.jpg": b"\0" * 1_000_000})
+    opened = []
+    monkeypatch.setattr(source._zip, "open", lambda *args: opened.append(args))
+
+    with pytest.raises(ValueError, match="too large"):
+        source.read("bomb.jpg")
+    assert opened == []
+
+
+def test_enroll_source_rejects_large_folder_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(_CONFIG_, "UPLOAD_MAX_BYTES", 100)
+    (tmp_path / "bob.jpg").write_bytes(b"x" * 101)
+    with pytest.raises(ValueError, match="too large"):
+        EnrollSource(str(tmp_path)).read("bob.jpg")
+
+
+class _Source:
+    def read(self, name):
+        return b"image"
+
+
+class _Store:
+    def __init__(self):
+        self.upserted = []
+
+    async def upsert(self, ids, vectors, update_at=None, attributes=None):
+        self.upserted.extend(ids)
+        return list(ids)
+
+    replace = upsert
+
+
+async def test_enroll_chunk_bumps_updated_at_for_reembed_catch_up(db, monkeypatch):
+    user = await UserModel.create(
+        username="alice", email="alice@example.com", hashed_password="x"
+    )
+    before = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    await UserModel.filter(id=user.id).update(updated_at=before)
+    store = _Store()
+    monkeypatch.setattr(_CONFIG_, "FACE_TEMPLATES_ENABLED", False)
+    monkeypatch.setattr(
+        enroll, "_prepare_face", lambda source, name: (name, "head-pic")
+    )
+    monkeypatch.setattr(
+        enroll, "inference_batch", lambda faces: np.ones((len(faces), 4), np.float32)
+    )
+    monkeypatch.setattr(enroll, "get_vector_store", lambda: store)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        rows = await enroll._enroll_chunk(
+            _Source(), ["alice.jpg"], executor, None, False, False, set()
+        )
+
+    assert rows[0]["status"] == "enrolled" and store.upserted == [user.id]
+    user = await UserModel.get(id=user.id)
+    assert user.head_pic == "head-pic"
+    assert user.updated_at > before
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from faceapi.models import UserModel
+from faceapi.services import face
+from faceapi.services.face import search_faces_service
+from faceapi.vector_store.numpy_store import NumpyVectorStore
+
+DIM = 4
+QUERY = np.array([1, 0, 0, 0], dtype=np.float32)
+
+
+@pytest.fixture
+async def users(db, tmp_path, monkeypatch):
+    """Seven users whose similarity to QUERY decreases with their position."""
+    store = NumpyVectorStore(str(tmp_path), dim=DIM)
+    await store.init()
+    ids = []
+    for index in range(7):
+        user = await UserModel.create(
+            username=f"user{index}",
+            email=f"user{index}@example.com",
+            hashed_password="x",
+        )
+        angle = index * 0.2
+        vector = np.array([[np.cos(angle), np.sin(angle), 0, 0]], dtype=np.float32)
+        await store.upsert([user.id], vector)
+        ids.append(user.id)
+
+    async def open_cursor(image, face_box, site, is_active, min_score):
+        return store.search_cursor(QUERY, min_score)
+
+    monkeypatch.setattr(face, "_open_search_cursor", open_cursor)
+    monkeypatch.setattr(face, "_SEARCH_CURSORS", type(face._SEARCH_CURSORS)())
+    yield ids
+    await store.close()
+
+
+def _ids(response):
+    return [row["user_id"] for row in response["results"]]
+
+
+async def test_cursor_returns_following_pages(users):
+    first = await search_faces_service(image=object(), page_size=3)
+    second = await search_faces_service(cursor_id=first["cursor"], page_size=3)
+    third = await search_faces_service(cursor_id=second["cursor"], page_size=3)
+
+    assert (_ids(first), _ids(second), _ids(third)) == (
+        users[:3],
+        users[3:6],
+        users[6:],
+    )
+    assert [first["page"], second["page"], third["page"]] == [1, 2, 3]
+    assert third["cursor"] is None and not face._SEARCH_CURSORS
+
+
+async def test_missing_cursor_searches_again_and_skips_previous_pages(users):
+    first = await search_faces_service(image=object(), page_size=3)
+    # 別のワーカーに届いた場合と同じく、このプロセスにはカーソルがない
+    face._SEARCH_CURSORS.clear()
+
+    second = await search_faces_service(
+        image=object(), cursor_id=first["cursor"], page=2, page_size=3
+    )
+
+    assert _ids(second) == users[3:6] and second["page"] == 2
+    third = await search_faces_service(cursor_id=second["cursor"], page_size=3)
+    assert _ids(third) == users[6:]
+
+
+async def test_missing_cursor_without_image_is_expired(users):
+    with pytest.raises(HTTPException) as error:
+        await search_faces_service(cursor_id="unknown", page_size=3)
+    assert error.value.status_code == 404
+
+
+async def test_deleted_users_are_skipped(users):
+    await UserModel.filter(id=users[1]).delete()
+
+    response = await search_faces_service(image=object(), page_size=3)
+
+    assert _ids(response) == [users[0], users[2]]
@@ -0,0 +1,28 @@
+import pytest
+
+from faceapi.utils import parse_face_box
+
+
+@pytest.mark.parametrize("value", [None, ""])
+def test_parse_face_box_without_hint(value):
+    assert parse_face_box(value) is None
+
+
+def test_parse_face_box_from_string_rounds_to_int():
+    assert parse_face_box("10,20.4,30.6,40") == (10, 20, 31, 40)
+
+
+def test_parse_face_box_from_sequence():
+    assert parse_face_box([1, 2, 3, 4]) == (1, 2, 3, 4)
+
+
+@pytest.mark.parametrize("value", ["1,2,3", "a,b,c,d", "1,2,3,4,5"])
+def test_parse_face_box_rejects_malformed(value):
+    with pytest.raises(ValueError):
+        parse_face_box(value)
+
+
+@pytest.mark.parametrize("value", ["0,0,0,10", "0,0,10,-1"])
+def test_parse_face_box_rejects_empty_box(value):
+    with pytest.raises(ValueError):
+        parse_face_box(value)
@@ -0,0 +1,104 @@
+import numpy as np
+
+from faceapi.vector_store import normalize_rows
+from faceapi.vector_store.local_index import (
+    LocalIndex,
+    attribute_mask,
+    blocked_top_k,
+)
+
+
+def _brute_force(matrix, ids, query, limit):
+    scores = matrix @ query
+    order = np.argsort(-scores)[:limit]
+    return [int(ids[row]) for row in order]
+
+
+def test_blocked_top_k_matches_brute_force_across_blocks():
+    rng = np.random.default_rng(0)
+    matrix = normalize_rows(rng.standard_normal((257, 16)))
+    ids = np.arange(1000, 1257)
+    queries = normalize_rows(rng.standard_normal((3, 16)))
+
+    results = blocked_top_k(matrix, ids, queries, limit=10, block_size=32)
+
+    for query, hits in zip(queries, results):
+        assert [hit["user_id"] for hit in hits] == _brute_force(matrix, ids, query, 10)
+        distances = [hit["distance"] for hit in hits]
+        assert distances == sorted(distances, reverse=True)
+
+
+def test_blocked_top_k_radius_drops_distant_rows():
+    matrix = normalize_rows(np.array([[1, 0], [0.8, 0.6], [0, 1]], dtype=np.float32))
+    results = blocked_top_k(
+        matrix, np.array([1, 2, 3]), matrix[:1], limit=3, radius=0.5
+    )
+    assert [hit["user_id"] for hit in results[0]] == [1, 2]
+
+
+def test_blocked_top_k_mask_excludes_rows():
+    matrix = normalize_rows(np.array([[1, 0], [0.8, 0.6], [0, 1]], dtype=np.float32))
+    mask = np.array([False, True, True])
+    results = blocked_top_k(
+        matrix, np.array([1, 2, 3]), matrix[:1], limit=3, block_size=2, mask=mask
+    )
+    assert [hit["user_id"] for hit in results[0]] == [2, 3]
+
+
+def test_blocked_top_k_mask_with_radius_returns_nothing():
+    matrix = normalize_rows(np.array([[1, 0], [0, 1]], dtype=np.float32))
+    results = blocked_top_k(
+        matrix,
+        np.array([1, 2]),
+        matrix[:1],
+        limit=2,
+        radius=0.5,
+        mask=np.array([False, True]),
+    )
+    assert results == [[]]
+
+
+def test_blocked_top_k_empty_store():
+    results = blocked_top_k(
+        np.zeros((0, 4), dtype=np.float32),
+        np.zeros(0, dtype=np.int64),
+        np.ones((2, 4), dtype=np.float32),
+        limit=5,
+    )
+    assert results == [[], []]
+
+
+def test_attribute_mask_matches_all_filters():
+    columns = {
+        "site": np.array(["a", "b", "a"], dtype=object),
+        "is_active": np.array([True, True, False], dtype=object),
+    }
+    mask = attribute_mask(columns, 3, {"site": "a", "is_active": True})
+    assert mask.tolist() == [True, False, False]
+    assert attribute_mask(columns, 3, None) is None
+
+
+def test_local_index_delete_keeps_other_rows_in_place():
+    index = LocalIndex(dim=2)
+    matrix = normalize_rows(np.array([[1, 0], [0.8, 0.6], [0, 1]], dtype=np.float32))
+    index.upsert([1, 2, 3], matrix)
+    vectors, ids = index._vectors, index._ids
+
+    index.delete([1])
+
+    # 検索中のスレッドが取り出した行列とIDの対応は変わらない
+    assert ids[:3].tolist() == [1, 2, 3]
+    np.testing.assert_array_equal(vectors[:3], matrix)
+    assert sorted(index.ids().tolist()) == [2, 3]
+    assert [hit["user_id"] for hit in index.search(matrix[:1], limit=3)[0]] == [2, 3]
+
+
+def test_local_index_reuses_no_row_after_reinsert():
+    index = LocalIndex(dim=2)
+    matrix = normalize_rows(np.array([[1, 0], [0, 1]], dtype=np.float32))
+    index.upsert(list(range(1, 9)), np.repeat(matrix[1:], 8, axis=0))
+    index.delete([1, 2, 3])
+    index.upsert([1], matrix[:1])
+
+    assert len(index) == 6
+    assert index.search(matrix[:1], limit=1)[0][0]["user_id"] == 1
@@ -0,0 +1,49 @@
+import datetime
+
+import pytest
+
+from faceapi.core import _CONFIG_
+from faceapi.db.maintenance import current_maintenance_window, excess_small_segments
+
+
+def _at(hour, minute=0, day=10):
+    return datetime.datetime(2026, 3, day, hour, minute)
+
+
+def test_no_window_configured(monkeypatch):
+    monkeypatch.setattr(_CONFIG_, "MILVUS_MAINTENANCE_WINDOW", "")
+    assert current_maintenance_window(_at(3)) is None
+
+
+@pytest.mark.parametrize(
+    "now, expected",
+    [
+        (_at(1, 59), None),
+        (_at(2), datetime.date(2026, 3, 10)),
+        (_at(4, 59), datetime.date(2026, 3, 10)),
+        (_at(5), None),
+    ],
+)
+def test_window_within_a_day(monkeypatch, now, expected):
+    monkeypatch.setattr(_CONFIG_, "MILVUS_MAINTENANCE_WINDOW", "02:00-05:00")
+    assert current_maintenance_window(now) == expected
+
+
+@pytest.mark.parametrize(
+    "now, expected",
+    [
+        (_at(22, 59), None),
+        (_at(23), datetime.date(2026, 3, 10)),
+        (_at(3, 59, day=11), datetime.date(2026, 3, 10)),
+        (_at(4, day=11), None),
+    ],
+)
+def test_window_crossing_midnight(monkeypatch, now, expected):
+    monkeypatch.setattr(_CONFIG_, "MILVUS_MAINTENANCE_WINDOW", "23:00-04:00")
+    assert current_maintenance_window(now) == expected
+
+
+def test_excess_small_segments_keeps_one_per_partition():
+    assert excess_small_segments([]) == 0
+    assert excess_small_segments([1, 1, 1]) == 0
+    assert excess_small_segments([3, 1, 2]) == 3
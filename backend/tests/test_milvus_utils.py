@@ -0,0 +1,59 @@
+import grpc
+import pytest
+from pymilvus.exceptions import MilvusException, MilvusUnavailableException
+
+from faceapi.db.milvus_pool import is_transient_milvus_error, milvus_status_code
+from faceapi.utils.milvus_utils import HedgeBudget
+
+
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, code):
+        super().__init__()
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+def test_milvus_status_code_from_rpc_error():
+    error = FakeRpcError(grpc.StatusCode.DEADLINE_EXCEEDED)
+    assert milvus_status_code(error) == grpc.StatusCode.DEADLINE_EXCEEDED
+    assert is_transient_milvus_error(error)
+
+
+def test_milvus_status_code_from_unavailable_exception():
+    error = MilvusUnavailableException(message="down")
+    assert milvus_status_code(error) == grpc.StatusCode.UNAVAILABLE
+
+
+def test_milvus_status_code_follows_cause_chain():
+    try:
+        try:
+            raise FakeRpcError(grpc.StatusCode.UNAVAILABLE)
+        except grpc.RpcError as cause:
+            raise RuntimeError("wrapped") from cause
+    except RuntimeError as error:
+        assert milvus_status_code(error) == grpc.StatusCode.UNAVAILABLE
+
+
+@pytest.mark.parametrize("error", [ValueError("bad"), MilvusException(message="x")])
+def test_milvus_status_code_for_non_grpc_errors(error):
+    assert milvus_status_code(error) is None
+    assert not is_transient_milvus_error(error)
+
+
+def test_hedge_budget_limits_hedges_to_ratio():
+    budget = HedgeBudget(0.5)
+    assert not budget.try_acquire()
+    budget.record_request()
+    assert not budget.try_acquire()
+    budget.record_request()
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+
+
+def test_hedge_budget_caps_burst():
+    budget = HedgeBudget(1.0, burst=2.0)
+    for _ in range(10):
+        budget.record_request()
+    assert [budget.try_acquire() for _ in range(3)] == [True, True, False]
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import multiprocessing
+import threading
+
+import numpy as np
+import pytest
+
+from faceapi.vector_store import numpy_store
+from faceapi.vector_store.numpy_store import NumpyVectorStore, load_numpy_store
+
+DIM = 4
+
+
+def _vector(seed):
+    return np.random.default_rng(seed).standard_normal((1, DIM)).astype(np.float32)
+
+
+async def _open(path):
+    store = NumpyVectorStore(str(path), dim=DIM)
+    await store.init()
+    return store
+
+
+async def _enroll(store, user_ids, site="hq"):
+    for user_id in user_ids:
+        await store.upsert([user_id], _vector(user_id), attributes=[{"site": site}])
+
+
+async def _best(store, seed, **kwargs):
+    hits = await store.search(_vector(seed), limit=1, **kwargs)
+    return hits[0][0]["user_id"] if hits[0] else None
+
+
+async def test_upsert_search_and_delete(tmp_path):
+    store = await _open(tmp_path)
+    await _enroll(store, [1, 2, 3])
+
+    assert await _best(store, 2) == 2
+    assert await store.delete([2]) == 1
+    assert await _best(store, 2) != 2
+    assert await store.count() == 2
+    assert await _best(store, 1, filters={"site": "other"}) is None
+
+
+async def test_delete_does_not_move_rows_under_another_worker(tmp_path):
+    writer = await _open(tmp_path)
+    await _enroll(writer, range(1, 9))
+    reader = await _open(tmp_path)
+    rows = np.array(reader._vectors[: reader._size])
+    ids = reader._ids[: reader._size].copy()
+
+    # 削除と行列を詰める処理の後も、読み込み済みの行は同じユーザーのまま
+    await writer.delete([1, 2, 3])
+    np.testing.assert_array_equal(reader._vectors[: len(rows)], rows)
+    np.testing.assert_array_equal(reader._ids[: len(ids)], ids)
+
+    assert await _best(reader, 8) == 8
+    assert await _best(reader, 1) != 1
+    assert await reader.count() == 5
+
+
+async def test_compaction_writes_a_new_generation(tmp_path):
+    store = await _open(tmp_path)
+    await _enroll(store, range(1, 9))
+    await store.delete([1, 2, 3])
+
+    assert store._size == 5
+    assert sorted(p.name for p in tmp_path.glob("embeddings*")) == [store._matrix_name]
+    assert len(list(tmp_path.glob("rows-*.npz"))) == 1
+    other = await _open(tmp_path)
+    assert [await _best(other, seed) for seed in range(4, 9)] == [4, 5, 6, 7, 8]
+
+
+async def test_failed_write_keeps_the_committed_generation(tmp_path, monkeypatch):
+    store = await _open(tmp_path)
+    await _enroll(store, [1])
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(numpy_store.np, "savez", fail)
+    with pytest.raises(OSError):
+        await store.upsert([2], _vector(2))
+    monkeypatch.undo()
+
+    assert await store.count() == 1
+    assert await _best(store, 2) == 1
+    assert (await _open(tmp_path))._rows == {1: 0}
+
+
+def _enroll_in_process(path, worker):
+    async def run():
+        store = await _open(path)
+        await _enroll(store, range(worker * 100, worker * 100 + 25))
+
+    asyncio.run(run())
+
+
+async def test_concurrent_workers_keep_every_write(tmp_path):
+    await _open(tmp_path)
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=_enroll_in_process, args=(tmp_path, worker))
+        for worker in range(4)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+    store = await _open(tmp_path)
+    assert await store.count() == 100
+    assert await _best(store, 310) == 310
+
+
+async def test_reads_the_previous_layout(tmp_path):
+    matrix = np.lib.format.open_memmap(
+        tmp_path / "embeddings.npy", mode="w+", dtype=np.float32, shape=(8, DIM)
+    )
+    matrix[:2] = np.concatenate([_vector(1), _vector(2)])
+    matrix.flush()
+    np.save(tmp_path / "ids.npy", np.array([1, 2]))
+    np.save(tmp_path / "update_at.npy", np.array([0, 0]))
+    np.save(tmp_path / "attr_site.npy", np.array(["hq", "lab"]))
+    (tmp_path / "meta.json").write_text(json.dumps({"dim": DIM, "size": 2}))
+
+    ids, loaded, attributes = load_numpy_store(str(tmp_path))
+    assert ids.tolist() == [1, 2] and loaded.shape == (2, DIM)
+    assert attributes["site"].tolist() == ["hq", "lab"]
+
+    store = await _open(tmp_path)
+    assert await _best(store, 2, filters={"site": "lab"}) == 2
+    await store.delete([1])
+    assert not (tmp_path / "ids.npy").exists()
+    ids, _, _ = load_numpy_store(str(tmp_path))
+    assert ids.tolist() == [2]
+
+
+async def test_search_runs_off_the_event_loop(tmp_path, monkeypatch):
+    store = await _open(tmp_path)
+    await _enroll(store, [1])
+    threads = []
+    search = numpy_store.blocked_top_k
+
+    def record(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return search(*args, **kwargs)
+
+    monkeypatch.setattr(numpy_store, "blocked_top_k", record)
+    assert await _best(store, 1) == 1
+    assert threads and threads[0] is not threading.main_thread()
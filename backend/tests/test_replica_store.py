@@ -0,0 +1,132 @@
+import threading
+
+import numpy as np
+import pytest
+
+from faceapi.core import _CONFIG_
+from faceapi.vector_store import milvus_store, replica_store
+from faceapi.vector_store.replica_store import ReplicatedMilvusVectorStore
+
+
+def _vector(seed):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal(_CONFIG_.INDEX_EMB_DIM).astype(np.float32)
+
+
+class FakeIterator:
+    def __init__(self, rows, batch_size):
+        self.batches = [
+            rows[start : start + batch_size]
+            for start in range(0, len(rows), batch_size)
+        ]
+
+    def next(self):
+        return self.batches.pop(0) if self.batches else []
+
+    def close(self):
+        pass
+
+
+class FakeMilvusClient:
+    """In-memory face_features collection without a site field."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def put(self, user_id, update_at, is_active=True):
+        self.rows[user_id] = {
+            "user_id": user_id,
+            "feature_vector": _vector(user_id).tolist(),
+            "update_at": update_at,
+            "is_active": is_active,
+        }
+
+    @staticmethod
+    def _select(row, output_fields):
+        return {name: row[name] for name in output_fields}
+
+    def query_iterator(self, collection_name, batch_size, filter, output_fields):
+        since = int(filter.split(">=")[1]) if filter else 0
+        rows = [
+            self._select(row, output_fields)
+            for row in self.rows.values()
+            if row["update_at"] >= since
+        ]
+        return FakeIterator(rows, batch_size)
+
+    def get(self, collection_name, ids, output_fields):
+        return [
+            self._select(self.rows[i], output_fields) for i in ids if i in self.rows
+        ]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeMilvusClient()
+    storage = {"dtype": "FLOAT", "binary": False, "attributes": ["is_active"]}
+    monkeypatch.setattr(replica_store, "get_milvus_client", lambda: client)
+    monkeypatch.setattr(replica_store, "get_feature_storage", lambda: dict(storage))
+    monkeypatch.setattr(milvus_store, "get_feature_storage", lambda: dict(storage))
+    return client
+
+
+async def _search(store, seed, **filters):
+    hits = await store.search(_vector(seed)[None, :], limit=1, filters=filters)
+    return hits[0][0]["user_id"] if hits[0] else None
+
+
+async def test_replica_ignores_filters_on_attributes_milvus_does_not_store(client):
+    client.put(1, update_at=1000)
+    client.put(2, update_at=1000, is_active=False)
+    store = ReplicatedMilvusVectorStore()
+    await store.bootstrap()
+
+    assert store.supported_filters({"site": "hq", "is_active": True}) == {
+        "is_active": True
+    }
+    assert await _search(store, 1, site="hq", is_active=True) == 1
+    assert await _search(store, 2, site="hq", is_active=True) != 2
+
+
+async def test_sync_delta_picks_up_rows_written_by_other_workers(client):
+    client.put(1, update_at=1000)
+    store = ReplicatedMilvusVectorStore()
+    await store.bootstrap()
+
+    client.put(2, update_at=2000)
+    await store.sync_delta()
+
+    assert await _search(store, 2) == 2
+    assert len(store.replica) == 2
+
+
+async def test_reconcile_removes_deleted_and_loads_missing_rows(client):
+    client.put(1, update_at=5000)
+    client.put(2, update_at=5000)
+    store = ReplicatedMilvusVectorStore()
+    await store.bootstrap()
+
+    # 別のワーカーの削除と、差分同期の範囲より古い update_at で復元された行
+    del client.rows[1]
+    client.put(3, update_at=1)
+    await store.reconcile()
+
+    assert sorted(int(user_id) for user_id in store.replica.ids()) == [2, 3]
+    assert await _search(store, 1) != 1
+    assert await _search(store, 3) == 3
+
+
+async def test_replica_search_runs_off_the_event_loop(client, monkeypatch):
+    client.put(1, update_at=1000)
+    store = ReplicatedMilvusVectorStore()
+    await store.bootstrap()
+    threads = []
+    search = store.replica.search
+
+    def record(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return search(*args, **kwargs)
+
+    monkeypatch.setattr(store.replica, "search", record)
+    assert await _search(store, 1) == 1
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,105 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from faceapi.core import _CONFIG_
+from faceapi.vector_store.numpy_store import NumpyVectorStore
+from faceapi.vector_store.templates import NumpyTemplateStore, TemplateVectorStore
+
+DIM = 4
+
+
+def _basis(*axes):
+    return np.eye(DIM, dtype=np.float32)[list(axes)]
+
+
+@pytest.fixture
+async def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(_CONFIG_, "MODEL_EMB_DIM", DIM)
+    monkeypatch.setattr(_CONFIG_, "FACE_TEMPLATES_MAX_PER_USER", 3)
+    monkeypatch.setattr(_CONFIG_, "FACE_TEMPLATES_RERANK", False)
+    store = TemplateVectorStore(
+        NumpyVectorStore(str(tmp_path / "index"), dim=DIM),
+        NumpyTemplateStore(str(tmp_path / "templates")),
+    )
+    await store.init()
+    yield store
+    await store.close()
+
+
+async def _templates(store, user_id):
+    found, matrix, _ = await store.templates.get(store._keys(user_id))
+    return found, matrix
+
+
+async def test_concurrent_upserts_keep_every_template(store):
+    await asyncio.gather(
+        *(store.upsert([1], _basis(axis), [1000 + axis]) for axis in range(3))
+    )
+
+    found, matrix = await _templates(store, 1)
+    assert found == store._keys(1)
+    assert sorted(np.argmax(matrix, axis=1).tolist()) == [0, 1, 2]
+
+
+async def test_full_user_replaces_oldest_template(store):
+    for axis, timestamp in [(0, 3000), (1, 1000), (2, 2000)]:
+        await store.upsert([1], _basis(axis), [timestamp])
+    await store.upsert([1], _basis(3), [4000])
+
+    _, matrix = await _templates(store, 1)
+    assert sorted(np.argmax(matrix, axis=1).tolist()) == [0, 2, 3]
+
+
+async def test_prototype_is_normalized_template_mean(store):
+    await store.upsert([1, 1], _basis(0, 1), [1000, 2000])
+
+    hits = await store.search(_basis(0) + _basis(1), limit=1)
+    assert hits[0][0]["user_id"] == 1
+    assert hits[0][0]["distance"] == pytest.approx(1.0)
+
+
+async def test_rerank_uses_best_template(store, monkeypatch):
+    monkeypatch.setattr(_CONFIG_, "FACE_TEMPLATES_RERANK", True)
+    await store.upsert([1, 1], _basis(0, 1), [1000, 2000])
+    await store.upsert([2], _basis(2), [1000])
+
+    # プロトタイプとの類似度は約0.71だが、テンプレートとの最大類似度で並べ替える
+    hits = await store.search(_basis(0), limit=2)
+    assert hits[0][0] == {"user_id": 1, "distance": pytest.approx(1.0)}
+    assert await store.search(_basis(0), limit=2, radius=0.9) == [
+        [{"user_id": 1, "distance": pytest.approx(1.0)}]
+    ]
+
+
+async def test_replace_keeps_user_searchable_until_new_prototype(store):
+    await store.upsert([1, 1], _basis(0, 1), [1000, 2000])
+    upsert = store.store.upsert
+    seen = []
+
+    async def record(ids, vectors, update_at=None, attributes=None):
+        # 新しいプロトタイプを登録する時点では古いテンプレートが残っている
+        seen.append(len((await _templates(store, 1))[0]))
+        return await upsert(ids, vectors, update_at, attributes)
+
+    store.store.upsert = record
+    await store.replace([1], _basis(2), [3000])
+
+    assert seen == [2]
+    found, matrix = await _templates(store, 1)
+    assert len(found) == 1 and np.argmax(matrix[0]) == 2
+    hits = await store.search(_basis(2), limit=1)
+    assert hits[0][0]["user_id"] == 1
+    assert hits[0][0]["distance"] == pytest.approx(1.0)
+
+
+async def test_delete_removes_templates(store):
+    await store.upsert([1, 2], _basis(0, 1), [1000, 1000])
+
+    await store.delete([1])
+
+    assert (await _templates(store, 1))[0] == []
+    assert len((await _templates(store, 2))[0]) == 1
+    hits = await store.search(_basis(0), limit=2)
+    assert [hit["user_id"] for hit in hits[0]] == [2]
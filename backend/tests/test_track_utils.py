@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from faceapi.core import _CONFIG_
+from faceapi.services import face as face_service
+from faceapi.utils.track_utils import FaceTracker
+
+BOX = (40, 30, 32, 32)
+
+
+@pytest.fixture
+def frame():
+    return np.random.default_rng(0).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+
+
+@pytest.fixture(autouse=True)
+def refresh_every_frames(monkeypatch):
+    monkeypatch.setattr(_CONFIG_, "FACE_TRACK_REFRESH_FRAMES", 10)
+    monkeypatch.setattr(_CONFIG_, "FACE_TRACK_REFRESH_SECONDS", 3600.0)
+
+
+def test_tracker_follows_a_static_face(frame):
+    tracker = FaceTracker()
+    tracker.update(frame, BOX)
+    assert not tracker.needs_refresh()
+    assert tracker.track(frame) == BOX
+    assert tracker.frames_since_refresh == 1
+
+
+def test_tracker_needs_refresh_after_frames(frame):
+    tracker = FaceTracker()
+    tracker.update(frame, BOX)
+    for _ in range(10):
+        tracker.track(frame)
+    assert tracker.needs_refresh()
+
+
+def test_tracker_resets_when_the_face_is_lost(frame):
+    tracker = FaceTracker()
+    tracker.update(frame, BOX)
+    other = np.random.default_rng(1).integers(0, 256, frame.shape, dtype=np.uint8)
+    assert tracker.track(other) is None
+    assert tracker.needs_refresh()
+
+
+@pytest.mark.parametrize("matched", [True, False])
+async def test_tracked_session_redetects_every_refresh_frames(
+    monkeypatch, frame, matched
+):
+    detections = []
+
+    def detect_face_boxes(img, face_box=None):
+        detections.append(len(detections))
+        return [BOX]
+
+    class Store:
+        async def search(self, vectors, limit=1, radius=None, filters=None):
+            hits = [{"user_id": 1, "distance": 0.9}] if matched else []
+            return [hits for _ in range(len(vectors))]
+
+    monkeypatch.setattr(face_service, "ensure_feature_model_or_503", lambda: None)
+    monkeypatch.setattr(face_service, "detect_face_boxes", detect_face_boxes)
+    monkeypatch.setattr(face_service, "check_face_quality", lambda face_img: None)
+    monkeypatch.setattr(
+        face_service, "inference", lambda face_img: np.ones((1, 4), np.float32)
+    )
+    monkeypatch.setattr(face_service, "get_vector_store", Store)
+
+    tracker = FaceTracker()
+    for _ in range(30):
+        await face_service.verify_face_image_service(frame, tracker=tracker)
+
+    # 1回検出した後は10フレーム追跡し、11フレームごとに検出し直す
+    assert len(detections) == 3
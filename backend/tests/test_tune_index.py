@@ -0,0 +1,25 @@
+from faceapi.tools.tune_index import pareto_front, recommend
+
+
+def _row(name, recall, p99):
+    return {"name": name, "recall@10": recall, "p99_ms": p99}
+
+
+RESULTS = [
+    _row("fast", 0.90, 2.0),
+    _row("dominated", 0.89, 3.0),
+    _row("balanced", 0.95, 4.0),
+    _row("tie", 0.95, 4.0),
+    _row("exact", 1.00, 9.0),
+]
+
+
+def test_pareto_front_drops_dominated_settings():
+    front = pareto_front(RESULTS, 10)
+    assert [row["name"] for row in front] == ["fast", "balanced", "tie", "exact"]
+
+
+def test_recommend_picks_fastest_setting_meeting_target():
+    assert recommend(RESULTS, 10, 0.95)["name"] == "balanced"
+    assert recommend(RESULTS, 10, 0.999)["name"] == "exact"
+    assert recommend(RESULTS, 10, 1.01) is None
@@ -0,0 +1,92 @@
+import cv2
+import numpy as np
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+from faceapi.core import _CONFIG_
+from faceapi.utils import (
+    RequestSizeLimitMiddleware,
+    admit_image_bytes,
+    sniff_image_header,
+)
+
+
+def _encode(extension: str, width: int = 40, height: int = 30) -> bytes:
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    ok, buffer = cv2.imencode(extension, image)
+    assert ok
+    return buffer.tobytes()
+
+
+@pytest.mark.parametrize(
+    "extension, image_format",
+    [(".jpg", "jpeg"), (".png", "png"), (".bmp", "bmp"), (".webp", "webp")],
+)
+def test_sniff_image_header_reads_format_and_size(extension, image_format):
+    assert sniff_image_header(_encode(extension)) == (image_format, (40, 30))
+
+
+def test_sniff_image_header_accepts_memoryview():
+    assert sniff_image_header(memoryview(_encode(".png"))) == ("png", (40, 30))
+
+
+def test_sniff_image_header_unknown_format():
+    assert sniff_image_header(b"GIF89a" + b"\x00" * 32) == (None, None)
+
+
+def test_sniff_image_header_truncated_png():
+    assert sniff_image_header(_encode(".png")[:16]) == ("png", None)
+
+
+def test_admit_image_bytes_decodes():
+    assert admit_image_bytes(_encode(".jpg")).shape == (30, 40, 3)
+
+
+def test_admit_image_bytes_rejects_declared_dimensions(monkeypatch):
+    monkeypatch.setattr(_CONFIG_, "UPLOAD_MAX_PIXELS", 100)
+    with pytest.raises(HTTPException) as error:
+        admit_image_bytes(_encode(".png"))
+    assert error.value.status_code == 413
+
+
+def test_admit_image_bytes_rejects_unsupported_format():
+    with pytest.raises(HTTPException) as error:
+        admit_image_bytes(b"GIF89a" + b"\x00" * 32)
+    assert error.value.status_code == 415
+
+
+@pytest.fixture
+def upload_client(monkeypatch):
+    monkeypatch.setattr(_CONFIG_, "UPLOAD_MAX_BYTES", 1000)
+    app = FastAPI()
+    app.add_middleware(RequestSizeLimitMiddleware)
+
+    @app.post("/upload")
+    async def upload(image: UploadFile = File(...)):
+        return {"size": len(await image.read())}
+
+    return TestClient(app)
+
+
+def test_request_size_limit_allows_small_upload(upload_client):
+    response = upload_client.post("/upload", files={"image": ("a.jpg", b"x" * 500)})
+    assert response.json() == {"size": 500}
+
+
+def test_request_size_limit_rejects_large_content_length(upload_client):
+    response = upload_client.post("/upload", files={"image": ("a.jpg", b"x" * 200_000)})
+    assert response.status_code == 413
+
+
+def test_request_size_limit_rejects_large_chunked_body(upload_client):
+    def chunks():
+        for _ in range(100):
+            yield b"x" * 1000
+
+    response = upload_client.post(
+        "/upload",
+        content=chunks(),
+        headers={"content-type": "multipart/form-data; boundary=test"},
+    )
+    assert response.status_code == 413
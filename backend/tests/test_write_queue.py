@@ -0,0 +1,154 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from faceapi.vector_store.base import VectorStore
+from faceapi.vector_store.projected_store import ProjectedVectorStore
+from faceapi.vector_store.projection import EmbeddingProjection
+from faceapi.vector_store.write_queue import (
+    ReadYourWritesVectorStore,
+    WriteQueueVectorStore,
+)
+
+
+class RecordingStore(VectorStore):
+    """Inner store that records every call instead of persisting."""
+
+    name = "recording"
+
+    def __init__(self):
+        self.calls = []
+
+    async def init(self):
+        pass
+
+    async def upsert(self, ids, vectors, update_at=None, attributes=None):
+        self.calls.append(("upsert", list(ids), np.asarray(vectors)))
+        return list(ids)
+
+    async def delete(self, ids):
+        self.calls.append(("delete", list(ids), None))
+        return len(ids)
+
+    async def update_attributes(self, ids, attributes):
+        self.calls.append(("update_attributes", list(ids), None))
+
+    async def search(self, vectors, limit=1, radius=None, filters=None):
+        return [[] for _ in range(len(vectors))]
+
+    async def count(self):
+        return 0
+
+
+def _vectors(*rows):
+    return np.array(rows, dtype=np.float32)
+
+
+@pytest.fixture
+def inner():
+    return RecordingStore()
+
+
+async def test_concurrent_upserts_share_one_batch(inner):
+    queue = WriteQueueVectorStore(inner, max_batch=100, max_delay=0.01)
+    written = await asyncio.gather(
+        queue.upsert([1], _vectors([1, 0])),
+        queue.upsert([2, 3], _vectors([0, 1], [1, 1])),
+    )
+    assert written == [[1], [2, 3]]
+    assert [(name, ids) for name, ids, _ in inner.calls] == [("upsert", [1, 2, 3])]
+
+
+async def test_full_batch_flushes_without_waiting(inner):
+    queue = WriteQueueVectorStore(inner, max_batch=2, max_delay=60)
+    await asyncio.wait_for(
+        asyncio.gather(
+            queue.upsert([1], _vectors([1, 0])), queue.upsert([2], _vectors([0, 1]))
+        ),
+        timeout=1,
+    )
+    assert len(inner.calls) == 1
+
+
+async def test_duplicate_ids_are_written_in_arrival_order(inner):
+    queue = WriteQueueVectorStore(inner, max_batch=100, max_delay=0.01)
+    await asyncio.gather(
+        queue.upsert([1], _vectors([1, 0])),
+        queue.upsert([1, 2], _vectors([0, 1], [1, 1])),
+    )
+    assert [ids for _, ids, _ in inner.calls] == [[1, 2], [1]]
+    np.testing.assert_array_equal(inner.calls[1][2], _vectors([0, 1]))
+
+
+async def test_inner_failure_reaches_every_waiter(inner):
+    async def fail(*args, **kwargs):
+        raise RuntimeError("write failed")
+
+    inner.upsert = fail
+    queue = WriteQueueVectorStore(inner, max_batch=100, max_delay=0.01)
+    results = await asyncio.gather(
+        queue.upsert([1], _vectors([1, 0])),
+        queue.upsert([2], _vectors([0, 1])),
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_delete_flushes_pending_upserts_first(inner):
+    queue = WriteQueueVectorStore(inner, max_batch=100, max_delay=60)
+    upsert = asyncio.ensure_future(queue.upsert([1], _vectors([1, 0])))
+    await asyncio.sleep(0)
+    await queue.delete([1])
+    await upsert
+    assert [name for name, _, _ in inner.calls] == ["upsert", "delete"]
+
+
+async def test_search_merges_recent_writes(inner):
+    store = ReadYourWritesVectorStore(inner, seconds=60)
+    await store.upsert([7], _vectors([1, 0]), attributes=[{"site": "a"}])
+
+    hits = await store.search(_vectors([1, 0]), limit=1)
+    assert hits[0][0]["user_id"] == 7
+    assert await store.search(_vectors([1, 0]), filters={"site": "b"}) == [[]]
+
+    await store.delete([7])
+    assert await store.search(_vectors([1, 0])) == [[]]
+
+
+async def test_recent_writes_ignore_filters_the_inner_store_ignores(inner):
+    inner.supported_filters = lambda filters: {
+        name: value for name, value in (filters or {}).items() if name != "site"
+    }
+    store = ReadYourWritesVectorStore(inner, seconds=60)
+    await store.upsert([7], _vectors([1, 0]))
+
+    hits = await store.search(_vectors([1, 0]), filters={"site": "hq"})
+    assert hits[0][0]["user_id"] == 7
+
+
+async def test_recent_write_replaces_stale_inner_hit(inner):
+    async def stale_search(vectors, limit=1, radius=None, filters=None):
+        return [[{"user_id": 7, "distance": 0.9}, {"user_id": 8, "distance": 0.6}]]
+
+    inner.search = stale_search
+    store = ReadYourWritesVectorStore(inner, seconds=60)
+    await store.replace([7], _vectors([0, 1]))
+
+    hits = await store.search(_vectors([1, 0]), limit=2, radius=0.5)
+    assert hits == [[{"user_id": 8, "distance": 0.6}]]
+
+
+async def test_recent_writes_are_scored_in_the_projected_space(inner):
+    projection = EmbeddingProjection(
+        np.zeros(3), np.array([[1, 0, 0], [0, 1, 0]]), np.ones(2)
+    )
+    store = ProjectedVectorStore(
+        ReadYourWritesVectorStore(inner, seconds=60), projection
+    )
+    await store.upsert([7], _vectors([1, 0, 1]))
+
+    # 全次元のコサイン類似度は約0.71だが、Milvusと同じく射影後の類似度を返す
+    hits = await store.search(_vectors([1, 0, 0]), limit=1)
+    assert hits[0][0]["user_id"] == 7
+    assert hits[0][0]["distance"] == pytest.approx(1.0)
@@ -230,6 +230,25 @@ export class FaceUtils {
     return formData;
   }
 
+  /**
+   * 検出された顔の矩形をサーバー側検出のヒントとしてフォームデータに追加
+   * @param {FormData} formData - フォームデータ
+   * @param {Object} box - 検出結果の矩形（ビデオの内在座標）
+   * @param {number} imageWidth - キャプチャ画像の幅
+   * @param {boolean} flipEnabled - キャプチャ画像が反転されているかどうか
+   * @returns {FormData} 矩形ヒントを含むフォームデータ
+   */
+  appendFaceBox(formData, box, imageWidth, flipEnabled = false) {
+    if (!box) return formData;
+
+    // 反転してキャプチャした場合はX座標も反転する
+    const x = flipEnabled ? imageWidth - box.x - box.width : box.x;
+    const faceBox = [x, box.y, box.width, box.height].map(v => Math.round(v));
+    formData.append('face_box', faceBox.join(','));
+
+    return formData;
+  }
+
   /**
    * 検証リクエストを送信
    * @param {FormData} formData - フォームデータ